@@ -157,9 +157,9 @@ admin.site.register(Result, ResultAdmin)
 
 # Registering the PerformanceSummary model
 class PerformanceSummaryAdmin(admin.ModelAdmin):
-    list_display = ('school', 'circuit', 'district', 'term', 'academic_year', 'average_score')
-    search_fields = ('school__name', 'circuit__name', 'district__name', 'term', 'year')
-    list_filter = ('term', 'academic_year', 'school', 'circuit', 'district')
+    list_display = ('level', 'subject', 'class_group', 'school', 'circuit', 'district', 'term', 'academic_year', 'average_score', 'mark_count')
+    search_fields = ('school__name', 'circuit__name', 'district__name', 'term', 'academic_year')
+    list_filter = ('level', 'term', 'academic_year', 'school', 'circuit', 'district')
 
 admin.site.register(PerformanceSummary, PerformanceSummaryAdmin)
 
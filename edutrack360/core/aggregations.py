@@ -0,0 +1,102 @@
+"""
+Set-based aggregation helpers for the performance analysis pages.
+
+These read the PerformanceSummary rollups (see core.rollups) with a handful of
+GROUP BY queries, so the cost of a district page depends on the number of
+(school, subject, class) groups rather than on the number of marks behind them.
+The grouped rows are handed to the core.analytics kernel as weighted partials.
+"""
+from collections import defaultdict
+
+from django.db.models import Count, Q, Sum
+
+from core import curriculum
+from core.analytics import MarkFrame, school_breakdowns
+from core.models import SCORE_BUCKETS
+
+
+def subject_departments(subject_ids):
+    """{subject_id: [department names]} for the given subjects, from the curriculum map (no queries)."""
+    subjects = curriculum.subject_map()
+    departments = defaultdict(list)
+    for subject_id in subject_ids:
+        for department_id in subjects.departments_of(subject_id):
+            departments[subject_id].append(subjects.department_names[department_id])
+    return departments
+
+
+def bucket_conditions(field="mark", buckets=SCORE_BUCKETS):
+    """(label, Q) per band listed highest first; the last band also takes anything below its bound."""
+    conditions = []
+    upper = None
+    for label, lower in buckets:
+        condition = Q() if label == buckets[-1][0] else Q(**{f"{field}__gte": lower})
+        if upper is not None:
+            condition &= Q(**{f"{field}__lt": upper})
+        conditions.append((label, condition))
+        upper = lower
+    return conditions
+
+
+def score_histogram(queryset, field="mark", buckets=SCORE_BUCKETS):
+    """{label: count} over `queryset`, counted by the database in one conditional-aggregation query."""
+    counts = queryset.order_by().aggregate(**{
+        f"bucket_{i}": Count("pk", filter=condition)
+        for i, (_, condition) in enumerate(bucket_conditions(field, buckets))
+    })
+    return {label: counts[f"bucket_{i}"] for i, (label, _) in enumerate(buckets)}
+
+
+def grouped_frame(queryset, **columns):
+    """MarkFrame of (total, count) partials per distinct `columns` (name=lookup), grouped by the database."""
+    rows = (
+        queryset.values(*columns.values())
+        .annotate(total=Sum("mark"), count=Count("pk"))
+        .order_by(*columns.values())
+    )
+    return MarkFrame.from_queryset(rows, score="total", count="count", **columns)
+
+
+def summary_breakdowns(summaries):
+    """Per-school department breakdowns from class-level `summaries`, via a single GROUP BY."""
+    rows = (
+        summaries.filter(level="class", subject__isnull=False)
+        .values("class_group__school", "subject", "subject__name", "class_group__name")
+        .annotate(total=Sum("total_score"), count=Sum("mark_count"))
+        .filter(count__gt=0)
+        .order_by("subject__name", "class_group__name")
+    )
+    frame = MarkFrame.from_queryset(
+        rows,
+        score="total",
+        count="count",
+        school="class_group__school",
+        subject="subject",
+        subject_name="subject__name",
+        class_name="class_group__name",
+    )
+    departments_of = subject_departments(set(frame.columns["subject"]))
+    return school_breakdowns(frame, departments_of)
+
+
+def window_filter(term_sequence):
+    """Q matching any (term, academic_year) pair of a trend window."""
+    q_terms = Q()
+    for term, year in term_sequence:
+        q_terms |= Q(term=term, academic_year=year)
+    return q_terms
+
+
+def summary_trend_totals(summaries, term_sequence, group_by):
+    """{(group, term, year): (total, count)} over the trend window, via a single GROUP BY."""
+    rows = (
+        summaries.filter(window_filter(term_sequence))
+        .values(group_by, "term", "academic_year")
+        .annotate(total=Sum("total_score"), count=Sum("mark_count"))
+        .filter(count__gt=0)
+        .order_by()
+    )
+    frame = MarkFrame.from_queryset(
+        rows, score="total", count="count", group=group_by, term="term", academic_year="academic_year",
+    )
+    return frame.totals("group", "term", "academic_year")
@@ -0,0 +1,235 @@
+"""
+Vectorised analytics kernel shared by the performance-context builders.
+
+Marks are pulled once with values_list() into parallel NumPy columns (a MarkFrame);
+grouped means, score histograms, pivots and term/year trends are then computed on
+those arrays instead of nested defaultdicts and per-mark Python loops.
+
+A MarkFrame can also hold pre-aggregated rows (a total and a count per row, e.g.
+PerformanceSummary rollups) - grouped means are weighted by the counts.
+"""
+import numpy as np
+import pandas as pd
+
+from core.models import SCORE_BUCKETS, SUMMARY_BUCKETS
+
+
+def factorize(values):
+    """Integer codes, unique values and first row index per unique, in first-appearance order."""
+    array = np.asarray(values)
+    # Hashes rather than sorts, so None keys (e.g. a mark without a subject) get a code of their own
+    codes, _ = pd.factorize(array, use_na_sentinel=False)
+    first = np.unique(codes, return_index=True)[1]
+    return codes.astype(np.intp), array[first], first
+
+
+def histogram(scores, buckets=SCORE_BUCKETS):
+    """Count scores into (label, lower bound) bands listed highest first; anything lower lands in the last band."""
+    lowers = np.array([lower for _, lower in reversed(buckets)], dtype=float)
+    positions = np.searchsorted(lowers, np.asarray(scores, dtype=float), side="right") - 1
+    counts = np.bincount(np.clip(positions, 0, None), minlength=len(lowers))
+    return {label: int(counts[len(buckets) - 1 - i]) for i, (label, _) in enumerate(buckets)}
+
+
+def mean(total, count):
+    return round(total / count, 2) if count else "-"
+
+
+class MarkFrame:
+    """Parallel NumPy columns for a set of marks (or pre-aggregated mark totals)."""
+
+    def __init__(self, columns, scores, counts=None):
+        self.columns = columns
+        self.scores = scores
+        self.is_raw = counts is None
+        self.counts = np.ones(len(scores)) if counts is None else counts
+
+    @classmethod
+    def from_queryset(cls, queryset, score="mark", count=None, **columns):
+        """
+        Pull `columns` (name=lookup) plus the score field with a single values_list().
+
+        Pass `count` when each row is already an aggregate, e.g.
+        score="total_score", count="mark_count" for PerformanceSummary rows.
+        """
+        lookups = list(columns.values()) + [score] + ([count] if count else [])
+        rows = list(queryset.values_list(*lookups))
+        data = list(zip(*rows)) if rows else [()] * len(lookups)
+
+        arrays = {}
+        for i, name in enumerate(columns):
+            arrays[name] = np.empty(len(rows), dtype=object)
+            arrays[name][:] = data[i]
+        scores = np.array(data[len(columns)], dtype=float)
+        counts = np.array(data[len(columns) + 1], dtype=float) if count else None
+        return cls(arrays, scores, counts)
+
+    def __len__(self):
+        return len(self.scores)
+
+    def where(self, mask):
+        """Subset of rows matching a boolean mask."""
+        return MarkFrame(
+            {name: column[mask] for name, column in self.columns.items()},
+            self.scores[mask],
+            None if self.is_raw else self.counts[mask],
+        )
+
+    def equals(self, name, value):
+        return self.where(self.columns[name] == value)
+
+    def _groups(self, keys):
+        codes = None
+        for key in keys:
+            key_codes, uniques, _ = factorize(self.columns[key])
+            if codes is not None:
+                # Re-factorize after each key so combined codes stay dense and never overflow
+                key_codes = factorize(codes * len(uniques) + key_codes)[0]
+            codes = key_codes
+        return factorize(codes)
+
+    def totals(self, *keys):
+        """{key (or tuple of keys): (total, count)} per group, in first-appearance order."""
+        if not len(self):
+            return {}
+        codes, _, first = self._groups(keys)
+        sums = np.bincount(codes, weights=self.scores, minlength=len(first))
+        counts = np.bincount(codes, weights=self.counts, minlength=len(first))
+
+        result = {}
+        for group, row in enumerate(first):
+            key = tuple(self.columns[k][row] for k in keys)
+            result[key if len(keys) > 1 else key[0]] = (float(sums[group]), int(counts[group]))
+        return result
+
+    def means(self, *keys):
+        """{key: rounded average} per group."""
+        return {key: mean(total, count) for key, (total, count) in self.totals(*keys).items()}
+
+    def average(self):
+        return mean(float(self.scores.sum()), int(self.counts.sum()))
+
+    def histogram(self, buckets=SCORE_BUCKETS):
+        if not self.is_raw:
+            raise ValueError("histogram() needs individual marks, not pre-aggregated rows")
+        return histogram(self.scores, buckets)
+
+    def pivot(self, row_key, column_key):
+        """
+        (row labels, column labels, matrix) with one score per cell and NaN where missing.
+
+        When a cell has several marks the last one wins, like assigning into a dict.
+        """
+        row_codes, row_labels, _ = factorize(self.columns[row_key])
+        column_codes, column_labels, _ = factorize(self.columns[column_key])
+        matrix = np.full((len(row_labels), len(column_labels)), np.nan)
+        matrix[row_codes, column_codes] = self.scores
+        return list(row_labels), list(column_labels), matrix
+
+
+def trend_window(academic_year, selected_term):
+    """The three academic years and the three (term, year) pairs leading up to the selection."""
+    base_year = int(academic_year.split("/")[0])
+    prev_1 = f"{base_year - 1}/{base_year}"
+    prev_2 = f"{base_year - 2}/{base_year - 1}"
+    academic_years = [prev_2, prev_1, academic_year]
+
+    if selected_term == "Term 1":
+        term_sequence = [("Term 2", prev_1), ("Term 3", prev_1), ("Term 1", academic_year)]
+    elif selected_term == "Term 2":
+        term_sequence = [("Term 3", prev_1), ("Term 1", academic_year), ("Term 2", academic_year)]
+    else:
+        term_sequence = [("Term 1", academic_year), ("Term 2", academic_year), ("Term 3", academic_year)]
+
+    return academic_years, term_sequence
+
+
+def build_trends(label_key, label, totals, academic_years, term_sequence):
+    """
+    Term and academic-year trend rows plus chart series for one group.
+
+    `totals` maps (term, year) -> (total, count); years only include the terms in the window.
+    """
+    term_trend = {label_key: label}
+    year_totals = {year: [0.0, 0] for year in academic_years}
+    for term, year in term_sequence:
+        total, count = totals.get((term, year), (0.0, 0))
+        term_trend[f"{term} ({year})"] = mean(total, count)
+        if year in year_totals:
+            year_totals[year][0] += total
+            year_totals[year][1] += count
+
+    academic_trend = {
+        label_key: label,
+        **{year: mean(total, count) for year, (total, count) in year_totals.items()},
+    }
+
+    term_labels = list(term_trend.keys())[1:]
+    term_values = [float(v) if isinstance(v, (int, float)) else None for v in list(term_trend.values())[1:]]
+    year_labels = list(academic_trend.keys())[1:]
+    year_values = [float(v) if isinstance(v, (int, float)) else None for v in list(academic_trend.values())[1:]]
+
+    return {
+        "term_trend": term_trend,
+        "academic_trend": academic_trend,
+        "term_chart": {"labels": term_labels, "data": term_values},
+        "year_chart": {"labels": year_labels, "data": year_values},
+    }
+
+
+def department_breakdown(groups, departments_of):
+    """
+    Department -> subject -> class averages, subject averages and chart data for one school.
+
+    `groups` maps (subject_id, subject_name, class_name) -> (total, count).
+    """
+    subject_totals = {}
+    class_totals = {}
+    for (subject_id, subject_name, class_name), (total, count) in groups.items():
+        subject_total = subject_totals.setdefault(subject_name, [0.0, 0])
+        subject_total[0] += total
+        subject_total[1] += count
+        for dept_name in departments_of.get(subject_id, []):
+            class_total = class_totals.setdefault((dept_name, subject_name, class_name), [0.0, 0])
+            class_total[0] += total
+            class_total[1] += count
+
+    subjects = {name: mean(total, count) for name, (total, count) in subject_totals.items()}
+
+    departments = {}
+    subject_averages = {}
+    for (dept_name, subject_name, class_name), (total, count) in class_totals.items():
+        dept = departments.setdefault(dept_name, {"subjects": {}, "all_classes": set()})
+        dept["subjects"].setdefault(subject_name, {})[class_name] = mean(total, count)
+        dept["all_classes"].add(class_name)
+        subject_averages.setdefault(dept_name, {})[subject_name] = subjects[subject_name]
+
+    chart_data = {}
+    for dept_name, dept in departments.items():
+        dept["all_classes"] = sorted(dept["all_classes"])
+        chart_data[dept_name] = {
+            "labels": dept["all_classes"],
+            "datasets": [
+                {"label": subject_name, "data": [class_avgs.get(c, 0) for c in dept["all_classes"]]}
+                for subject_name, class_avgs in dept["subjects"].items()
+            ],
+        }
+
+    return {
+        "departments": departments,
+        "subject_averages": subject_averages,
+        "subjects": subjects,
+        "score_buckets": histogram(list(subjects.values()), SUMMARY_BUCKETS),
+        "chart_data": chart_data,
+    }
+
+
+def school_breakdowns(frame, departments_of):
+    """department_breakdown() per school for a frame with school, subject, subject_name and class_name columns."""
+    per_school = {}
+    for (school_id, *group), totals in frame.totals("school", "subject", "subject_name", "class_name").items():
+        per_school.setdefault(school_id, {})[tuple(group)] = totals
+    return {
+        school_id: department_breakdown(groups, departments_of)
+        for school_id, groups in per_school.items()
+    }
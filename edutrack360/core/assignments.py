@@ -0,0 +1,114 @@
+"""
+Per-teacher assignment index: the subjects and classes a teacher is assigned,
+the classes they are class teacher of, and which subjects those classes'
+departments offer.
+
+It is loaded in one UNION query, kept in the cache under a version that every
+assignment change bumps (see core.signals), and memoized on the Teacher
+instance, so checks made once per uploaded row cost nothing after the first.
+"""
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db.models import F, IntegerField, Value, CharField
+
+from core import caching
+from core.models import Teacher, SubjectTeacher, ClassTeacher, ClassGroup, Subject
+
+
+# Assignments change a few times a term: one version for all of them keeps invalidation simple
+ASSIGNMENTS_SCOPE = ("assignments", "all")
+ASSIGNMENTS_TIMEOUT = 24 * 60 * 60
+
+
+class TeacherAssignments:
+    def __init__(self, teacher_id, rows):
+        self.teacher_id = teacher_id
+        subject_ids = set()
+        taught_subject_ids = set()
+        classes_by_subject = defaultdict(set)
+        class_departments = {}
+        department_subjects = defaultdict(set)
+
+        for kind, a, b in rows:
+            if kind == "subject":
+                subject_ids.add(a)
+            elif kind == "taught":
+                taught_subject_ids.add(a)
+                if b is not None:
+                    classes_by_subject[a].add(b)
+            elif kind == "class":
+                class_departments[a] = b
+            elif kind == "department":
+                department_subjects[a].add(b)
+
+        self.subject_ids = frozenset(subject_ids)  # Teacher.assigned_subjects
+        self.taught_subject_ids = frozenset(taught_subject_ids)  # SubjectTeacher rows
+        self.classes_by_subject = {subject: frozenset(classes) for subject, classes in classes_by_subject.items()}
+        self.class_ids = frozenset(class_id for classes in classes_by_subject.values() for class_id in classes)
+        self.class_departments = class_departments  # Classes they are class teacher of -> department
+        self.department_subjects = {dept: frozenset(subjects) for dept, subjects in department_subjects.items()}
+
+    @property
+    def is_subject_teacher(self):
+        return bool(self.taught_subject_ids)
+
+    @property
+    def is_class_teacher(self):
+        return bool(self.class_departments)
+
+    def can_upload(self, class_group_id, subject_id):
+        """Assigned the subject, or class teacher of the class and the subject is offered in its department."""
+        if subject_id in self.subject_ids:
+            return True
+        if class_group_id not in self.class_departments:
+            return False
+        department_id = self.class_departments[class_group_id]
+        return subject_id in self.department_subjects.get(department_id, ())
+
+
+def assignment_rows(teacher_id):
+    """Every assignment of the teacher as (kind, a, b) rows, in one query."""
+    def tagged(queryset, kind, a, b):
+        return queryset.annotate(
+            kind=Value(kind, output_field=CharField()), a=a, b=b,
+        ).values_list("kind", "a", "b").order_by()
+
+    no_value = Value(None, output_field=IntegerField())
+    class_departments = ClassGroup.objects.filter(class_teachers_set__teacher_id=teacher_id).values("department_id")
+    parts = [
+        tagged(Teacher.assigned_subjects.through.objects.filter(teacher_id=teacher_id),
+               "subject", F("subject_id"), no_value),
+        tagged(SubjectTeacher.objects.filter(teacher_id=teacher_id),
+               "taught", F("subject_id"), F("assigned_classes")),
+        tagged(ClassTeacher.objects.filter(teacher_id=teacher_id),
+               "class", F("assigned_class_id"), F("assigned_class__department_id")),
+        tagged(Subject.department.through.objects.filter(department_id__in=class_departments),
+               "department", F("department_id"), F("subject_id")),
+    ]
+    return list(parts[0].union(*parts[1:], all=True))
+
+
+def cache_key(teacher_id, version):
+    return f"teacher-assignments:{teacher_id}:{version}"
+
+
+def for_teacher(teacher):
+    """The TeacherAssignments of `teacher`, memoized on the instance for the rest of the request."""
+    index = getattr(teacher, "_assignments", None)
+    if index is None:
+        version = caching.scope_versions([ASSIGNMENTS_SCOPE])[ASSIGNMENTS_SCOPE]
+        key = cache_key(teacher.id, version)
+        rows = cache.get(key) if version is not None else None
+        if rows is None:
+            rows = assignment_rows(teacher.id)
+            if version is not None:
+                cache.set(key, rows, ASSIGNMENTS_TIMEOUT)
+        index = TeacherAssignments(teacher.id, rows)
+        teacher._assignments = index
+    return index
+
+
+def changed():
+    """Call after any change to teacher assignments (the model signals do)."""
+    caching.bump_scopes([ASSIGNMENTS_SCOPE])
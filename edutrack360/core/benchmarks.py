@@ -0,0 +1,310 @@
+"""
+Benchmark suite for the analytics and upload hot paths.
+
+Every get_*_performance_context, every role dashboard, every performance PDF and
+bulk_upload_results, with the import job it queues, is timed and its queries
+counted against a LoadGenerator dataset of a given tier. Results are plain JSON so they can be stored as a
+baseline and compared on the next run (see the run_benchmarks command): any
+extra query, or a median slower than the tolerance allows, is a regression.
+"""
+import contextlib
+import io
+import statistics
+import time
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core import imports
+from core.loadgen import LoadGenerator
+from core.models import Region, District, School, ClassTeacher, Student
+from core.rollups import rebuild_summaries
+from core.views.view_cis import get_district_performance_context
+from core.views.view_school import get_school_performance_context
+from core.views.view_siso import get_circuit_performance_context
+from core.views.view_teacher import get_class_performance_context, get_subject_performance_context
+
+
+# Dataset sizes per tier (LoadGenerator arguments). "large" matches the
+# generate_load_data defaults, so a dataset kept from that command can be reused.
+TIERS = {
+    "small": {"circuits": 2, "schools": 3, "classes": 3, "students": 20, "years": 2, "seed": 101},
+    "medium": {"circuits": 5, "schools": 10, "classes": 3, "students": 30, "years": 3, "seed": 102},
+    "large": {"circuits": 10, "schools": 30, "classes": 3, "students": 40, "years": 3, "seed": 42},
+}
+
+# Rows in the bulk upload file per tier
+UPLOAD_ROWS = {"small": 60, "medium": 250, "large": 1000}
+
+UPLOAD_HEADER = "First Name,Last Name,Class,Subject,Academic Year,Term,CAT1,Project Work,CAT2,Group Work,Exam Score"
+
+# (case name, role, context builder)
+CONTEXT_CASES = [
+    ("context.district", "cis", get_district_performance_context),
+    ("context.circuit", "siso", get_circuit_performance_context),
+    ("context.school", "headteacher", get_school_performance_context),
+    ("context.subject", "teacher", get_subject_performance_context),
+    ("context.class", "teacher", get_class_performance_context),
+]
+
+# (case name, role, url name)
+PAGE_CASES = [
+    ("dashboard.cis", "cis", "dashboards:cis_dashboard"),
+    ("dashboard.siso", "siso", "dashboards:siso_dashboard"),
+    ("dashboard.headteacher", "headteacher", "dashboards:headteacher_dashboard"),
+    ("dashboard.class_teacher", "teacher", "dashboards:class_teacher_dashboard"),
+    ("dashboard.subject_teacher", "teacher", "dashboards:subject_teacher_dashboard"),
+    ("pdf.district", "cis", "cis:download_district_performance_pdf"),
+    ("pdf.circuit", "siso", "siso:download_circuit_performance_pdf"),
+    ("pdf.school", "headteacher", "school:download_school_performance_pdf"),
+    ("pdf.subject", "teacher", "teacher:download_subject_analysis_pdf"),
+    ("pdf.class", "teacher", "teacher:download_class_performance_pdf"),
+]
+
+UPLOAD_CASE = "upload.bulk_results"
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+class BenchmarkRunner:
+    def __init__(self, tier="small", repeat=3, only=None, sizes=None, keep=False, log=print):
+        if tier not in TIERS:
+            raise BenchmarkError(f"Unknown tier '{tier}'. Choose from: {', '.join(TIERS)}")
+        self.tier = tier
+        self.repeat = max(1, repeat)
+        self.only = only
+        self.keep = keep
+        self.sizes = dict(TIERS[tier], **(sizes or {}))
+        self.log = log
+        self.factory = RequestFactory()
+
+    # ---- Dataset ----
+
+    def dataset(self):
+        """Reuse the tier's "Load Region {seed}" if it exists, otherwise generate it. Returns True if generated."""
+        seed = self.sizes["seed"]
+        self.region = Region.objects.filter(name=f"Load Region {seed}").first()
+        if self.region:
+            self.log(f"♻️ Reusing Load Region {seed}")
+            return False
+
+        generator = LoadGenerator(log=self.log, **self.sizes)
+        stats = generator.run()
+        for academic_year, term in generator.periods:
+            rebuild_summaries(academic_year=academic_year, term=term)
+        generator.analyze()
+        self.log(f"🌱 Seeded {stats['marks']:,} marks for the {self.tier} tier in {stats['seconds']}s")
+        self.region = Region.objects.get(name=f"Load Region {seed}")
+        return True
+
+    def actors(self):
+        """One user per role, all in the first school of the first district, plus the filters they view."""
+        district = District.objects.filter(region=self.region).select_related("cis").order_by("id").first()
+        school = (
+            School.objects.filter(district=district)
+            .select_related("headteacher", "circuit__siso")
+            .order_by("school_code")
+            .first()
+        )
+        class_teacher = (
+            ClassTeacher.objects.filter(assigned_class__school=school)
+            .select_related("teacher__user", "assigned_class")
+            .order_by("id")
+            .first()
+        )
+        if not (district and school and class_teacher):
+            raise BenchmarkError(f"{self.region.name} has no complete district/school/class to benchmark")
+
+        self.users = {
+            "cis": district.cis,
+            "siso": school.circuit.siso,
+            "headteacher": school.headteacher,
+            "teacher": class_teacher.teacher.user,
+        }
+        # One logged-in client per role, so logging in is not part of any timing
+        self.clients = {}
+        for role, user in self.users.items():
+            self.clients[role] = Client()
+            self.clients[role].force_login(user)
+
+        self.school = school
+        self.teacher = class_teacher.teacher
+        self.subject = self.teacher.assigned_subjects.order_by("id").first()
+
+        end_year = self.sizes.get("end_year", 2024)
+        self.academic_year = f"{end_year}/{end_year + 1}"
+        self.term = "Term 1"
+        self.filters = {
+            "academic_year": self.academic_year,
+            "term": self.term,
+            "subject": self.subject.name,
+            "class_group": class_teacher.assigned_class_id,
+        }
+
+    # ---- Cases ----
+
+    def cases(self):
+        """(name, callable returning the response/context) for every selected case."""
+        cases = []
+        for name, role, builder in CONTEXT_CASES:
+            cases.append((name, self.context_call(builder, self.users[role])))
+        for name, role, url_name in PAGE_CASES:
+            cases.append((name, self.page_call(reverse(url_name), self.clients[role])))
+        cases.append((UPLOAD_CASE, self.upload_call()))
+
+        if self.only:
+            cases = [(name, call) for name, call in cases if any(part in name for part in self.only)]
+        return cases
+
+    def context_call(self, builder, user):
+        def call():
+            request = self.factory.get("/", self.filters)
+            request.user = user
+            return builder(request)
+        return call
+
+    def page_call(self, url, client):
+        def call():
+            response = client.get(url, self.filters, secure=True)
+            response.content  # PDFs and pages are only done once fully rendered
+            return response
+        return call
+
+    def upload_file(self):
+        students = list(
+            Student.objects.filter(school=self.school, class_group__isnull=False)
+            .select_related("class_group")
+            .order_by("class_group__name", "id")
+        )
+        rows = [UPLOAD_HEADER]
+        for i in range(UPLOAD_ROWS[self.tier]):
+            # Cycle through the school's students, one academic term per pass
+            student = students[i % len(students)]
+            term = ["Term 1", "Term 2", "Term 3"][(i // len(students)) % 3]
+            rows.append(
+                f"{student.first_name},{student.last_name},{student.class_group.name},{self.subject.name},"
+                f"{self.academic_year},{term},{10 + i % 10},12,{8 + i % 7},15,{40 + i % 60}"
+            )
+        return "\n".join(rows).encode()
+
+    def upload_call(self):
+        content = self.upload_file()
+        client = self.clients["teacher"]
+
+        def call():
+            # Every run uploads the same file against the same data, and processes it as the worker would
+            with transaction.atomic():
+                response = client.post(
+                    reverse("teacher:bulk_upload"),
+                    {"file": SimpleUploadedFile("benchmark.csv", content, content_type="text/csv")},
+                    secure=True,
+                )
+                job = imports.run_next()
+                transaction.set_rollback(True)
+            if response.status_code == 202 and (job is None or job.status != "done"):
+                raise BenchmarkError(f"Import job did not finish: {job.message if job else 'not queued'}")
+            return response
+        return call
+
+    # ---- Measurement ----
+
+    def measure(self, call):
+        timings = []
+        # Warm-up run: template compilation and first-import costs are not what we are tracking
+        self.check(self.quiet(call))
+        for _ in range(self.repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                self.quiet(call)
+                timings.append((time.perf_counter() - started) * 1000)
+        return {
+            "median_ms": round(statistics.median(timings), 2),
+            "best_ms": round(min(timings), 2),
+            "queries": len(queries),
+        }
+
+    def quiet(self, call):
+        # The views print progress as they go; keep that work in the timing but off the console
+        with contextlib.redirect_stdout(io.StringIO()):
+            return call()
+
+    def check(self, result):
+        if isinstance(result, HttpResponse) and result.status_code >= 400:
+            raise BenchmarkError(f"HTTP {result.status_code}: {result.content[:200]!r}")
+        if isinstance(result, HttpResponse) and result.status_code in (301, 302) and not result.get("Content-Disposition"):
+            raise BenchmarkError(f"Redirected to {result.get('Location')}")
+
+    def run(self):
+        """Measure every case; a dataset generated for the run is rolled back afterwards unless `keep` is set."""
+        results = {}
+        # Measure the uncached work (what a cache miss costs), and never touch a shared cache
+        no_cache = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+        with override_settings(ALLOWED_HOSTS=["testserver"], CACHES=no_cache), transaction.atomic():
+            generated = self.dataset()
+            self.actors()
+            dataset = {
+                "schools": School.objects.filter(district__region=self.region).count(),
+                "students": Student.objects.filter(district__region=self.region).count(),
+            }
+            for name, call in self.cases():
+                try:
+                    results[name] = self.measure(call)
+                except Exception as e:
+                    # A broken case is reported, not allowed to hide the rest of the suite
+                    results[name] = {"error": f"{type(e).__name__}: {e}"}
+                self.log(format_case(name, results[name]))
+            if generated and not self.keep:
+                transaction.set_rollback(True)
+
+        return {
+            "tier": self.tier,
+            "seed": self.sizes["seed"],
+            "vendor": connection.vendor,
+            "repeat": self.repeat,
+            "created": timezone.now().isoformat(),
+            "dataset": dataset,
+            "cases": results,
+        }
+
+
+def format_case(name, result):
+    if "error" in result:
+        return f"  ❌ {name:<28} {result['error']}"
+    return (
+        f"  {name:<30} median {result['median_ms']:>9.1f}ms  best {result['best_ms']:>9.1f}ms  "
+        f"{result['queries']:>5} queries"
+    )
+
+
+def compare(current, baseline, tolerance=0.25, min_delta_ms=5.0):
+    """
+    Regressions of `current` against `baseline`, as human-readable lines.
+
+    A case regresses when it now errors, runs more queries, or its median is more
+    than `tolerance` (a fraction) slower and at least `min_delta_ms` slower, so
+    jitter on millisecond-scale cases is not reported.
+    """
+    if current["tier"] != baseline["tier"]:
+        raise BenchmarkError(f"Baseline is for the {baseline['tier']} tier, not {current['tier']}")
+
+    regressions = []
+    for name, result in current["cases"].items():
+        previous = baseline["cases"].get(name)
+        if not previous or "error" in previous:
+            continue
+        if "error" in result:
+            regressions.append(f"{name}: {result['error']}")
+            continue
+        if result["queries"] > previous["queries"]:
+            regressions.append(f"{name}: {previous['queries']} → {result['queries']} queries")
+        slower = result["median_ms"] - previous["median_ms"]
+        if slower > min_delta_ms and result["median_ms"] > previous["median_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: median {previous['median_ms']:.1f}ms → {result['median_ms']:.1f}ms")
+    return regressions
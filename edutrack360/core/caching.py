@@ -0,0 +1,258 @@
+"""
+Versioned caching for pages derived from Results.
+
+Every scope - a class, school, circuit or district - has a version counter in the
+cache. A cached entry embeds the versions of the scopes it was built from in its
+key, and every write to Results (create, edit, delete, submit) bumps the versions
+of the scopes it touches. A stale entry is therefore never read again; it just
+ages out of the cache.
+
+In front of the shared cache, each process keeps two small in-memory tiers:
+- Entries read or built recently. Their keys embed versions, so they never go stale.
+- The versions themselves. These are trusted only while core.invalidation delivers
+  every node's bumps, and for at most LOCAL_VERSION_TTL seconds even then.
+"""
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from core import invalidation
+from core.singleflight import single_flight
+
+
+# Result field -> scope type, narrowest first
+SCOPE_FIELDS = {
+    "class_group_id": "class",
+    "school_id": "school",
+    "circuit_id": "circuit",
+    "district_id": "district",
+}
+
+DASHBOARD_TIMEOUT = 60 * 60
+
+# Per process: pickled entries up to this many bytes, and this many scope versions
+LOCAL_ENTRY_BYTES = 32 * 1024 * 1024
+LOCAL_VERSIONS = 10_000
+# A local version is re-read from the shared cache after this long, should a broadcast be lost
+LOCAL_VERSION_TTL = 60
+
+
+class LocalLRU:
+    """A thread-safe in-process mapping that drops the least recently used items beyond `limit` (by `weigh`)."""
+    def __init__(self, limit, weigh=lambda value: 1):
+        self.limit = limit
+        self.weigh = weigh
+        self.items = OrderedDict()
+        self.weight = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.items:
+                return default
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self._discard(key)
+            self.items[key] = value
+            self.weight += self.weigh(value)
+            while self.weight > self.limit and self.items:
+                self._discard(next(iter(self.items)))
+
+    def discard(self, key):
+        with self.lock:
+            self._discard(key)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.weight = 0
+
+    def _discard(self, key):
+        if key in self.items:
+            self.weight -= self.weigh(self.items.pop(key))
+
+
+local_entries = LocalLRU(LOCAL_ENTRY_BYTES, weigh=len)
+local_versions = LocalLRU(LOCAL_VERSIONS)
+# Bumped on every invalidation, so a version read from the shared cache while one
+# arrives is not kept (it may be the value from just before the bump)
+_invalidations = 0
+
+
+def version_key(scope_type, scope_id):
+    return f"scope-version:{scope_type}:{scope_id}"
+
+
+def modified_key(scope_type, scope_id):
+    return f"scope-modified:{scope_type}:{scope_id}"
+
+
+def forget_local_versions(scopes):
+    """Drop this process's copy of the versions of `scopes` (all of them if None)."""
+    global _invalidations
+    _invalidations += 1
+    if scopes is None:
+        local_versions.clear()
+    for scope in scopes or ():
+        local_versions.discard(scope)
+
+
+def scope_versions(scopes):
+    """{(scope type, id): version} for `scopes`, starting a counter for any scope that has none."""
+    invalidation.start(forget_local_versions)
+    trusted = invalidation.listening()
+    versions = {}
+    if trusted:
+        now = time.monotonic()
+        for scope in scopes:
+            local = local_versions.get(scope)
+            if local and local[1] > now:
+                versions[scope] = local[0]
+
+    keys = {scope: version_key(*scope) for scope in scopes if scope not in versions}
+    if not keys:
+        return versions
+    seen_invalidations = _invalidations
+    found = cache.get_many(list(keys.values()))
+    for scope, key in keys.items():
+        if key not in found:
+            # Start from the clock rather than 1: if a counter is evicted, entries built
+            # against its old value can never match the new one
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+        versions[scope] = found[key]
+
+    if trusted and _invalidations == seen_invalidations:
+        expires = time.monotonic() + LOCAL_VERSION_TTL
+        for scope in keys:
+            if versions[scope] is not None:
+                local_versions.set(scope, (versions[scope], expires))
+    return versions
+
+
+def bump_scopes(scopes):
+    """Invalidate everything cached for `scopes`, once the current transaction commits."""
+    scopes = set(scopes)
+
+    def bump():
+        now = time.time()
+        for scope in scopes:
+            try:
+                cache.incr(version_key(*scope))
+            except ValueError:
+                pass  # No counter means nothing has been cached for this scope yet
+            cache.set(modified_key(*scope), now, timeout=None)
+        forget_local_versions(scopes)
+        invalidation.publish(scopes)
+
+    transaction.on_commit(bump)
+
+
+def scopes_modified(scopes):
+    """Unix time `scopes` last changed; a scope with no record counts as changed now."""
+    keys = [modified_key(*scope) for scope in scopes]
+    found = cache.get_many(keys)
+    now = time.time()
+    for key in keys:
+        if key not in found:
+            cache.add(key, now, timeout=None)
+            found[key] = cache.get(key, now)
+    return max(found.values(), default=now)
+
+
+def scopes_of(obj):
+    """(scope type, id) for each scope field set on `obj` (a Result, Student, User, ...)."""
+    return [
+        (scope_type, getattr(obj, field))
+        for field, scope_type in SCOPE_FIELDS.items()
+        if getattr(obj, field, None) is not None
+    ]
+
+
+def get_or_build(name, scopes, params, build, timeout=DASHBOARD_TIMEOUT):
+    """
+    Cached `build()` for `params` (e.g. academic year and term) under the current
+    versions of `scopes`; the value must be picklable. Concurrent misses build it once.
+    """
+    versions = scope_versions(scopes)
+    digest = hashlib.md5(repr((
+        sorted((scope, versions[scope]) for scope in scopes), params,
+    )).encode()).hexdigest()
+    key = f"{name}:{digest}"
+    # Without versions (no shared cache) the key never changes: keep nothing locally
+    local = None not in versions.values()
+
+    def keep(data):
+        # Pickled, like the shared cache, so every caller gets its own copy to modify
+        local_entries.set(key, pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+
+    def lookup():
+        payload = local_entries.get(key) if local else None
+        if payload is not None:
+            return pickle.loads(payload)
+        data = cache.get(key)
+        if data is not None and local:
+            keep(data)
+        return data
+
+    def build_and_store():
+        data = build()
+        cache.set(key, data, timeout)
+        if local:
+            keep(data)
+        return data
+
+    return single_flight(key, lookup, build_and_store)
+
+
+class LocalIndex:
+    """
+    A lookup table built from the database once per process and kept in memory.
+
+    changed() drops this process's copy and bumps a shared version that every other
+    process checks on get(), so they rebuild on their next lookup. A table built while
+    this process has uncommitted changes to its source is used for that transaction
+    only.
+    """
+    def __init__(self, scope, build):
+        self.scope = scope
+        self.build = build
+        self.current = None  # (version, table)
+        # Set while this process has changed the source in a transaction that has not ended yet
+        self.pending = False
+
+    def get(self):
+        if self.pending and not connection.in_atomic_block:
+            self.pending = False  # That transaction has committed or rolled back; rebuild from what is there now
+            self.current = None
+
+        version = scope_versions([self.scope])[self.scope]
+        current = self.current
+        if current is None or current[0] != version:
+            current = (version, self.build())
+            if self.pending:
+                return current[1]
+            self.current = current
+        return current[1]
+
+    def peek(self):
+        """This process's copy, or None; never builds."""
+        return self.current[1] if self.current else None
+
+    def changed(self):
+        self.current = None
+        if connection.in_atomic_block:
+            self.pending = True
+        bump_scopes([self.scope])
+        transaction.on_commit(self.forget)
+
+    def forget(self):
+        self.current = None
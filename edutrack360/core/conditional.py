@@ -0,0 +1,73 @@
+"""
+Conditional GET (ETag / Last-Modified) for the JSON endpoints the dashboards poll.
+
+The validators of a response come from the data versions it is built from (see
+core.caching), not from its body: a client revalidating a response whose scopes
+have not changed gets a 304 Not Modified before the view runs, so nothing is
+built, serialised or sent again.
+"""
+import hashlib
+from functools import wraps
+from math import ceil
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from core import caching
+
+
+def notifications_scope(user_id):
+    return ("notifications", user_id)
+
+
+def data_state(name, scopes, params=(), not_before=None):
+    """
+    (ETag, Last-Modified timestamp) of the response `name` builds from `scopes` and
+    `params`, or None when the versions cannot be known (no shared cache).
+    `not_before` is the earliest Last-Modified, for responses that also change with the date.
+    """
+    versions = caching.scope_versions(scopes)
+    if None in versions.values():
+        return None
+    etag = quote_etag(hashlib.md5(repr((
+        name, sorted(versions.items()), params,
+    )).encode()).hexdigest())
+    last_modified = max(caching.scopes_modified(scopes), not_before or 0)
+    return etag, ceil(last_modified)
+
+
+def notifications_state(request):
+    """data_state() of the logged-in user's notification list at this URL."""
+    user_id = request.user.id
+    return data_state(request.path, [notifications_scope(user_id)], (user_id,))
+
+
+def conditional_get(state, vary=()):
+    """
+    Answer GET requests with 304 Not Modified while `state(request)` - a data_state()
+    or None to skip - still matches the client's copy. `vary` names request headers
+    the response depends on besides the user.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            current = state(request) if request.method in ("GET", "HEAD") else None
+            if current is None:
+                return view_func(request, *args, **kwargs)
+
+            etag, last_modified = current
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view_func(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+
+            response.headers.setdefault("ETag", etag)
+            response.headers.setdefault("Last-Modified", http_date(last_modified))
+            # Per-user data: only the browser may keep it, and it must revalidate before each use
+            patch_cache_control(response, private=True, no_cache=True)
+            if vary:
+                patch_vary_headers(response, vary)
+            return response
+        return wrapper
+    return decorator
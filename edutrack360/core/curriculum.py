@@ -0,0 +1,70 @@
+"""
+Process-local map of which departments offer which subjects (the Subject.department
+many-to-many).
+
+Analysis pages look up the departments of every subject they show and bulk result
+upload matches every row's subject to its class's department; both now read this map
+instead of the database. It is loaded in one query and rebuilt after any change to
+subjects, departments or their membership (see core.signals).
+"""
+from collections import defaultdict
+
+from core import caching
+from core.models import Subject
+
+
+CURRICULUM_SCOPE = ("curriculum", "all")
+
+
+class SubjectDepartmentMap:
+    def __init__(self):
+        rows = (
+            Subject.department.through.objects
+            .values_list("subject_id", "subject__name", "department_id", "department__name")
+            .order_by("department__name", "subject_id")
+        )
+        self.subject_names = {}
+        self.department_names = {}
+        departments_of = defaultdict(list)
+        subjects_of = defaultdict(set)
+        subjects_named = defaultdict(list)
+
+        for subject_id, subject_name, department_id, department_name in rows:
+            self.subject_names[subject_id] = subject_name
+            self.department_names[department_id] = department_name
+            departments_of[subject_id].append(department_id)
+            subjects_of[department_id].add(subject_id)
+            subjects_named[subject_name.lower()].append(subject_id)
+
+        self._departments_of = {subject: tuple(depts) for subject, depts in departments_of.items()}
+        self._subjects_of = {dept: frozenset(subjects) for dept, subjects in subjects_of.items()}
+        self._subjects_named = {name: tuple(sorted(set(ids))) for name, ids in subjects_named.items()}
+
+    def departments_of(self, subject_id):
+        """Department ids offering the subject, by department name."""
+        return self._departments_of.get(subject_id, ())
+
+    def subjects_of(self, department_id):
+        return self._subjects_of.get(department_id, frozenset())
+
+    def offers(self, department_id, subject_id):
+        return subject_id in self.subjects_of(department_id)
+
+    def subject_named(self, name, department_id):
+        """Id of the subject called `name` (any case) that the department offers, or None."""
+        for subject_id in self._subjects_named.get(name.lower(), ()):
+            if self.offers(department_id, subject_id):
+                return subject_id
+        return None
+
+
+_map = caching.LocalIndex(CURRICULUM_SCOPE, SubjectDepartmentMap)
+
+
+def subject_map():
+    return _map.get()
+
+
+def changed():
+    """Call after changing subjects, departments or which departments offer which subjects."""
+    _map.changed()
@@ -10,6 +10,7 @@ from core.models import (
 
 )
 from django.contrib.auth.forms import UserCreationForm
+from core import hierarchy
 from django.core.validators import MinLengthValidator, RegexValidator
 
 User = get_user_model()  
@@ -43,7 +44,7 @@ class AddSchoolForm(forms.ModelForm):
         # Limit circuits to those within the user's district
         if request and hasattr(request.user, 'district'):
             self.fields['circuit'].queryset = Circuit.objects.filter(
-                district=request.user.district
+                district_id=request.user.district_id
             )
             self.request = request  # Save request for validation use
 
@@ -53,7 +54,8 @@ class AddSchoolForm(forms.ModelForm):
         # Safety check for circuit tampering
         circuit = cleaned_data.get('circuit')
         if circuit and hasattr(self.request.user, 'district'):
-            if circuit.district != self.request.user.district:
+            indexed = hierarchy.index().circuits.get(circuit.id)
+            if indexed is None or indexed.district_id != self.request.user.district_id:
                 raise ValidationError("Selected circuit does not belong to your district.")
 
 
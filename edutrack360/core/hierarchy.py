@@ -0,0 +1,104 @@
+"""
+Process-local index of the administrative hierarchy: District -> Circuit -> School,
+plus the SISOs of each district.
+
+The hierarchy is small and rarely changes, but the management endpoints and the
+performance contexts used to re-query it on every request (one query per
+circuit in places). index() builds it once per process in a handful of queries;
+any save or delete of a District, Circuit, School or SISO (see core.signals)
+calls changed(), which drops the local copy and bumps a shared version so every
+other process rebuilds on its next lookup.
+"""
+from collections import defaultdict, namedtuple
+
+from core import caching
+from core.models import District, Circuit, School, User
+
+
+DistrictNode = namedtuple("DistrictNode", "id name region_id")
+CircuitNode = namedtuple("CircuitNode", "id name district_id siso_id")
+SchoolNode = namedtuple("SchoolNode", "id name school_code circuit_id district_id")
+SisoNode = namedtuple("SisoNode", "id first_name last_name district_id")
+
+# One version counter for the whole hierarchy, shared by every process
+HIERARCHY_SCOPE = ("hierarchy", "all")
+
+
+class HierarchyIndex:
+    def __init__(self):
+        self.districts = {
+            row[0]: DistrictNode(*row)
+            for row in District.objects.order_by("id").values_list("id", "name", "region_id")
+        }
+        self.circuits = {
+            row[0]: CircuitNode(*row)
+            for row in Circuit.objects.order_by("id").values_list("id", "name", "district_id", "siso_id")
+        }
+        self.schools = {
+            row[0]: SchoolNode(*row)
+            for row in School.objects.order_by("id").values_list(
+                "id", "name", "school_code", "circuit_id", "district_id"
+            )
+        }
+        self.sisos = {
+            row[0]: SisoNode(*row)
+            for row in User.objects.filter(role="siso").order_by("id").values_list(
+                "id", "first_name", "last_name", "district_id"
+            )
+        }
+
+        circuits_by_district = defaultdict(list)
+        for circuit in self.circuits.values():
+            circuits_by_district[circuit.district_id].append(circuit)
+        schools_by_circuit = defaultdict(list)
+        schools_by_district = defaultdict(list)
+        for school in self.schools.values():
+            schools_by_circuit[school.circuit_id].append(school)
+            schools_by_district[school.district_id].append(school)
+        sisos_by_district = defaultdict(list)
+        for siso in self.sisos.values():
+            sisos_by_district[siso.district_id].append(siso)
+
+        # Tuples, so a caller cannot change the shared index by accident
+        self._circuits_by_district = {key: tuple(value) for key, value in circuits_by_district.items()}
+        self._schools_by_circuit = {key: tuple(value) for key, value in schools_by_circuit.items()}
+        self._schools_by_district = {key: tuple(value) for key, value in schools_by_district.items()}
+        self._sisos_by_district = {key: tuple(value) for key, value in sisos_by_district.items()}
+
+    def circuits_of(self, district_id):
+        return self._circuits_by_district.get(district_id, ())
+
+    def schools_of_circuit(self, circuit_id):
+        return self._schools_by_circuit.get(circuit_id, ())
+
+    def schools_of_district(self, district_id):
+        return self._schools_by_district.get(district_id, ())
+
+    def sisos_of(self, district_id):
+        return self._sisos_by_district.get(district_id, ())
+
+    def ancestors_of(self, school_id):
+        """(circuit, district) of a school; either is None if unknown."""
+        school = self.schools.get(school_id)
+        if school is None:
+            return None, None
+        return self.circuits.get(school.circuit_id), self.districts.get(school.district_id)
+
+
+_index = caching.LocalIndex(HIERARCHY_SCOPE, HierarchyIndex)
+
+
+def index():
+    """The current HierarchyIndex, rebuilt if this or any other process has changed the hierarchy."""
+    return _index.get()
+
+
+def changed():
+    """Call after writing to the hierarchy (the model signals do; bulk writes must call it themselves)."""
+    _index.changed()
+
+
+def may_be_siso(user):
+    """Whether saving `user` can change the SISO lists (it is, or this process last saw it as, a SISO)."""
+    places = _index.peek()
+    return user.role == "siso" or places is None or user.id in places.sisos
@@ -0,0 +1,131 @@
+"""
+Background processing of bulk uploads.
+
+An upload view stores the file in an ImportJob row with enqueue() and answers straight
+away with accepted(); the process_import_jobs command works through the queue,
+oldest job first. While a job runs, its processor records progress - rows done,
+rows failed and each rejected row's message - on the ImportJob row, which the
+upload pages poll (view_common.import_job_status).
+
+The queue is the ImportJob table itself, so no broker is needed: a worker claims
+a job by moving it from queued to running in a single UPDATE, which only one of
+any number of workers can win.
+"""
+import logging
+import os
+import time
+from datetime import timedelta
+
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.models import ImportJob
+
+
+logger = logging.getLogger(__name__)
+
+
+# Job kind -> function(job) that processes job.upload() and returns the closing message
+PROCESSORS = {
+    "results": "core.views.view_teacher.import_results",
+    "teachers": "core.views.view_school.import_teachers",
+    "schools": "core.views.view_cis.import_schools",
+}
+
+# A running job that has not recorded progress for this long lost its worker
+STALE_AFTER = timedelta(minutes=30)
+
+
+def enqueue(kind, user, file):
+    """Store the uploaded `file` and queue it for processing by `kind`'s processor."""
+    return ImportJob.objects.create(kind=kind, user=user, payload=file.read(), file_name=os.path.basename(file.name))
+
+
+def accepted(job):
+    """The upload view's answer: where to poll for the job's progress."""
+    return JsonResponse({
+        "message": "Upload received. It is being processed in the background.",
+        "job_id": job.id,
+        "status_url": reverse("import_job_status", args=[job.id]),
+    }, status=202)
+
+
+def status(job):
+    """What the progress endpoint reports about `job`."""
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "file_name": job.file_name,
+        "status": job.status,
+        "finished": job.status in ("done", "failed"),
+        "rows_done": job.rows_done,
+        "rows_failed": job.rows_failed,
+        "errors": job.errors,
+        "message": job.message,
+    }
+
+
+def claim_next():
+    """Take the oldest queued job for this worker, or None when the queue is empty."""
+    queued = ImportJob.objects.filter(status="queued").order_by("created_at", "id")
+    for job_id in queued.values_list("id", flat=True)[:10]:
+        now = timezone.now()
+        # Only one worker's UPDATE still finds the job queued
+        if ImportJob.objects.filter(pk=job_id, status="queued").update(status="running", started_at=now, updated_at=now):
+            return ImportJob.objects.select_related("user").get(pk=job_id)
+    return None
+
+
+def run(job):
+    """Process a claimed job to the end, recording how it finished."""
+    logger.info(f"Importing {job.kind} from {job.file_name} (job {job.id})")
+    try:
+        process = import_string(PROCESSORS[job.kind])
+        job.message = process(job)
+        job.status = "done"
+    except ValueError as e:
+        # The file itself was rejected (unreadable, wrong columns, ...)
+        job.status, job.message = "failed", str(e)
+    except Exception as e:
+        logger.exception(f"Import job {job.id} failed")
+        job.status, job.message = "failed", f"Unexpected error: {e}"
+
+    # Only the outcome is kept; the upload itself is not needed any more
+    job.payload = None
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "message", "payload", "finished_at", "updated_at"])
+    log = logger.info if job.status == "done" else logger.warning
+    log(f"Import job {job.id} {job.status}: {job.message}")
+    return job
+
+
+def run_next():
+    """Claim and process one queued job; the job, or None if there was none."""
+    job = claim_next()
+    return run(job) if job else None
+
+
+def fail_stale():
+    """Mark running jobs whose worker has stopped as failed, so their users are not left waiting."""
+    return ImportJob.objects.filter(status="running", updated_at__lt=timezone.now() - STALE_AFTER).update(
+        status="failed",
+        message="Processing stopped before the upload was finished; some rows may already have been saved.",
+        finished_at=timezone.now(),
+        updated_at=timezone.now(),
+    )
+
+
+def work(poll_interval=2, once=False, report=None):
+    """Process queued jobs until stopped; with `once`, until the queue is empty. report(job) follows each job."""
+    while True:
+        fail_stale()
+        job = run_next()
+        if job:
+            if report:
+                report(job)
+            continue
+        if once:
+            return
+        time.sleep(poll_interval)
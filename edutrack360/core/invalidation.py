@@ -0,0 +1,120 @@
+"""
+Cross-node invalidation for the process-local cache tier (see core.caching).
+
+Every process keeps the scope versions it has read in memory, trusting them
+only while it is subscribed to a group on the Redis channel layer the
+notification websockets already use. bump_scopes() queues the scopes it
+bumps and a daemon thread publishes them to that group in batches, so every
+process on every node drops its local copy.
+
+Until the subscription is up, or after it drops, a process reads versions
+from the shared cache only. Enabled by CACHE_INVALIDATION_BROADCAST
+(settings.prod).
+"""
+import asyncio
+import logging
+import threading
+import time
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+GROUP = "cache-invalidation"
+# The channel layer forgets group members after its group_expiry (a day by default)
+REJOIN_INTERVAL = 60 * 60
+RETRY_INTERVAL = 5
+
+_lock = threading.Lock()
+_thread = None
+_ready = threading.Event()
+_loop = None
+_outbox = None
+
+
+def enabled():
+    return getattr(settings, "CACHE_INVALIDATION_BROADCAST", False)
+
+
+def listening():
+    """Whether this process is currently receiving every invalidation."""
+    return enabled() and _ready.is_set()
+
+
+def start(on_invalidate):
+    """
+    Start this process's listener (once). on_invalidate(scopes) is called from the
+    listener thread with the scopes bumped anywhere, or with None when messages may
+    have been missed and everything must be dropped.
+    """
+    global _thread
+    if _thread is not None or not enabled():
+        return
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_run, args=(on_invalidate,), name=GROUP, daemon=True)
+            _thread.start()
+
+
+def publish(scopes):
+    """Tell every process that `scopes` were bumped; batched, never blocks the caller."""
+    loop = _loop
+    if loop is not None and listening():
+        loop.call_soon_threadsafe(_outbox.put_nowait, [list(scope) for scope in scopes])
+
+
+def _run(on_invalidate):
+    while True:
+        try:
+            asyncio.run(_listen(on_invalidate))
+        except Exception:
+            logger.exception(f"Cache invalidation listener stopped; retrying in {RETRY_INTERVAL}s")
+        _ready.clear()
+        time.sleep(RETRY_INTERVAL)
+
+
+async def _listen(on_invalidate):
+    global _loop, _outbox
+    layer = get_channel_layer()
+    channel = await layer.new_channel()
+    await layer.group_add(GROUP, channel)
+
+    _outbox = asyncio.Queue()
+    _loop = asyncio.get_running_loop()
+    # Anything bumped while we were not subscribed was missed
+    on_invalidate(None)
+    _ready.set()
+    logger.info("Listening for cache invalidations")
+
+    tasks = [asyncio.ensure_future(_publish(layer)), asyncio.ensure_future(_rejoin(layer, channel))]
+    try:
+        while True:
+            message = await layer.receive(channel)
+            on_invalidate([tuple(scope) for scope in message["scopes"]])
+    finally:
+        _ready.clear()
+        _loop = None
+        for task in tasks:
+            task.cancel()
+
+
+async def _publish(layer):
+    while True:
+        scopes = await _outbox.get()
+        # Everything queued since: one message for a whole upload's worth of bumps
+        while not _outbox.empty():
+            scopes.extend(_outbox.get_nowait())
+        unique = sorted({tuple(scope) for scope in scopes}, key=repr)
+        try:
+            await layer.group_send(GROUP, {"type": "cache.invalidate", "scopes": [list(scope) for scope in unique]})
+        except Exception as e:
+            logger.warning(f"Could not broadcast cache invalidation: {e}")
+
+
+async def _rejoin(layer, channel):
+    while True:
+        await asyncio.sleep(REJOIN_INTERVAL)
+        await layer.group_add(GROUP, channel)
@@ -0,0 +1,283 @@
+"""
+Synthetic load data for benchmarking.
+
+LoadGenerator bulk-creates a deterministic District → Circuit → School → Class →
+Student hierarchy, the staff that use it (CIS, SISOs, headteachers, subject and
+class teachers) and Results / StudentMarks across several academic years and
+terms. Results and marks are streamed to the database one school at a time in
+batches (COPY on PostgreSQL), so national-scale datasets never have to fit in
+memory.
+
+Everything is named after the seed ("Load Region 42", staff ids "L42-...") so
+several datasets can live side by side and be told apart from real data.
+"""
+import io
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core import assignments, hierarchy
+from core.models import (
+    Region, District, Circuit, School, Department, ClassGroup, Subject, Student,
+    Result, StudentMark, User, Teacher, SubjectTeacher, ClassTeacher,
+)
+
+
+SUBJECTS = [
+    "English Language", "Mathematics", "Integrated Science", "Social Studies",
+    "Religious and Moral Education", "Computing", "French", "Ghanaian Language",
+    "Creative Arts and Design",
+]
+TERMS = ["Term 1", "Term 2", "Term 3"]
+
+# Every generated account shares this password so load tests can log in as any role
+LOAD_PASSWORD = "edutrack-load"
+
+RESULT_COLUMNS = [
+    "student_id", "subject_id", "class_group_id", "school_id", "circuit_id", "district_id",
+    "teacher_id", "academic_year", "term", "final_mark", "status", "submitted_at",
+]
+MARK_COLUMNS = ["student_id", "subject_id", "class_group_id", "academic_year", "term", "mark", "is_submitted"]
+
+
+def insert_rows(model, columns, rows, batch_size):
+    """
+    Insert plain tuples without building model instances: COPY ... FROM STDIN on
+    PostgreSQL, batched bulk_create elsewhere. Values must not contain tabs or newlines.
+    """
+    if connection.vendor != "postgresql":
+        model.objects.bulk_create([model(**dict(zip(columns, row))) for row in rows], batch_size=batch_size)
+        return
+
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join("\\N" if value is None else str(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY {model._meta.db_table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+
+class LoadGenerator:
+    def __init__(self, districts=1, circuits=10, schools=30, classes=3, students=40,
+                 years=3, terms=3, end_year=2024, submitted=1.0, seed=42, batch_size=5000,
+                 log=print):
+        self.districts = districts
+        self.circuits = circuits          # per district
+        self.schools = schools            # per circuit
+        self.classes = classes            # per school
+        self.students = students          # per class
+        self.periods = [
+            (f"{year}/{year + 1}", term)
+            for year in range(end_year - years + 1, end_year + 1)
+            for term in TERMS[:terms]
+        ]
+        self.submitted = submitted        # share of (class, subject, period) result sets submitted
+        self.seed = seed
+        self.batch_size = batch_size
+        self.log = log
+
+        self.rng = random.Random(seed)
+        self.password = make_password(LOAD_PASSWORD)
+        self.user_count = 0
+        self.pending_results = []
+        self.pending_marks = []
+        self.stats = {"schools": 0, "students": 0, "results": 0, "marks": 0}
+        self.district_objects = []
+        self.cis_users = []
+
+    @property
+    def expected_marks(self):
+        return (self.districts * self.circuits * self.schools * self.classes * self.students
+                * len(SUBJECTS) * len(self.periods))
+
+    # ---- Shared reference data ----
+
+    def reference_data(self):
+        self.department = Department.objects.get_or_create(name="JHS")[0]
+        self.subject_objects = []
+        for name in SUBJECTS:
+            subject = Subject.objects.filter(name=name).first() or Subject.objects.create(name=name)
+            subject.department.add(self.department)
+            self.subject_objects.append(subject)
+
+    def new_user(self, role, **fields):
+        self.user_count += 1
+        staff_id = f"L{self.seed}-{self.user_count:07d}"
+        return User(
+            staff_id=staff_id,
+            email=f"{staff_id.lower()}@load.edutrack360.test",
+            license_number=f"LOAD-{staff_id}",
+            first_name=role.title(),
+            last_name=str(self.user_count),
+            role=role,
+            password=self.password,
+            **fields,
+        )
+
+    # ---- Hierarchy ----
+
+    def run(self):
+        started = time.perf_counter()
+        self.log(f"🌱 Generating ~{self.expected_marks:,} marks across {len(self.periods)} term(s)...")
+        self.reference_data()
+        region = Region.objects.create(name=f"Load Region {self.seed}")
+
+        for d in range(self.districts):
+            with transaction.atomic():
+                schools = self.district(region, d)
+                # Bulk-created, so no signals told the indexes
+                hierarchy.changed()
+                assignments.changed()
+            for school, classes, teachers in schools:
+                with transaction.atomic():
+                    self.school_results(school, classes, teachers)
+            self.log(
+                f"  District {d + 1}/{self.districts}: {self.stats['marks']:,} marks "
+                f"({time.perf_counter() - started:.0f}s)"
+            )
+
+        self.stats["seconds"] = round(time.perf_counter() - started, 1)
+        return self.stats
+
+    def district(self, region, index):
+        district = District.objects.create(name=f"Load District {index + 1}", region=region)
+        cis = self.new_user("cis", district=district)
+        cis.save()
+        district.cis = cis
+        district.save(update_fields=["cis"])
+        self.district_objects.append(district)
+        self.cis_users.append(cis)
+
+        circuits = Circuit.objects.bulk_create([
+            Circuit(name=f"Load Circuit {index + 1}.{c + 1}", district=district) for c in range(self.circuits)
+        ])
+        sisos = User.objects.bulk_create([
+            self.new_user("siso", district=district, circuit=circuit) for circuit in circuits
+        ])
+        for circuit, siso in zip(circuits, sisos):
+            circuit.siso = siso
+        Circuit.objects.bulk_update(circuits, ["siso"])
+
+        # school_code is a 32-bit integer: each seed gets its own block of a million codes
+        base_code = 900_000_000 + (self.seed % 1000) * 1_000_000 + index * self.circuits * self.schools
+        schools = School.objects.bulk_create([
+            School(
+                name=f"Load School {index + 1}.{c + 1}.{s + 1}",
+                school_code=base_code + c * self.schools + s,
+                circuit=circuit,
+                district=district,
+            )
+            for c, circuit in enumerate(circuits) for s in range(self.schools)
+        ])
+        School.department.through.objects.bulk_create([
+            School.department.through(school_id=school.id, department_id=self.department.id) for school in schools
+        ])
+
+        classes = ClassGroup.objects.bulk_create([
+            ClassGroup(name=f"JHS {level + 1}", school=school, department=self.department)
+            for school in schools for level in range(self.classes)
+        ])
+
+        # One headteacher per school and one subject teacher per subject, teaching every class
+        headteachers = User.objects.bulk_create([
+            self.new_user("headteacher", district=district, circuit=school.circuit, school=school)
+            for school in schools
+        ], batch_size=self.batch_size)
+        for school, headteacher in zip(schools, headteachers):
+            school.headteacher = headteacher
+        School.objects.bulk_update(schools, ["headteacher"], batch_size=self.batch_size)
+
+        teacher_users = User.objects.bulk_create([
+            self.new_user("teacher", district=district, circuit=school.circuit, school=school)
+            for school in schools for _ in self.subject_objects
+        ], batch_size=self.batch_size)
+        teachers = Teacher.objects.bulk_create([
+            Teacher(user=user, school=user.school) for user in teacher_users
+        ], batch_size=self.batch_size)
+        Teacher.assigned_subjects.through.objects.bulk_create([
+            Teacher.assigned_subjects.through(
+                teacher_id=teacher.id, subject_id=self.subject_objects[i % len(self.subject_objects)].id
+            )
+            for i, teacher in enumerate(teachers)
+        ], batch_size=self.batch_size)
+
+        subject_teachers = SubjectTeacher.objects.bulk_create([
+            SubjectTeacher(teacher=teacher, subject=self.subject_objects[i % len(self.subject_objects)])
+            for i, teacher in enumerate(teachers)
+        ], batch_size=self.batch_size)
+
+        per_school = []
+        subject_count = len(self.subject_objects)
+        assigned, class_teachers = [], []
+        for s, school in enumerate(schools):
+            school_classes = classes[s * self.classes:(s + 1) * self.classes]
+            school_teachers = subject_teachers[s * subject_count:(s + 1) * subject_count]
+            for subject_teacher in school_teachers:
+                assigned.extend(
+                    SubjectTeacher.assigned_classes.through(subjectteacher_id=subject_teacher.id, classgroup_id=cg.id)
+                    for cg in school_classes
+                )
+            class_teachers.extend(
+                ClassTeacher(teacher=school_teachers[k % subject_count].teacher, assigned_class=cg)
+                for k, cg in enumerate(school_classes)
+            )
+            per_school.append((school, school_classes, [st.teacher.user for st in school_teachers]))
+        SubjectTeacher.assigned_classes.through.objects.bulk_create(assigned, batch_size=self.batch_size)
+        ClassTeacher.objects.bulk_create(class_teachers, batch_size=self.batch_size)
+
+        return per_school
+
+    # ---- Marks ----
+
+    def school_results(self, school, classes, teachers):
+        students = Student.objects.bulk_create([
+            Student(
+                first_name=f"Student{n + 1}", last_name=f"{cg.name.replace(' ', '')}-{school.school_code}",
+                school=school, class_group=cg, circuit=school.circuit, district=school.district,
+            )
+            for cg in classes for n in range(self.students)
+        ], batch_size=self.batch_size)
+        self.stats["schools"] += 1
+        self.stats["students"] += len(students)
+
+        # Schools and subjects get their own level so the averages and buckets have some spread
+        school_mean = self.rng.gauss(55, 10)
+        subject_shift = [self.rng.gauss(0, 6) for _ in self.subject_objects]
+
+        submitted_at = timezone.now()
+        for academic_year, term in self.periods:
+            for cg in classes:
+                class_students = [st.id for st in students if st.class_group_id == cg.id]
+                for k, subject in enumerate(self.subject_objects):
+                    status = "Submitted" if self.rng.random() < self.submitted else "Pending"
+                    mean = school_mean + subject_shift[k]
+                    for student_id in class_students:
+                        mark = f"{min(100.0, max(0.0, self.rng.gauss(mean, 15))):.2f}"
+                        self.pending_results.append((
+                            student_id, subject.id, cg.id, school.id, school.circuit_id, school.district_id,
+                            teachers[k].id, academic_year, term, mark, status, submitted_at,
+                        ))
+                        self.pending_marks.append((
+                            student_id, subject.id, cg.id, academic_year, term, mark, status == "Submitted",
+                        ))
+                self.flush()
+        self.flush(force=True)
+
+    def flush(self, force=False):
+        if not self.pending_marks or (len(self.pending_marks) < self.batch_size and not force):
+            return
+        insert_rows(Result, RESULT_COLUMNS, self.pending_results, self.batch_size)
+        insert_rows(StudentMark, MARK_COLUMNS, self.pending_marks, self.batch_size)
+        self.stats["results"] += len(self.pending_results)
+        self.stats["marks"] += len(self.pending_marks)
+        self.pending_results = []
+        self.pending_marks = []
+
+    def analyze(self):
+        """Refresh planner statistics, as autovacuum would have on a live database."""
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
@@ -0,0 +1,84 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from core.loadgen import LoadGenerator, SUBJECTS
+from core.rollups import rebuild_summaries
+from core.views.view_cis import get_district_performance_context
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Time get_district_performance_context against a synthetic district (rolled back afterwards).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schools', type=int, default=300)
+        parser.add_argument('--circuits', type=int, default=10)
+        parser.add_argument('--marks', type=int, default=500000)
+        parser.add_argument('--repeat', type=int, default=3)
+        # Its own seed, so it never collides with a dataset kept by generate_load_data
+        parser.add_argument('--seed', type=int, default=999)
+        parser.add_argument('--keep', action='store_true', help='Keep the generated data instead of rolling back')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                cis = self.seed(options)
+                self.run(cis, options['repeat'])
+                if not options['keep']:
+                    raise Rollback()
+        except Rollback:
+            self.stdout.write('🧹 Synthetic data rolled back.')
+
+    def seed(self, options):
+        schools_per_circuit = max(1, options['schools'] // options['circuits'])
+        classes = 3
+        generator = LoadGenerator(
+            circuits=options['circuits'],
+            schools=schools_per_circuit,
+            classes=classes,
+            students=max(1, options['marks'] // (len(SUBJECTS) * options['circuits'] * schools_per_circuit * classes)),
+            years=1,
+            terms=1,
+            seed=options['seed'],
+            log=self.stdout.write,
+        )
+        stats = generator.run()
+        self.stdout.write(
+            f"🌱 Seeded {stats['schools']} schools, {stats['students']} students, {stats['marks']} marks "
+            f"in {stats['seconds']}s"
+        )
+
+        # The page reads the rollups that submit_result maintains; build them in one pass here
+        started = time.perf_counter()
+        academic_year, term = generator.periods[0]
+        summaries = rebuild_summaries(academic_year=academic_year, term=term)
+        self.stdout.write(f"📊 Rolled up {summaries} performance summaries in {time.perf_counter() - started:.1f}s")
+
+        generator.analyze()
+        return generator.cis_users[0]
+
+    def run(self, cis, repeat):
+        request = RequestFactory().get("/cis/district-performance/", {
+            "academic_year": "2024/2025", "term": "Term 1", "circuit_id": "all",
+        })
+        request.user = cis
+
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                get_district_performance_context(request)
+                timings.append(time.perf_counter() - started)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ get_district_performance_context: median {statistics.median(timings):.3f}s, "
+            f"best {min(timings):.3f}s, {len(queries)} queries"
+        ))
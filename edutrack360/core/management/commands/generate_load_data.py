@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+
+from core.loadgen import LoadGenerator, LOAD_PASSWORD
+from core.rollups import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = 'Bulk-generate a deterministic synthetic hierarchy with Results/StudentMarks for load testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--districts', type=int, default=1)
+        parser.add_argument('--circuits', type=int, default=10, help='Circuits per district')
+        parser.add_argument('--schools', type=int, default=30, help='Schools per circuit')
+        parser.add_argument('--classes', type=int, default=3, help='Classes per school')
+        parser.add_argument('--students', type=int, default=40, help='Students per class')
+        parser.add_argument('--years', type=int, default=3, help='Academic years, ending at --end-year')
+        parser.add_argument('--terms', type=int, default=3, choices=[1, 2, 3], help='Terms per academic year')
+        parser.add_argument('--end-year', type=int, default=2024, help='First calendar year of the last academic year')
+        parser.add_argument('--submitted', type=float, default=1.0, help='Share of result sets marked Submitted')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--skip-rollups', action='store_true', help='Do not rebuild PerformanceSummary afterwards')
+
+    def handle(self, *args, **options):
+        generator = LoadGenerator(
+            districts=options['districts'],
+            circuits=options['circuits'],
+            schools=options['schools'],
+            classes=options['classes'],
+            students=options['students'],
+            years=options['years'],
+            terms=options['terms'],
+            end_year=options['end_year'],
+            submitted=options['submitted'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            log=self.stdout.write,
+        )
+        stats = generator.run()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {stats['schools']:,} schools, {stats['students']:,} students, "
+            f"{stats['results']:,} results and {stats['marks']:,} marks in {stats['seconds']}s"
+        ))
+
+        if not options['skip_rollups']:
+            for academic_year, term in generator.periods:
+                summaries = rebuild_summaries(academic_year=academic_year, term=term)
+                self.stdout.write(f"📊 {academic_year} {term}: {summaries:,} performance summaries")
+
+        generator.analyze()
+        self.stdout.write(f"🔑 Generated accounts (staff ids L{options['seed']}-...) use the password '{LOAD_PASSWORD}'.")
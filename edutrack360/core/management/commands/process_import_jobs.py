@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from core.imports import work
+
+
+class Command(BaseCommand):
+    help = 'Process queued bulk uploads (results, teachers, schools) in the background.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll-interval', type=float, default=2, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        self.stdout.write('📥 Processing import jobs...')
+        work(poll_interval=options['poll_interval'], once=options['once'], report=self.report)
+        self.stdout.write(self.style.SUCCESS('✅ Import queue is empty.'))
+
+    def report(self, job):
+        style = self.style.SUCCESS if job.status == 'done' else self.style.ERROR
+        self.stdout.write(style(f'{job.kind.title()} import {job.file_name} (job {job.id}) {job.status}: {job.message}'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from core.rollups import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = 'Rebuild PerformanceSummary rollups from submitted student marks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--academic-year', help='Only rebuild this academic year, e.g. 2024/2025')
+        parser.add_argument('--term', help='Only rebuild this term, e.g. "Term 1"')
+
+    def handle(self, *args, **options):
+        created = rebuild_summaries(
+            academic_year=options['academic_year'],
+            term=options['term'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'✅ Rebuilt {created} performance summaries.'))
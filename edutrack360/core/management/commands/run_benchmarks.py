@@ -0,0 +1,75 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import BenchmarkRunner, BenchmarkError, TIERS, compare
+
+
+class Command(BaseCommand):
+    help = (
+        'Time and count queries for the performance contexts, dashboards, PDF downloads and bulk result '
+        'upload against a synthetic dataset tier, and compare against a stored baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tier', choices=list(TIERS), default='small')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per case, after one warm-up run')
+        parser.add_argument('--only', nargs='+', help='Only run cases whose name contains one of these, e.g. pdf context.school')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--baseline', help='Compare against this JSON file and fail on regressions')
+        parser.add_argument('--update-baseline', action='store_true', help='Write the results to --baseline instead of comparing')
+        parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed median slowdown as a fraction (default 0.25)')
+        parser.add_argument('--min-delta-ms', type=float, default=5.0, help='Ignore slowdowns smaller than this (default 5ms)')
+        parser.add_argument('--keep', action='store_true', help='Keep a generated dataset so later runs can reuse it')
+
+    def handle(self, *args, **options):
+        if options['update_baseline'] and not options['baseline']:
+            raise CommandError('--update-baseline needs --baseline FILE')
+
+        runner = BenchmarkRunner(
+            tier=options['tier'],
+            repeat=options['repeat'],
+            only=options['only'],
+            keep=options['keep'],
+            log=self.stdout.write,
+        )
+        self.stdout.write(f"⏱️ Running the {options['tier']} benchmark tier ({options['repeat']} runs per case)...")
+        try:
+            results = runner.run()
+        except BenchmarkError as e:
+            raise CommandError(str(e))
+
+        if options['output']:
+            self.write(options['output'], results)
+
+        if options['update_baseline']:
+            self.write(options['baseline'], results)
+        elif options['baseline']:
+            self.check_baseline(results, options)
+
+        errors = [name for name, result in results['cases'].items() if 'error' in result]
+        if errors:
+            raise CommandError(f"{len(errors)} case(s) failed: {', '.join(errors)}")
+
+    def write(self, path, results):
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        self.stdout.write(f"💾 Results written to {path}")
+
+    def check_baseline(self, results, options):
+        try:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read baseline {options['baseline']}: {e}")
+
+        try:
+            regressions = compare(results, baseline, options['tolerance'], options['min_delta_ms'])
+        except BenchmarkError as e:
+            raise CommandError(str(e))
+
+        if regressions:
+            for line in regressions:
+                self.stderr.write(f"  ⚠️ {line}")
+            raise CommandError(f"{len(regressions)} regression(s) against {options['baseline']}")
+        self.stdout.write(self.style.SUCCESS(f"✅ No regressions against {options['baseline']}"))
@@ -1,4 +1,5 @@
 from django.contrib.auth.base_user import BaseUserManager
+from django.db import models
 import uuid
 
 class UserManager(BaseUserManager):
@@ -72,3 +73,44 @@ class UserManager(BaseUserManager):
         Generate a unique license number in the format LICENSE-XXXXXXXX.
         """
         return f"LICENSE-{uuid.uuid4().hex[:8]}"
+
+
+class StudentMarkQuerySet(models.QuerySet):
+    def submitted(self):
+        """
+        Marks whose result has been submitted by the headteacher.
+        """
+        return self.filter(is_submitted=True)
+
+    def upsert(self, marks, batch_size=1000):
+        """
+        Insert or update marks on (student, subject, academic_year, term) with
+        one INSERT ... ON CONFLICT statement per batch. An existing mark keeps
+        its is_submitted flag; sync_submitted() derives it from the results.
+        """
+        # ON CONFLICT cannot update the same row twice in one statement; the last mark per key wins
+        latest = {}
+        for mark in marks:
+            latest[(mark.student_id, mark.subject_id, mark.academic_year, mark.term)] = mark
+
+        return self.bulk_create(
+            list(latest.values()),
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["student", "subject", "academic_year", "term"],
+            update_fields=["mark", "class_group"],
+        )
+
+    def sync_submitted(self):
+        """
+        Set is_submitted on these marks from their results: a mark counts while
+        any result for its student, subject, year and term is submitted.
+        """
+        Result = self.model._meta.apps.get_model("core", "Result")
+        return self.update(is_submitted=models.Exists(Result.objects.filter(
+            student=models.OuterRef("student"),
+            subject=models.OuterRef("subject"),
+            academic_year=models.OuterRef("academic_year"),
+            term=models.OuterRef("term"),
+            status="Submitted",
+        )))
@@ -1,5 +1,13 @@
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.db import connections
 from django.shortcuts import redirect
 
+logger = logging.getLogger("core.instrumentation")
+
 # class ForcePasswordChangeMiddleware:
 #     def __init__(self, get_response):
 #         self.get_response = get_response
@@ -10,3 +18,90 @@ from django.shortcuts import redirect
 #             if request.path not in ['/change-password/', '/logout/']:  # Allow password change and logout
 #                 return redirect('/change-password/')
 #         return self.get_response(request)
+
+
+class QueryMetrics:
+    """Database execute wrapper that counts and times every query run through it."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+def query_budget(max_queries):
+    """
+    Declare how many SQL queries a view may issue per request. QueryInstrumentationMiddleware
+    logs a warning when a request goes over it. Works above or below @login_required.
+    """
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Per-request SQL count, SQL time, Python time and response size.
+
+    Every request is logged as one JSON line on the "core.instrumentation" logger, at
+    WARNING when the view's query_budget is exceeded. Staff users also get the numbers
+    back as X-Query-* / Server-Timing response headers (visible in the browser dev tools).
+    Keep it first in MIDDLEWARE so session and auth queries are counted too.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = QueryMetrics()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics))
+            response = self.get_response(request)
+        total_seconds = time.perf_counter() - started
+
+        sql_ms = round(metrics.seconds * 1000, 2)
+        python_ms = round((total_seconds - metrics.seconds) * 1000, 2)
+        size = None if response.streaming else len(response.content)
+        budget = getattr(request, "query_budget", None)
+        over_budget = budget is not None and metrics.count > budget
+
+        record = {
+            "view": request.resolver_match.view_name if request.resolver_match else None,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "queries": metrics.count,
+            "sql_ms": sql_ms,
+            "python_ms": python_ms,
+            "bytes": size,
+            "query_budget": budget,
+        }
+        if over_budget:
+            logger.warning(json.dumps({"event": "query_budget_exceeded", **record}))
+        else:
+            logger.info(json.dumps({"event": "request", **record}))
+
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated and (user.is_staff or user.is_superuser):
+            response["X-Query-Count"] = str(metrics.count)
+            response["X-Query-Time-Ms"] = str(sql_ms)
+            response["X-Python-Time-Ms"] = str(python_ms)
+            if size is not None:
+                response["X-Response-Bytes"] = str(size)
+            if budget is not None:
+                response["X-Query-Budget"] = str(budget)
+            response["Server-Timing"] = f'sql;dur={sql_ms};desc="{metrics.count} queries", python;dur={python_ms}'
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(view_func, "query_budget", None)
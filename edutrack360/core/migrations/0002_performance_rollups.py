@@ -0,0 +1,185 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:59
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Exists, Max, Min, OuterRef, Q, Sum
+
+
+# Score bands as of this migration: (summary field, lower bound), highest first
+BUCKETS = [
+    ('bucket_90_100', 90), ('bucket_80_89', 80), ('bucket_70_79', 70), ('bucket_60_69', 60), ('bucket_55_59', 55),
+    ('bucket_50_54', 50), ('bucket_45_49', 45), ('bucket_40_44', 40), ('bucket_0_39', 0),
+]
+
+# Summary level -> (scope field on PerformanceSummary, how a StudentMark reaches that scope)
+LEVELS = {
+    'class': ('class_group', 'class_group'),
+    'school': ('school', 'student__school'),
+    'circuit': ('circuit', 'student__school__circuit'),
+    'district': ('district', 'student__school__district'),
+}
+
+
+def bucket_counts():
+    counts, upper = {}, None
+    for field, lower in BUCKETS:
+        condition = Q() if field == BUCKETS[-1][0] else Q(mark__gte=lower)
+        if upper is not None:
+            condition &= Q(mark__lt=upper)
+        counts[field] = Count('id', filter=condition)
+        upper = lower
+    return counts
+
+
+def backfill_summaries(apps, schema_editor):
+    """Build the rollups for marks submitted before they were maintained on submission."""
+    StudentMark = apps.get_model('core', 'StudentMark')
+    Result = apps.get_model('core', 'Result')
+    PerformanceSummary = apps.get_model('core', 'PerformanceSummary')
+
+    PerformanceSummary.objects.all().delete()
+    submitted = Result.objects.filter(
+        student=OuterRef('student'),
+        subject=OuterRef('subject'),
+        academic_year=OuterRef('academic_year'),
+        term=OuterRef('term'),
+        status='Submitted',
+    )
+    marks = StudentMark.objects.filter(Exists(submitted), subject__isnull=False, term__isnull=False)
+    for level, (field, path) in LEVELS.items():
+        rows = (
+            marks.filter(**{f'{path}__isnull': False})
+            .values(path, 'subject', 'term', 'academic_year')
+            .annotate(total=Sum('mark'), count=Count('id'), low=Min('mark'), high=Max('mark'), **bucket_counts())
+            .order_by()
+        )
+        PerformanceSummary.objects.bulk_create([
+            PerformanceSummary(
+                level=level,
+                subject_id=row['subject'],
+                term=row['term'],
+                academic_year=row['academic_year'],
+                total_score=row['total'] or 0,
+                mark_count=row['count'],
+                min_score=row['low'],
+                max_score=row['high'],
+                average_score=(Decimal(row['total'] or 0) / row['count']).quantize(Decimal('0.01')),
+                **{f'{field}_id': row[path]},
+                **{bucket: row[bucket] for bucket, _ in BUCKETS},
+            )
+            for row in rows
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='performancesummary',
+            name='bucket_0_39',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='performancesummary',
+            name='bucket_40_44',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='performancesummary',
+            name='bucket_45_49',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='performancesummary',
+            name='bucket_50_54',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='performancesummary',
+            name='bucket_55_59',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='performancesummary',
+            name='bucket_60_69',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='performancesummary',
+            name='bucket_70_79',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='performancesummary',
+            name='bucket_80_89',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='performancesummary',
+            name='bucket_90_100',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='performancesummary',
+            name='level',
+            field=models.CharField(choices=[('class', 'Class'), ('school', 'School'), ('circuit', 'Circuit'), ('district', 'District')], db_index=True, default='school', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='performancesummary',
+            name='mark_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='performancesummary',
+            name='max_score',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True),
+        ),
+        migrations.AddField(
+            model_name='performancesummary',
+            name='min_score',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True),
+        ),
+        migrations.AddField(
+            model_name='performancesummary',
+            name='subject',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='performance_summaries', to='core.subject'),
+        ),
+        migrations.AddField(
+            model_name='performancesummary',
+            name='total_score',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='performancesummary',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AlterField(
+            model_name='performancesummary',
+            name='average_score',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AddConstraint(
+            model_name='performancesummary',
+            constraint=models.UniqueConstraint(condition=models.Q(('level', 'class')), fields=('class_group', 'subject', 'term', 'academic_year'), name='unique_class_summary'),
+        ),
+        migrations.AddConstraint(
+            model_name='performancesummary',
+            constraint=models.UniqueConstraint(condition=models.Q(('level', 'school')), fields=('school', 'subject', 'term', 'academic_year'), name='unique_school_summary'),
+        ),
+        migrations.AddConstraint(
+            model_name='performancesummary',
+            constraint=models.UniqueConstraint(condition=models.Q(('level', 'circuit')), fields=('circuit', 'subject', 'term', 'academic_year'), name='unique_circuit_summary'),
+        ),
+        migrations.AddConstraint(
+            model_name='performancesummary',
+            constraint=models.UniqueConstraint(condition=models.Q(('level', 'district')), fields=('district', 'subject', 'term', 'academic_year'), name='unique_district_summary'),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
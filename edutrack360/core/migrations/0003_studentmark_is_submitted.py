@@ -0,0 +1,32 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:48
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def backfill_is_submitted(apps, schema_editor):
+    StudentMark = apps.get_model('core', 'StudentMark')
+    Result = apps.get_model('core', 'Result')
+    StudentMark.objects.filter(Exists(Result.objects.filter(
+        student=OuterRef('student'),
+        subject=OuterRef('subject'),
+        academic_year=OuterRef('academic_year'),
+        term=OuterRef('term'),
+        status='Submitted',
+    ))).update(is_submitted=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_performance_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentmark',
+            name='is_submitted',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.RunPython(backfill_is_submitted, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:50
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def merge_duplicate_marks(apps, schema_editor):
+    """Keep the newest mark per (student, subject, academic_year, term) and delete the rest in one pass."""
+    StudentMark = apps.get_model('core', 'StudentMark')
+    if schema_editor.connection.vendor == 'postgresql':
+        # Run the delete's deferred foreign key checks now: PostgreSQL cannot add the
+        # constraint below while the table has pending trigger events
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+    StudentMark.objects.filter(Exists(StudentMark.objects.filter(
+        student=OuterRef('student'),
+        subject=OuterRef('subject'),
+        academic_year=OuterRef('academic_year'),
+        term=OuterRef('term'),
+        id__gt=OuterRef('id'),
+    ))).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_studentmark_is_submitted'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_marks, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='studentmark',
+            constraint=models.UniqueConstraint(fields=('student', 'subject', 'academic_year', 'term'), name='unique_student_mark'),
+        ),
+    ]
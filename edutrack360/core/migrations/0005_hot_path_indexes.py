@@ -0,0 +1,29 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_studentmark_unique'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['school', 'academic_year', 'term', 'subject', 'class_group'], name='result_school_scope_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['teacher', 'academic_year', 'term', 'subject', 'class_group'], name='result_teacher_scope_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentmark',
+            index=models.Index(fields=['student', 'academic_year', 'term'], name='studentmark_student_term_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentmark',
+            index=models.Index(fields=['class_group', 'academic_year', 'term'], name='studentmark_class_term_idx'),
+        ),
+    ]
@@ -1,9 +1,11 @@
+import io
+
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.core.validators import MinLengthValidator, RegexValidator
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 from django.db import models
-from .managers import UserManager  # Assuming you have a custom user manager.
+from .managers import UserManager, StudentMarkQuerySet  # Assuming you have a custom user manager.
 from django.conf import settings
 from django.utils import timezone
 
@@ -502,7 +504,33 @@ class Notification(models.Model):
 
 
 
+# Score bands shared by the analysis pages and rollups, highest first: (label, lower bound)
+SCORE_BUCKETS = [
+    ("90-100", 90), ("80-89", 80), ("70-79", 70), ("60-69", 60), ("55-59", 55),
+    ("50-54", 50), ("45-49", 45), ("40-44", 40), ("0-39", 0),
+]
+
+# Coarser bands used by the dashboards and the circuit/district subject-average tables
+SUMMARY_BUCKETS = [
+    ("80-100", 80), ("55-79", 55), ("50-54", 50), ("40-49", 40), ("0-39", 0),
+]
+
+
 class PerformanceSummary(models.Model):
+    LEVEL_CHOICES = [
+        ('class', 'Class'),
+        ('school', 'School'),
+        ('circuit', 'Circuit'),
+        ('district', 'District'),
+    ]
+
+    level = models.CharField(max_length=10, choices=LEVEL_CHOICES, default='school', db_index=True)
+    subject = models.ForeignKey(
+        'core.Subject',
+        on_delete=models.CASCADE,
+        null=True, blank=True,
+        related_name='performance_summaries'
+    )
     class_group = models.ForeignKey(
         'core.ClassGroup',  # Fixed naming issue
         on_delete=models.CASCADE,
@@ -543,12 +571,59 @@ class PerformanceSummary(models.Model):
         choices=ACADEMIC_YEAR_CHOICES,
         default=f"{timezone.now().year}/{timezone.now().year+1}"
     )
-    average_score = models.DecimalField(max_digits=5, decimal_places=2)
+    average_score = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+
+    # Running aggregates maintained by core.rollups when results are submitted
+    total_score = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    mark_count = models.PositiveIntegerField(default=0)
+    min_score = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    max_score = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    bucket_90_100 = models.PositiveIntegerField(default=0)
+    bucket_80_89 = models.PositiveIntegerField(default=0)
+    bucket_70_79 = models.PositiveIntegerField(default=0)
+    bucket_60_69 = models.PositiveIntegerField(default=0)
+    bucket_55_59 = models.PositiveIntegerField(default=0)
+    bucket_50_54 = models.PositiveIntegerField(default=0)
+    bucket_45_49 = models.PositiveIntegerField(default=0)
+    bucket_40_44 = models.PositiveIntegerField(default=0)
+    bucket_0_39 = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['class_group', 'subject', 'term', 'academic_year'],
+                condition=models.Q(level='class'),
+                name='unique_class_summary',
+            ),
+            models.UniqueConstraint(
+                fields=['school', 'subject', 'term', 'academic_year'],
+                condition=models.Q(level='school'),
+                name='unique_school_summary',
+            ),
+            models.UniqueConstraint(
+                fields=['circuit', 'subject', 'term', 'academic_year'],
+                condition=models.Q(level='circuit'),
+                name='unique_circuit_summary',
+            ),
+            models.UniqueConstraint(
+                fields=['district', 'subject', 'term', 'academic_year'],
+                condition=models.Q(level='district'),
+                name='unique_district_summary',
+            ),
+        ]
+
+    @staticmethod
+    def bucket_field(label):
+        """Model field holding the count for a SCORE_BUCKETS label, e.g. '55-59' -> 'bucket_55_59'."""
+        return f"bucket_{label.replace('-', '_')}"
+
+    def bucket_counts(self):
+        return {label: getattr(self, self.bucket_field(label)) for label, _ in SCORE_BUCKETS}
 
     def __str__(self):
-        level = "District" if self.district else "Circuit" if self.circuit else "School"
-        departments = ", ".join(dept.name for dept in self.department.all())  # Handle ManyToManyField
-        return f"{level} Summary - {departments} - {self.term} {self.year}"
+        scope = self.class_group or self.school or self.circuit or self.district
+        return f"{self.get_level_display()} Summary - {scope} - {self.subject} - {self.term} {self.academic_year}"
     
 
 
@@ -707,6 +782,20 @@ class Result(models.Model):
     submitted_at = models.DateTimeField(auto_now_add=True)  # Track submission timestamp
     approved_at = models.DateTimeField(null=True, blank=True)  # Track approval timestamp
 
+    class Meta:
+        indexes = [
+            # headteacher_view_result, submit_result
+            models.Index(
+                fields=["school", "academic_year", "term", "subject", "class_group"],
+                name="result_school_scope_idx",
+            ),
+            # view_result_entries, delete_result_file
+            models.Index(
+                fields=["teacher", "academic_year", "term", "subject", "class_group"],
+                name="result_teacher_scope_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.student.first_name} {self.student.last_name} - {self.subject.name} - {self.term} {self.academic_year}"
 
@@ -775,6 +864,26 @@ class StudentMark(models.Model):
         default=0.00  # Added default value
     )
 
+    # Mirrors Result.status == "Submitted" so dashboards filter on an index instead of joining results
+    is_submitted = models.BooleanField(default=False, db_index=True)
+
+    objects = StudentMarkQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # One mark per student, subject and term; writers upsert against this key
+            models.UniqueConstraint(
+                fields=["student", "subject", "academic_year", "term"],
+                name="unique_student_mark",
+            ),
+        ]
+        indexes = [
+            # School/circuit/district pages reach marks through student__school for a term
+            models.Index(fields=["student", "academic_year", "term"], name="studentmark_student_term_idx"),
+            # Class and subject-teacher pages
+            models.Index(fields=["class_group", "academic_year", "term"], name="studentmark_class_term_idx"),
+        ]
+
     def __str__(self):
         return f"{self.student.first_name} {self.student.last_name} - {self.subject.name}: {self.mark}"
 
@@ -789,3 +898,58 @@ class StudentMark(models.Model):
     @property
     def district(self):
         return self.student.district
+
+
+class ImportJob(models.Model):
+    """A bulk upload waiting for, or processed by, the import worker (see core.imports)."""
+    KIND_CHOICES = [
+        ('results', 'Results'),
+        ('teachers', 'Teachers'),
+        ('schools', 'Schools'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='import_jobs')
+    # The upload itself, kept in the database so a worker on another machine can read it; cleared once processed
+    payload = models.BinaryField(null=True)
+    file_name = models.CharField(max_length=255)  # As uploaded
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+
+    # Rows processed so far, of which rows_failed were rejected with a message in errors
+    rows_done = models.PositiveIntegerField(default=0)
+    rows_failed = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    message = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Workers take the oldest queued job
+            models.Index(fields=['status', 'created_at'], name='importjob_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} import {self.file_name} ({self.status})"
+
+    def upload(self):
+        """The stored upload as a file object named like the original, for the spreadsheet readers."""
+        file = io.BytesIO(self.payload)
+        file.name = self.file_name
+        return file
+
+    def record(self, rows, errors=()):
+        """Add a processed batch of `rows` rows, with the messages of those rejected, to the progress."""
+        self.rows_done += rows
+        self.rows_failed += len(errors)
+        self.errors.extend(errors)
+        self.save(update_fields=['rows_done', 'rows_failed', 'errors', 'updated_at'])
@@ -0,0 +1,47 @@
+"""
+Password hashing for bulk account creation.
+
+Hashing is slow on purpose - PBKDF2 runs hundreds of thousands of iterations - and
+keeps one core busy for the whole run, so hashing a district's worth of new
+accounts one after another takes minutes. hash_passwords() spreads the work over a
+pool of processes, one per core (PASSWORD_HASH_WORKERS to override).
+
+The processes are spawned, not forked: a fork would copy the request's
+database connections and any threads' held locks into the children.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, make_password
+
+
+# Below this many passwords, starting the pool costs more than it saves
+POOL_MIN_PASSWORDS = 8
+
+
+def workers():
+    return getattr(settings, "PASSWORD_HASH_WORKERS", None) or os.cpu_count() or 1
+
+
+def hash_password(hasher, password):
+    # Module level, so the pool's processes can find it; the hasher needs no settings there
+    return make_password(password, hasher=hasher)
+
+
+def hash_passwords(passwords):
+    """make_password() of each of `passwords`, in order, with the default hasher, across the CPU cores."""
+    passwords = list(passwords)
+    hasher = get_hasher()
+    processes = min(workers(), len(passwords))
+    if processes < 2 or len(passwords) < POOL_MIN_PASSWORDS:
+        return [hash_password(hasher, password) for password in passwords]
+
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return list(pool.map(
+            partial(hash_password, hasher), passwords,
+            # A few batches per process: fewer round trips, still evenly spread
+            chunksize=max(1, len(passwords) // (processes * 4)),
+        ))
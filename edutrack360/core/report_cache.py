@@ -0,0 +1,151 @@
+"""
+On-disk cache for the generated performance PDFs.
+
+A PDF is stored under a hash of (report type, filters, data version), where the
+data version is the version of every scope the report reads (see core.caching).
+A repeat download with the same filters, before any Result in those scopes has
+changed, is served straight from disk without building the context or rendering.
+The directory is kept under REPORT_CACHE_MAX_BYTES by dropping the least
+recently served files; entries for old versions are never read again and age
+out the same way.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from functools import wraps
+
+from django.conf import settings
+from django.http import FileResponse
+
+from core import caching
+from core.singleflight import single_flight
+
+
+logger = logging.getLogger(__name__)
+
+
+def cache_dir():
+    return getattr(settings, "REPORT_CACHE_DIR", None)
+
+
+def artifact_paths(digest):
+    directory = cache_dir()
+    return os.path.join(directory, f"{digest}.pdf"), os.path.join(directory, f"{digest}.json")
+
+
+def report_digest(report, scopes, params):
+    """Hash of the report, its filters and its data version, or None if the version is unknown."""
+    versions = caching.scope_versions(scopes)
+    if None in versions.values():
+        return None  # No shared cache to keep versions in (e.g. DummyCache): never reuse a PDF
+    return hashlib.sha256(repr((
+        report, sorted((scope, versions[scope]) for scope in scopes), params,
+    )).encode()).hexdigest()
+
+
+def load(digest):
+    """FileResponse for a stored PDF, or None."""
+    pdf_path, meta_path = artifact_paths(digest)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        pdf = open(pdf_path, "rb")
+    except (OSError, ValueError):
+        return None  # Never stored, or evicted under us
+
+    os.utime(pdf_path)  # Served recently: last to be evicted
+    response = FileResponse(pdf, content_type="application/pdf")
+    response["Content-Disposition"] = meta["content_disposition"]
+    return response
+
+
+def write_atomic(path, data):
+    # Concurrent readers see the old file or the new one, never half of one
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def store(digest, response):
+    pdf_path, meta_path = artifact_paths(digest)
+    os.makedirs(cache_dir(), exist_ok=True)
+    write_atomic(meta_path, json.dumps({"content_disposition": response["Content-Disposition"]}).encode())
+    write_atomic(pdf_path, response.content)
+    evict(getattr(settings, "REPORT_CACHE_MAX_BYTES", 0))
+
+
+def evict(max_bytes):
+    """Delete the least recently served PDFs until the cache fits in `max_bytes`."""
+    entries = []
+    with os.scandir(cache_dir()) as it:
+        for entry in it:
+            if entry.name.endswith(".pdf"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        for stale in (path, path[:-len(".pdf")] + ".json"):
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass  # Another worker evicted it first
+        total -= size
+
+
+def report_context(name, key, build):
+    """
+    `build(request)` shared through the versioned cache (core.caching) by every request
+    with the same `key(request)`, so an analysis page and the PDF downloaded from it -
+    or any number of concurrent viewers - compute the context once. The context must be
+    picklable; a None key builds it uncached.
+    """
+    def context(request):
+        report_key = key(request)
+        if not report_key:
+            return build(request)
+        return caching.get_or_build(name, *report_key, lambda: build(request))
+    return context
+
+
+def cached_report(report, key):
+    """
+    Serve the view's PDF from the report cache. `key(request)` returns the
+    (scopes, params) the report is built from, or None to skip the cache - e.g.
+    for a user the view itself would turn away.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            report_key = key(request) if cache_dir() else None
+            digest = report_digest(report, *report_key) if report_key else None
+            if not digest:
+                return view_func(request, *args, **kwargs)
+
+            def lookup():
+                response = load(digest)
+                if response:
+                    logger.debug(f"Serving cached {report} PDF")
+                return response
+
+            def render():
+                response = view_func(request, *args, **kwargs)
+                if response.status_code == 200 and response.get("Content-Type") == "application/pdf":
+                    try:
+                        store(digest, response)
+                    except OSError as e:
+                        logger.warning(f"Could not cache {report} PDF: {e}")
+                return response
+
+            # Everyone asking for this PDF at once waits on a single render
+            return single_flight(f"report:{digest}", lookup, render)
+        return wrapper
+    return decorator
@@ -0,0 +1,201 @@
+"""
+Incremental performance rollups.
+
+PerformanceSummary keeps sum / count / min / max and a SCORE_BUCKETS histogram
+of submitted marks per (class | school | circuit | district) x subject x term x
+academic year, so district-wide pages read a few hundred summary rows instead
+of scanning every StudentMark.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+
+from core.aggregations import bucket_conditions
+from core.models import District, PerformanceSummary, StudentMark, SCORE_BUCKETS
+
+
+# Summary level -> scope field on PerformanceSummary
+LEVEL_FIELDS = {
+    "class": "class_group",
+    "school": "school",
+    "circuit": "circuit",
+    "district": "district",
+}
+
+# Summary level -> how a StudentMark reaches that scope
+MARK_PATHS = {
+    "class": "class_group",
+    "school": "student__school",
+    "circuit": "student__school__circuit",
+    "district": "student__school__district",
+}
+
+BUCKET_FIELDS = [PerformanceSummary.bucket_field(label) for label, _ in SCORE_BUCKETS]
+
+
+def bucket_aggregates(field="mark"):
+    """Conditional COUNT per score bucket, keyed by the PerformanceSummary field name."""
+    return {
+        PerformanceSummary.bucket_field(label): Count("id", filter=condition)
+        for label, condition in bucket_conditions(field)
+    }
+
+
+def mark_aggregates():
+    return {
+        "total": Sum("mark"),
+        "count": Count("id"),
+        "low": Min("mark"),
+        "high": Max("mark"),
+        **bucket_aggregates(),
+    }
+
+
+def _average(total, count):
+    if not count:
+        return Decimal("0.00")
+    return (Decimal(total) / count).quantize(Decimal("0.01"))
+
+
+def _fold(summary, stats):
+    """Add one batch of aggregated marks into an existing summary row."""
+    summary.total_score += stats["total"] or 0
+    summary.mark_count += stats["count"]
+    summary.min_score = stats["low"] if summary.min_score is None else min(summary.min_score, stats["low"])
+    summary.max_score = stats["high"] if summary.max_score is None else max(summary.max_score, stats["high"])
+    for field in BUCKET_FIELDS:
+        setattr(summary, field, getattr(summary, field) + stats[field])
+    summary.average_score = _average(summary.total_score, summary.mark_count)
+
+
+def _lock_districts(district_ids):
+    """Serialise rollup writers per district, whose summary rows every school's writes share."""
+    list(District.objects.select_for_update().filter(pk__in=district_ids).values_list("pk", flat=True))
+
+
+@transaction.atomic
+def apply_submission(school, academic_year, term, subject_id, class_group_id, student_ids):
+    """Fold a freshly submitted class/subject result set into every rollup level."""
+    marks = StudentMark.objects.filter(
+        student_id__in=student_ids,
+        subject_id=subject_id,
+        class_group_id=class_group_id,
+        academic_year=academic_year,
+        term=term,
+    )
+    stats = marks.aggregate(**mark_aggregates())
+    if not stats["count"]:
+        return
+
+    _lock_districts([school.district_id])
+    scopes = {
+        "class": class_group_id,
+        "school": school.id,
+        "circuit": school.circuit_id,
+        "district": school.district_id,
+    }
+    for level, scope_id in scopes.items():
+        if scope_id is None:
+            continue
+        summary, _ = PerformanceSummary.objects.select_for_update().get_or_create(
+            level=level,
+            subject_id=subject_id,
+            term=term,
+            academic_year=academic_year,
+            **{f"{LEVEL_FIELDS[level]}_id": scope_id},
+        )
+        _fold(summary, stats)
+        summary.save()
+
+
+def _summaries(level, marks):
+    """New summary rows for `marks` grouped by their `level` scope, subject and term."""
+    path = MARK_PATHS[level]
+    rows = (
+        marks.filter(**{f"{path}__isnull": False})
+        .values(path, "subject", "term", "academic_year")
+        .annotate(**mark_aggregates())
+        .order_by()
+    )
+    return [
+        PerformanceSummary(
+            level=level,
+            subject_id=row["subject"],
+            term=row["term"],
+            academic_year=row["academic_year"],
+            total_score=row["total"] or 0,
+            mark_count=row["count"],
+            min_score=row["low"],
+            max_score=row["high"],
+            average_score=_average(row["total"], row["count"]),
+            **{f"{LEVEL_FIELDS[level]}_id": row[path]},
+            **{field: row[field] for field in BUCKET_FIELDS},
+        )
+        for row in rows
+    ]
+
+
+@transaction.atomic
+def rebuild_summaries(academic_year=None, term=None):
+    """Recompute summaries from submitted marks, e.g. to backfill."""
+    filters = {}
+    if academic_year:
+        filters["academic_year"] = academic_year
+    if term:
+        filters["term"] = term
+
+    PerformanceSummary.objects.filter(**filters).delete()
+    marks = StudentMark.objects.submitted().filter(subject__isnull=False, term__isnull=False, **filters)
+
+    created = 0
+    for level in MARK_PATHS:
+        summaries = PerformanceSummary.objects.bulk_create(_summaries(level, marks), batch_size=1000)
+        created += len(summaries)
+    return created
+
+
+def counted_in(marks, scopes=None):
+    """
+    Add to `scopes` ({level: scope ids}) the scopes whose summaries count the
+    submitted ones among `marks`.
+    """
+    scopes = scopes or {level: set() for level in MARK_PATHS}
+    for row in marks.submitted().values_list(*MARK_PATHS.values()).distinct():
+        for level, scope_id in zip(MARK_PATHS, row):
+            if scope_id is not None:
+                scopes[level].add(scope_id)
+    return scopes
+
+
+@transaction.atomic
+def refresh_summaries(scopes, subject_ids, academic_years, terms):
+    """
+    Recompute from the submitted marks the summaries of these subjects and terms
+    in `scopes` ({level: scope ids}), after results are deleted, re-uploaded or
+    queried. Take `scopes` from counted_in() both before and after the change,
+    so the summaries a mark has left are refreshed as well.
+    """
+    if not any(scopes.values()):
+        return
+    _lock_districts(scopes["district"])
+
+    keys = {"subject_id__in": subject_ids, "academic_year__in": academic_years, "term__in": terms}
+    marks = StudentMark.objects.submitted().filter(**keys)
+    for level, scope_ids in scopes.items():
+        if not scope_ids:
+            continue
+        PerformanceSummary.objects.filter(level=level, **keys, **{f"{LEVEL_FIELDS[level]}_id__in": scope_ids}).delete()
+        PerformanceSummary.objects.bulk_create(
+            _summaries(level, marks.filter(**{f"{MARK_PATHS[level]}__in": scope_ids})), batch_size=1000,
+        )
+
+
+def scope_averages(summaries, key):
+    """Weighted average per `key` over summary rows, e.g. per school across all subjects."""
+    rows = (
+        summaries.values(key)
+        .annotate(total=Sum("total_score"), count=Sum("mark_count"))
+        .order_by()
+    )
+    return {row[key]: float(_average(row["total"], row["count"])) for row in rows if row["count"]}
@@ -1,7 +1,17 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.db import transaction
-from core.models import Result, StudentMark, Student, Notification
+from core import caching
+from core import conditional
+from core import assignments
+from core import curriculum
+from core import hierarchy
+from core import rollups
+from core import term_calendar
+from core.models import (
+    Result, StudentMark, Student, Notification, District, Circuit, School, Teacher, User, ResultUploadDeadline,
+    SubjectTeacher, ClassTeacher, ClassGroup, Subject, Department,
+)
 
 
 @receiver(post_save, sender=Result)
@@ -32,17 +42,30 @@ def create_or_update_student_mark(sender, instance, created, **kwargs):
                 instance.student = student  # Link the student to the result
                 instance.save()
 
-        # Now update or create StudentMark
-        student_mark, created = StudentMark.objects.update_or_create(
+        marks = StudentMark.objects.filter(
+            student=instance.student,
+            subject=instance.subject,
+            academic_year=instance.academic_year,
+            term=instance.term,
+        )
+        scopes = rollups.counted_in(marks)
+
+        # Now upsert the StudentMark in a single statement
+        StudentMark.objects.upsert([StudentMark(
             student=instance.student,
             subject=instance.subject,
             academic_year=instance.academic_year,
             term=instance.term,
             class_group=instance.class_group,
-            defaults={"mark": instance.final_mark}
+            mark=instance.final_mark,
+        )])
+        # The status change may submit the mark or, when queried, withdraw it
+        marks.sync_submitted()
+        rollups.refresh_summaries(
+            rollups.counted_in(marks, scopes), [instance.subject_id], [instance.academic_year], [instance.term],
         )
 
-        print(f"{'Created' if created else 'Updated'} StudentMark for {instance.student} - {instance.subject}")
+        print(f"Saved StudentMark for {instance.student} - {instance.subject}")
 
 
 @receiver(post_save, sender=Result)
@@ -55,3 +78,66 @@ def create_notification_for_result_upload(sender, instance, created, **kwargs):
             message=f"{instance.teacher.first_name} {instance.teacher.last_name} uploaded {instance.subject.name} results for {instance.class_group.name}."
         )
 
+
+@receiver([post_save, post_delete], sender=Result)
+def invalidate_result_caches(sender, instance, **kwargs):
+    """Results feed the cached dashboards of their class, school, circuit and district."""
+    caching.bump_scopes(caching.scopes_of(instance))
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=Teacher)
+@receiver([post_save, post_delete], sender=School)
+@receiver([post_save, post_delete], sender=Student)
+def invalidate_staff_caches(sender, instance, update_fields=None, **kwargs):
+    """Staff and school counts (and headteacher names) on the cached dashboards, student names on the cached reports."""
+    if update_fields and set(update_fields) <= {"last_login"}:
+        return  # Every login saves last_login; nothing shown on a dashboard changed
+    caching.bump_scopes(caching.scopes_of(instance))
+
+
+@receiver([post_save, post_delete], sender=ResultUploadDeadline)
+def refresh_term_calendar(sender, instance, **kwargs):
+    """A new or changed upload deadline can move the district's current term, and shows on its dashboards."""
+    term_calendar.changed()
+    caching.bump_scopes([term_calendar.deadline_scope(instance.district_id)])
+
+
+@receiver([post_save, post_delete], sender=Notification)
+def invalidate_notifications(sender, instance, **kwargs):
+    """The notification lists are revalidated against their recipient's version (see core.conditional)."""
+    caching.bump_scopes([conditional.notifications_scope(instance.recipient_id)])
+
+
+@receiver([post_save, post_delete], sender=District)
+@receiver([post_save, post_delete], sender=Circuit)
+@receiver([post_save, post_delete], sender=School)
+@receiver([post_save, post_delete], sender=User)
+def refresh_hierarchy(sender, instance, update_fields=None, **kwargs):
+    """Keep the hierarchy index (core.hierarchy) in step with its districts, circuits, schools and SISOs."""
+    if sender is User and ((update_fields and set(update_fields) <= {"last_login"}) or not hierarchy.may_be_siso(instance)):
+        return
+    hierarchy.changed()
+
+
+@receiver([post_save, post_delete], sender=SubjectTeacher)
+@receiver([post_save, post_delete], sender=ClassTeacher)
+@receiver(post_save, sender=ClassGroup)
+@receiver(m2m_changed, sender=SubjectTeacher.assigned_classes.through)
+@receiver(m2m_changed, sender=Teacher.assigned_subjects.through)
+@receiver(m2m_changed, sender=Subject.department.through)
+def refresh_teacher_assignments(sender, action=None, **kwargs):
+    """Teacher assignment indexes (core.assignments) read these, down to class and subject departments."""
+    if action and not action.startswith("post_"):
+        return  # m2m_changed fires before and after; once is enough
+    assignments.changed()
+
+
+@receiver([post_save, post_delete], sender=Subject)
+@receiver([post_save, post_delete], sender=Department)
+@receiver(m2m_changed, sender=Subject.department.through)
+def refresh_curriculum(sender, action=None, **kwargs):
+    """The subject/department map (core.curriculum) mirrors these."""
+    if action and not action.startswith("post_"):
+        return
+    curriculum.changed()
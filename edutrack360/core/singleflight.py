@@ -0,0 +1,57 @@
+"""
+Request coalescing for expensive work.
+
+When many users ask for the same thing at once (every officer opening the district
+analysis when the upload deadline passes), single_flight() lets one request compute it
+while the rest wait for its result instead of repeating the work. The lock is a cache
+key taken with cache.add, so it holds across gunicorn workers when the cache is
+shared (Redis in production, see settings.prod).
+"""
+import logging
+import time
+import uuid
+
+from django.core.cache import cache
+
+
+logger = logging.getLogger(__name__)
+
+
+# Longer than any report takes to build; a crashed worker's lock simply expires
+LOCK_TIMEOUT = 120
+# How long a request waits on someone else's computation before doing it itself
+WAIT_TIMEOUT = 30
+POLL_INTERVAL = 0.1
+
+
+def single_flight(key, lookup, compute, wait=WAIT_TIMEOUT):
+    """
+    lookup(), or on a miss compute(), which runs for one caller per `key` at a time.
+
+    compute() must publish its result where lookup() finds it (the cache, a file, ...);
+    callers that waited on it then return lookup()'s value. lookup() returns None on a miss.
+    """
+    result = lookup()
+    if result is not None:
+        return result
+
+    lock_key = f"single-flight:{key}"
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + wait
+    while not cache.add(lock_key, token, LOCK_TIMEOUT):
+        # Someone else is computing it: wait for them to publish
+        time.sleep(POLL_INTERVAL)
+        result = lookup()
+        if result is not None:
+            return result
+        if time.monotonic() >= deadline:
+            logger.warning(f"Gave up waiting on {key}; computing it here")
+            return compute()
+
+    try:
+        # It may have been published between our miss and taking the lock
+        result = lookup()
+        return result if result is not None else compute()
+    finally:
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
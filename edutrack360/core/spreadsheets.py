@@ -0,0 +1,98 @@
+"""
+Streaming reader for uploaded CSV / Excel sheets.
+
+read_chunks() yields the data rows of an upload a chunk at a time. Each row is
+a (row number, {column: value}) pair, holding the same values
+pd.read_csv / pd.read_excel(dtype=str) would give: strings, and NaN for empty
+cells. The file is never held in memory whole:
+- CSV goes through pandas' chunked reader.
+- .xlsx goes through openpyxl's read-only mode, one chunk of rows at a time,
+  parsed the way read_excel parses a sheet.
+
+too_long() checks a row's values against the model fields they are saved to.
+"""
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from pandas.io.parsers import TextParser
+
+
+CHUNK_ROWS = 500
+
+
+def read_chunks(file, chunk_rows=None):
+    """Lists of (row number, row) for the uploaded `file`, at most `chunk_rows` (CHUNK_ROWS) each; row numbers start at 1."""
+    chunk_rows = chunk_rows or CHUNK_ROWS
+    if file.name.endswith(".csv"):
+        frames = pd.read_csv(file, dtype=str, chunksize=chunk_rows)
+    elif file.name.endswith(".xlsx"):
+        frames = xlsx_frames(file, chunk_rows)
+    elif file.name.endswith(".xls"):
+        # openpyxl cannot read the legacy format: it is loaded whole
+        sheet = pd.read_excel(file, dtype=str)
+        frames = (sheet.iloc[start:start + chunk_rows] for start in range(0, len(sheet), chunk_rows))
+    else:
+        raise ValueError("Invalid file format. Please upload CSV or Excel.")
+
+    row_number = 0
+    for frame in frames:
+        chunk = []
+        for row in frame.to_dict("records"):
+            row_number += 1
+            chunk.append((row_number, row))
+        yield chunk
+
+
+def cell_value(cell):
+    # As pandas' openpyxl reader converts cells
+    if cell.value is None:
+        return ""
+    if cell.data_type == TYPE_ERROR:
+        return np.nan
+    if cell.data_type == TYPE_NUMERIC:
+        as_int = int(cell.value)
+        return as_int if as_int == cell.value else float(cell.value)
+    return cell.value
+
+
+def xlsx_frames(file, chunk_rows):
+    """DataFrames of up to `chunk_rows` rows of the first sheet, read in openpyxl's read-only mode."""
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        sheet.reset_dimensions()  # Some writers record a wrong sheet size
+        rows = ([cell_value(cell) for cell in row] for row in sheet.rows)
+
+        header = next(rows, [])
+        while header and header[-1] == "":
+            header.pop()
+        if not header:
+            return
+
+        chunk, blank = [], []
+        for row in rows:
+            # Sized to the header; read_excel drops blank rows only at the end of the sheet
+            row = (row + [""] * len(header))[:len(header)]
+            if all(value == "" for value in row):
+                blank.append(row)
+                continue
+            chunk += blank
+            blank = []
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                yield TextParser([header, *chunk], header=0, dtype=str).read()
+                chunk = []
+        if chunk:
+            yield TextParser([header, *chunk], header=0, dtype=str).read()
+    finally:
+        workbook.close()
+
+
+def too_long(model, values):
+    """The first of `values` (field -> value) longer than its `model` field allows, or None."""
+    for field, value in values.items():
+        max_length = model._meta.get_field(field).max_length
+        if max_length and len(value) > max_length:
+            return field
+    return None
@@ -0,0 +1,97 @@
+"""
+Academic year / term calendar shared by the dashboards, analysis pages and reports.
+
+The year and term lists never change at runtime, so they are built once at import.
+The "current" period of a district is the latest one it has set a
+ResultUploadDeadline for. The periods of all districts are kept in a process-local
+table (caching.LocalIndex), rebuilt whenever a deadline is saved or deleted
+(see core.signals).
+"""
+from functools import lru_cache
+
+from core import caching
+from core.models import ResultUploadDeadline
+
+
+TERMS = ["Term 1", "Term 2", "Term 3"]
+ACADEMIC_YEARS = [f"{year}/{year + 1}" for year in range(2020, 2050)]
+
+# Used when a district has no upload deadline to say otherwise
+DEFAULT_ACADEMIC_YEAR = "2024/2025"
+DEFAULT_TERM = "Term 1"
+
+CALENDAR_SCOPE = ("term-calendar", "all")
+
+_VALID_YEARS = frozenset(ACADEMIC_YEARS)
+_VALID_TERMS = frozenset(TERMS)
+
+
+@lru_cache(maxsize=256)
+def normalize_academic_year(value):
+    """'2024/2025' or '2024' -> '2024/2025'; None if it cannot be read as an academic year."""
+    value = (value or "").strip()
+    try:
+        base_year = int(value.split("/")[0])
+    except ValueError:
+        return None
+    return f"{base_year}/{base_year + 1}"
+
+
+def latest_periods():
+    """{district id: (academic year, term)} of each district's latest upload deadline, in one query."""
+    periods = {}
+    deadlines = ResultUploadDeadline.objects.order_by(
+        "district_id", "-academic_year", "-term", "-deadline_date",
+    ).values_list("district_id", "academic_year", "term")
+    for district_id, academic_year, term in deadlines:
+        periods.setdefault(district_id, (academic_year, term))
+    return periods
+
+
+_periods = caching.LocalIndex(CALENDAR_SCOPE, latest_periods)
+
+
+def current_period(district_id):
+    """(academic year, term) of the district's latest result upload deadline, or None."""
+    if not district_id:
+        return None
+    return _periods.get().get(district_id)
+
+
+def changed():
+    """Call after changing upload deadlines (the model signals do)."""
+    _periods.changed()
+
+
+def deadline_scope(district_id):
+    """Versioned scope (see core.caching) of a district's upload deadlines."""
+    return ("deadline", district_id)
+
+
+def selected_period(request, district_id=None):
+    """
+    The (academic year, term) a page should show: the request's academic_year / term
+    filters when valid, otherwise the district's current period, otherwise the defaults.
+    """
+    if district_id is None:
+        district_id = getattr(request.user, "district_id", None)
+    current_year, current_term = current_period(district_id) or (DEFAULT_ACADEMIC_YEAR, DEFAULT_TERM)
+
+    academic_year = normalize_academic_year(request.GET.get("academic_year"))
+    if academic_year not in _VALID_YEARS:
+        academic_year = current_year
+
+    term = (request.GET.get("term") or "").strip()
+    if term not in _VALID_TERMS:
+        # The current term only makes sense as a default within the current year
+        term = current_term if academic_year == current_year else DEFAULT_TERM
+    return academic_year, term
+
+
+@lru_cache(maxsize=1)
+def filter_options():
+    """Year and term choices in the {"id", "name"} shape the filter dropdowns expect."""
+    return {
+        "terms": [{"id": i + 1, "name": term} for i, term in enumerate(TERMS)],
+        "academic_years": [{"id": int(year[:4]), "name": year} for year in ACADEMIC_YEARS],
+    }
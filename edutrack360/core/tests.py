@@ -1 +1,1298 @@
+import contextlib
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
 
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Exists, F, OuterRef
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+from core import (
+    assignments, caching, curriculum, hierarchy, imports, invalidation, report_cache, singleflight,
+    rollups, spreadsheets, term_calendar,
+)
+from core.aggregations import score_histogram, subject_departments, window_filter
+from core.analytics import MarkFrame, factorize, histogram, trend_window
+from core.benchmarks import BenchmarkRunner, compare
+from core.loadgen import SUBJECTS, LoadGenerator
+from core.middlewares import QueryInstrumentationMiddleware, query_budget
+from core.models import (
+    Region, District, Circuit, School, Department, ClassGroup,
+    Subject, Student, Result, StudentMark, User, ResultUploadDeadline, Notification,
+    Teacher, SubjectTeacher, ClassTeacher, ImportJob, PerformanceSummary, SCORE_BUCKETS, SUMMARY_BUCKETS,
+)
+from core.views import view_cis, view_teacher
+
+
+class ResultSubmissionTests(TestCase):
+    YEAR, TERM = "2024/2025", "Term 1"
+
+    def setUp(self):
+        cache.clear()
+        region = Region.objects.create(name="Submit Region")
+        self.district = District.objects.create(name="Submit District", region=region)
+        circuit = Circuit.objects.create(name="Submit Circuit", district=self.district)
+        self.school = School.objects.create(name="Submit School", school_code=770001, circuit=circuit, district=self.district)
+        jhs = Department.objects.create(name="JHS")
+        self.class_group = ClassGroup.objects.create(name="JHS 1", school=self.school, department=jhs)
+        self.subject = Subject.objects.create(name="Mathematics")
+        self.headteacher = User.objects.create(
+            staff_id="SUB-HT", email="ht@example.com", role="headteacher", school=self.school,
+            district=self.district, circuit=circuit, license_number="SUB-HT",
+        )
+        self.teacher = User.objects.create(
+            staff_id="SUB-T", email="teacher@example.com", role="teacher", school=self.school,
+            district=self.district, circuit=circuit, license_number="SUB-T",
+        )
+        self.results = [self.result(name, mark) for name, mark in [("Ama", 40), ("Kofi", 80)]]
+
+    def result(self, first_name, final_mark, **values):
+        student = Student.objects.get_or_create(
+            first_name=first_name, last_name="Mensah", school=self.school, class_group=self.class_group,
+        )[0]
+        with contextlib.redirect_stdout(io.StringIO()):
+            return Result.objects.create(
+                student=student, subject=self.subject, class_group=self.class_group, school=self.school,
+                teacher=self.teacher, academic_year=self.YEAR, term=self.TERM, final_mark=final_mark, **values,
+            )
+
+    def submit(self):
+        self.client.force_login(self.headteacher)
+        return self.client.post(reverse("school:submit_result"), {
+            "year": self.YEAR, "term": self.TERM, "subject_id": self.subject.id, "class_id": self.class_group.id,
+        }, secure=True)
+
+    def summary(self, level="class"):
+        return PerformanceSummary.objects.filter(level=level, subject=self.subject, academic_year=self.YEAR, term=self.TERM).first()
+
+    def test_results_are_submitted_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.submit().status_code, 200)
+        if connection.vendor == "postgresql":
+            self.assertTrue(any("FOR UPDATE" in q["sql"] for q in queries))
+        self.assertEqual(self.submit().json(), {"error": "Result has already been submitted"})
+
+        self.assertEqual(StudentMark.objects.submitted().count(), 2)
+        for level in ("class", "school", "circuit", "district"):
+            summary = self.summary(level)
+            self.assertEqual((summary.mark_count, summary.total_score, summary.average_score), (2, 120, 60))
+
+    def test_re_upload_keeps_the_mark_submitted(self):
+        self.submit()
+        ama = self.results[0]
+        view_teacher.save_uploaded_results([Result(
+            student=ama.student, subject=self.subject, class_group=self.class_group, school=self.school,
+            teacher=self.teacher, academic_year=self.YEAR, term=self.TERM, final_mark=50,
+        )], [], {})
+        self.result("Ama", 60)  # Manual upload, saved through the post_save signal
+
+        self.assertEqual(StudentMark.objects.submitted().count(), 2)
+
+    def test_deleting_submitted_results_withdraws_their_marks(self):
+        self.submit()
+        self.client.force_login(self.teacher)
+        response = self.client.delete(reverse("teacher:delete_result_entry", args=[self.results[0].id]), secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(StudentMark.objects.submitted().values_list("student__first_name", flat=True)), ["Kofi"])
+
+        request = RequestFactory().delete("/")
+        request.user = self.teacher
+        view_teacher.delete_result_file(request, "2024-2025", "term-1", self.subject.id, self.class_group.id)
+        self.assertFalse(StudentMark.objects.submitted().exists())
+
+    def assertSummaries(self, count, total):
+        for level in ("class", "school", "circuit", "district"):
+            summary = self.summary(level)
+            self.assertEqual((summary.mark_count, summary.total_score), (count, total), level)
+
+    def test_rollups_follow_changes_to_submitted_results(self):
+        self.submit()
+        self.assertSummaries(2, 120)
+
+        self.result("Kofi", 70)  # Re-upload of a submitted mark
+        self.assertSummaries(2, 110)
+
+        ama = self.results[0]
+        ama.status = "Queried"
+        with contextlib.redirect_stdout(io.StringIO()):
+            ama.save()
+        self.assertSummaries(1, 70)
+
+        self.client.force_login(self.teacher)
+        self.client.delete(reverse("teacher:delete_result_entry", args=[self.results[1].id]), secure=True)
+        self.assertIsNone(self.summary())
+        self.assertEqual(rollups.rebuild_summaries(), 0)
+
+    def test_bulk_re_upload_updates_the_rollups(self):
+        self.submit()
+        kofi = self.results[1]
+        view_teacher.save_uploaded_results([Result(
+            student=kofi.student, subject=self.subject, class_group=self.class_group, school=self.school,
+            teacher=self.teacher, academic_year=self.YEAR, term=self.TERM, final_mark=90,
+        )], [], {})
+        self.assertSummaries(2, 130)
+
+
+class DistrictPerformanceContextTests(TestCase):
+    YEAR, TERM = "2024/2025", "Term 1"
+
+    def setUp(self):
+        cache.clear()
+        region = Region.objects.create(name="Context Region")
+        district = District.objects.create(name="Context District", region=region)
+        north = Circuit.objects.create(name="North", district=district)
+        south = Circuit.objects.create(name="South", district=district)
+        self.school = School.objects.create(name="North School", school_code=660101, circuit=north, district=district)
+        School.objects.create(name="South School", school_code=660102, circuit=south, district=district)
+        jhs = Department.objects.create(name="JHS")
+        classes = {name: ClassGroup.objects.create(name=name, school=self.school, department=jhs) for name in ("JHS 1", "JHS 2")}
+        subjects = {}
+        for name in ("Mathematics", "English"):
+            subjects[name] = Subject.objects.create(name=name)
+            subjects[name].department.add(jhs)
+        self.cis = User.objects.create(staff_id="CTX1", email="ctx@example.com", role="cis", district=district, license_number="CTX-1")
+        teacher = User.objects.create(
+            staff_id="CTX2", email="ctx-teacher@example.com", role="teacher", school=self.school,
+            district=district, circuit=north, license_number="CTX-2",
+        )
+
+        for i, (class_name, subject, year, term, mark, status) in enumerate([
+            ("JHS 1", "Mathematics", self.YEAR, self.TERM, 40, "Submitted"),
+            ("JHS 1", "Mathematics", self.YEAR, self.TERM, 80, "Submitted"),
+            ("JHS 1", "English", self.YEAR, self.TERM, 60, "Submitted"),
+            ("JHS 2", "Mathematics", self.YEAR, self.TERM, 70, "Submitted"),
+            ("JHS 2", "English", self.YEAR, self.TERM, 95, "Pending"),  # Not submitted: left out everywhere
+            ("JHS 1", "Mathematics", "2023/2024", "Term 3", 50, "Submitted"),
+            ("JHS 1", "English", "2023/2024", "Term 2", 30, "Queried"),
+        ]):
+            student = Student.objects.create(
+                first_name="Student", last_name=str(i), school=self.school, class_group=classes[class_name],
+                circuit=north, district=district,
+            )
+            # Saved one by one, so the post_save signal writes the marks and their rollups
+            with contextlib.redirect_stdout(io.StringIO()):
+                Result.objects.create(
+                    student=student, subject=subjects[subject], class_group=classes[class_name], school=self.school,
+                    teacher=teacher, academic_year=year, term=term, final_mark=mark, status=status,
+                )
+
+    def context(self):
+        request = RequestFactory().get("/", {"academic_year": self.YEAR, "term": self.TERM})
+        request.user = self.cis
+        with contextlib.redirect_stdout(io.StringIO()):
+            return view_cis.get_district_performance_context(request)
+
+    def test_context_matches_the_submitted_marks(self):
+        north, south = self.context()["circuits"]
+
+        self.assertEqual(north["school_departments"]["North School"], {"JHS": {
+            "subjects": {"Mathematics": {"JHS 1": 60.0, "JHS 2": 70.0}, "English": {"JHS 1": 60.0}},
+            "all_classes": ["JHS 1", "JHS 2"],
+        }})
+        self.assertEqual(north["school_subject_averages"]["North School"], {"JHS": {"Mathematics": 63.33, "English": 60.0}})
+        self.assertEqual(north["school_subjects"]["North School"], {"Mathematics": 63.33, "English": 60.0})
+        self.assertEqual(north["school_score_buckets"]["North School"], {"80-100": 0, "55-79": 2, "50-54": 0, "40-49": 0, "0-39": 0})
+        chart = north["school_chart_data"]["North School"]["JHS"]
+        self.assertEqual(chart["labels"], ["JHS 1", "JHS 2"])
+        self.assertCountEqual(chart["datasets"], [
+            {"label": "Mathematics", "data": [60.0, 70.0]},
+            {"label": "English", "data": [60.0, 0]},
+        ])
+
+        self.assertEqual(north["term_trend"], {
+            "Circuit": "North", "Term 2 (2023/2024)": "-", "Term 3 (2023/2024)": 50.0, "Term 1 (2024/2025)": 62.5,
+        })
+        self.assertEqual(north["academic_trend"], {"Circuit": "North", "2022/2023": "-", "2023/2024": 50.0, "2024/2025": 62.5})
+        self.assertEqual(north["term_chart"]["data"], [None, 50.0, 62.5])
+
+        self.assertEqual(south["school_subjects"], {"South School": {}})
+        self.assertEqual(south["school_score_buckets"]["South School"], {"80-100": 0, "55-79": 0, "50-54": 0, "40-49": 0, "0-39": 0})
+        self.assertEqual(south["term_trend"]["Term 1 (2024/2025)"], "-")
+
+
+class MarkFrameTests(TestCase):
+    def test_none_keys_are_grouped(self):
+        subjects = np.empty(5, dtype=object)
+        subjects[:] = ["Science", None, "English", "Science", None]
+        codes, uniques, first = factorize(subjects)
+        self.assertEqual(codes.tolist(), [0, 1, 2, 0, 1])
+        self.assertEqual(uniques.tolist(), ["Science", None, "English"])
+        self.assertEqual(first.tolist(), [0, 1, 2])
+
+        frame = MarkFrame({"subject": subjects}, np.array([60.0, 40, 70, 80, 50]))
+        self.assertEqual(frame.means("subject"), {"Science": 70.0, None: 45.0, "English": 70.0})
+        self.assertEqual(MarkFrame({"subject": subjects[:0]}, np.zeros(0)).means("subject"), {})
+
+
+class ScoreBucketTests(TestCase):
+    MARKS = [39.5, 40, 79.5, 80, 100]
+
+    def setUp(self):
+        region = Region.objects.create(name="Bucket Region")
+        district = District.objects.create(name="Bucket District", region=region)
+        circuit = Circuit.objects.create(name="Bucket Circuit", district=district)
+        school = School.objects.create(name="Bucket School", school_code=660201, circuit=circuit, district=district)
+        subject = Subject.objects.create(name="Mathematics")
+        StudentMark.objects.bulk_create([
+            StudentMark(
+                student=Student.objects.create(first_name="Student", last_name=str(mark), school=school),
+                subject=subject, academic_year="2024/2025", term="Term 1", mark=mark,
+            )
+            for mark in self.MARKS
+        ])
+
+    def test_fractional_marks_fall_in_the_band_below_the_next_bound(self):
+        self.assertEqual(score_histogram(StudentMark.objects.all()), {
+            "90-100": 1, "80-89": 1, "70-79": 1, "60-69": 0, "55-59": 0,
+            "50-54": 0, "45-49": 0, "40-44": 1, "0-39": 1,
+        })
+        self.assertEqual(score_histogram(StudentMark.objects.all(), buckets=SUMMARY_BUCKETS), {
+            "80-100": 2, "55-79": 1, "50-54": 0, "40-49": 1, "0-39": 1,
+        })
+        # The rollups and the NumPy kernel band marks the same way
+        stats = StudentMark.objects.aggregate(**rollups.bucket_aggregates())
+        self.assertEqual(
+            {label: stats[PerformanceSummary.bucket_field(label)] for label, _ in SCORE_BUCKETS},
+            score_histogram(StudentMark.objects.all()),
+        )
+        self.assertEqual(histogram(self.MARKS), score_histogram(StudentMark.objects.all()))
+        self.assertEqual(histogram(self.MARKS, SUMMARY_BUCKETS), score_histogram(StudentMark.objects.all(), buckets=SUMMARY_BUCKETS))
+
+
+class StudentMarkUpsertTests(TestCase):
+    def setUp(self):
+        region = Region.objects.create(name="Upsert Region")
+        district = District.objects.create(name="Upsert District", region=region)
+        circuit = Circuit.objects.create(name="Upsert Circuit", district=district)
+        school = School.objects.create(name="Upsert School", school_code=660301, circuit=circuit, district=district)
+        department = Department.objects.create(name="JHS")
+        self.jhs1 = ClassGroup.objects.create(name="JHS 1", school=school, department=department)
+        self.jhs2 = ClassGroup.objects.create(name="JHS 2", school=school, department=department)
+        self.subject = Subject.objects.create(name="Mathematics")
+        self.student = Student.objects.create(first_name="Ama", last_name="Mensah", school=school, class_group=self.jhs1)
+
+    def mark(self, mark, class_group, term="Term 1", **values):
+        return StudentMark(
+            student=self.student, subject=self.subject, class_group=class_group,
+            academic_year="2024/2025", term=term, mark=mark, **values,
+        )
+
+    def test_last_mark_per_key_wins_within_a_call(self):
+        StudentMark.objects.upsert([self.mark(50, self.jhs1), self.mark(65, self.jhs1, term="Term 2"), self.mark(70, self.jhs2)])
+        self.assertEqual(
+            sorted(StudentMark.objects.values_list("term", "mark", "class_group")),
+            [("Term 1", 70, self.jhs2.id), ("Term 2", 65, self.jhs1.id)],
+        )
+
+    def test_existing_mark_is_updated_in_place(self):
+        existing = StudentMark.objects.create(
+            student=self.student, subject=self.subject, class_group=self.jhs1,
+            academic_year="2024/2025", term="Term 1", mark=60, is_submitted=True,
+        )
+        StudentMark.objects.upsert([self.mark(75, self.jhs2)])
+        mark = StudentMark.objects.get()
+        self.assertEqual((mark.id, mark.mark, mark.class_group, mark.is_submitted), (existing.id, 75, self.jhs2, True))
+
+
+class StudentMarkMigrationTests(TransactionTestCase):
+    def test_duplicate_marks_are_merged_before_the_unique_constraint(self):
+        from django.db.migrations.executor import MigrationExecutor
+
+        executor = MigrationExecutor(connection)
+        latest = executor.loader.graph.leaf_nodes("core")
+        executor.migrate([("core", "0003_studentmark_is_submitted")])
+        try:
+            apps = executor.loader.project_state([("core", "0003_studentmark_is_submitted")]).apps
+            Mark = apps.get_model("core", "StudentMark")
+            school = apps.get_model("core", "School").objects.create(name="Merge School", school_code=660401)
+            student = apps.get_model("core", "Student").objects.create(first_name="Ama", last_name="Mensah", school=school)
+            subject = apps.get_model("core", "Subject").objects.create(name="Mathematics")
+            for term, mark in [("Term 1", 50), ("Term 1", 60), ("Term 1", 70), ("Term 2", 80)]:
+                Mark.objects.create(student=student, subject=subject, academic_year="2024/2025", term=term, mark=mark)
+
+            executor = MigrationExecutor(connection)
+            executor.migrate([("core", "0004_studentmark_unique")])
+            self.assertEqual(sorted(Mark.objects.values_list("term", "mark")), [("Term 1", 70), ("Term 2", 80)])
+        finally:
+            MigrationExecutor(connection).migrate(latest)
+
+
+class HotQueryPlanTests(TestCase):
+    """
+    EXPLAIN the hot result/mark lookups behind the result and analysis pages and fail
+    if any of them falls back to a full scan of core_result or core_studentmark, or
+    stops using the composite index added for it.
+
+    The seeded tables are tiny, so on PostgreSQL sequential scans are priced out
+    (enable_seqscan = off): the planner still picks one when no usable index exists.
+    """
+
+    HOT_TABLES = ("core_result", "core_studentmark")
+    YEAR, TERM = "2024/2025", "Term 1"
+
+    @classmethod
+    def setUpTestData(cls):
+        region = Region.objects.create(name="Plan Region")
+        district = District.objects.create(name="Plan District", region=region)
+        circuit = Circuit.objects.create(name="Plan Circuit", district=district)
+        department = Department.objects.create(name="JHS")
+        cls.subject = Subject.objects.create(name="Mathematics")
+        cls.subject.department.add(department)
+        cls.teacher = User.objects.create(
+            staff_id="PLAN1", email="plan@example.com", role="teacher",
+            district=district, circuit=circuit, license_number="PLAN-1",
+        )
+
+        results, marks = [], []
+        for s in range(3):
+            school = School.objects.create(name=f"Plan School {s}", school_code=880000 + s, circuit=circuit, district=district)
+            class_group = ClassGroup.objects.create(name="JHS 1", school=school, department=department)
+            for i in range(20):
+                student = Student.objects.create(
+                    first_name="Student", last_name=f"{s}-{i}", school=school,
+                    class_group=class_group, circuit=circuit, district=district,
+                )
+                for year, term in [("2023/2024", "Term 3"), (cls.YEAR, cls.TERM)]:
+                    results.append(Result(
+                        student=student, subject=cls.subject, class_group=class_group, school=school,
+                        circuit=circuit, district=district, teacher=cls.teacher,
+                        academic_year=year, term=term, final_mark=50, status="Submitted",
+                    ))
+                    marks.append(StudentMark(
+                        student=student, subject=cls.subject, class_group=class_group,
+                        academic_year=year, term=term, mark=50, is_submitted=True,
+                    ))
+        Result.objects.bulk_create(results)
+        StudentMark.objects.bulk_create(marks)
+
+        cls.school = school
+        cls.class_group = class_group
+
+    def setUp(self):
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE core_result, core_studentmark, core_student")
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def full_scans(self, plan):
+        if connection.vendor == "postgresql":
+            pattern = r"Seq Scan on (\w+)"
+        else:
+            pattern = r"\bSCAN (\w+)"
+        return [table for table in re.findall(pattern, plan) if table in self.HOT_TABLES]
+
+    def assertIndexed(self, queryset, index=None):
+        """No full scan of a hot table; when `index` is given, the plan must use that index."""
+        plan = queryset.explain()
+        self.assertEqual(self.full_scans(plan), [], f"Full table scan in plan:\n{plan}")
+        if index:
+            self.assertIn(index, plan, f"Expected {index} in plan:\n{plan}")
+
+    def result_scope(self):
+        return {
+            "academic_year": self.YEAR,
+            "term": self.TERM,
+            "subject_id": self.subject.id,
+            "class_group_id": self.class_group.id,
+        }
+
+    def test_headteacher_result_lookup(self):
+        # headteacher_view_result, submit_result
+        self.assertIndexed(
+            Result.objects.filter(school=self.school, **self.result_scope()), index="result_school_scope_idx"
+        )
+
+    def test_teacher_result_lookup(self):
+        # view_result_entries, delete_result_file
+        self.assertIndexed(
+            Result.objects.filter(teacher=self.teacher, **self.result_scope()), index="result_teacher_scope_idx"
+        )
+
+    def test_submit_marks_update(self):
+        student_ids = list(Student.objects.filter(class_group=self.class_group).values_list("id", flat=True))
+        self.assertIndexed(StudentMark.objects.filter(
+            student_id__in=student_ids, subject_id=self.subject.id, academic_year=self.YEAR, term=self.TERM,
+        ))
+
+    def test_school_term_marks(self):
+        # get_school_performance_context
+        self.assertIndexed(StudentMark.objects.filter(
+            academic_year=self.YEAR, term=self.TERM,
+            student__school=self.school, student__class_group__isnull=False,
+        ))
+
+    def test_school_trend_marks(self):
+        _, term_sequence = trend_window(self.YEAR, self.TERM)
+        self.assertIndexed(StudentMark.objects.filter(student__school=self.school).filter(window_filter(term_sequence)))
+
+    def test_class_term_marks(self):
+        # get_class_performance_context
+        self.assertIndexed(StudentMark.objects.filter(
+            class_group=self.class_group, academic_year=self.YEAR, term=self.TERM, student__school=self.school,
+        ), index="studentmark_class_term_idx")
+
+
+class LoadGeneratorTests(TestCase):
+    """A small tier lands the counts it promises, reproducibly for a given seed."""
+
+    SIZES = {"circuits": 1, "schools": 2, "classes": 2, "students": 3, "years": 2, "terms": 2, "submitted": 0.5}
+
+    def generate(self):
+        generator = LoadGenerator(seed=7, log=lambda *args: None, **self.SIZES)
+        return generator, generator.run()
+
+    def marks(self):
+        return sorted(StudentMark.objects.values_list(
+            "student__last_name", "student__first_name", "subject__name", "academic_year", "term", "mark", "is_submitted",
+        ))
+
+    def test_counts(self):
+        generator, stats = self.generate()
+        self.assertEqual(generator.expected_marks, 2 * 2 * 3 * len(SUBJECTS) * 4)
+        self.assertEqual(stats["schools"], School.objects.count())
+        self.assertEqual(stats["students"], Student.objects.count())
+        self.assertEqual(stats["students"], 2 * 2 * 3)
+        self.assertEqual(stats["results"], Result.objects.count())
+        self.assertEqual(stats["marks"], StudentMark.objects.count())
+        self.assertEqual(stats["marks"], generator.expected_marks)
+
+    def test_is_submitted_follows_the_results(self):
+        self.generate()
+        submitted = Result.objects.filter(
+            student=OuterRef("student"), subject=OuterRef("subject"),
+            academic_year=OuterRef("academic_year"), term=OuterRef("term"), status="Submitted",
+        )
+        marks = StudentMark.objects.annotate(has_submitted=Exists(submitted))
+        self.assertFalse(marks.exclude(is_submitted=F("has_submitted")).exists())
+        # Half the result sets submitted: both kinds are there
+        self.assertTrue(marks.filter(is_submitted=True).exists())
+        self.assertTrue(marks.filter(is_submitted=False).exists())
+
+    def test_same_seed_same_marks(self):
+        with transaction.atomic():
+            self.generate()
+            first = self.marks()
+            self.assertTrue(first)
+            transaction.set_rollback(True)
+        self.assertFalse(StudentMark.objects.exists())
+
+        self.generate()
+        self.assertEqual(self.marks(), first)
+
+
+class BenchmarkSuiteTests(TransactionTestCase):
+    """
+    Every benchmark case still runs cleanly, on a dataset far smaller than any tier.
+
+    A TransactionTestCase, so it runs after the plan tests: the rows it generates and
+    rolls back would otherwise skew their statistics on PostgreSQL.
+    """
+
+    TINY = {"circuits": 1, "schools": 1, "classes": 2, "students": 3, "years": 2, "seed": 7}
+
+    def test_all_cases_run(self):
+        runner = BenchmarkRunner("small", repeat=1, sizes=self.TINY, log=lambda *args: None)
+        results = runner.run()
+        errors = {name: result["error"] for name, result in results["cases"].items() if "error" in result}
+        self.assertEqual(errors, {})
+        self.assertEqual(len(results["cases"]), 16)
+
+    def test_compare_flags_extra_queries_and_slowdowns(self):
+        baseline = {"tier": "small", "cases": {
+            "a": {"median_ms": 10.0, "queries": 4},
+            "b": {"median_ms": 100.0, "queries": 4},
+            "c": {"median_ms": 1.0, "queries": 4},
+        }}
+        current = {"tier": "small", "cases": {
+            "a": {"median_ms": 10.0, "queries": 5},
+            "b": {"median_ms": 200.0, "queries": 4},
+            "c": {"median_ms": 3.0, "queries": 4},   # 3x slower, but within the absolute floor
+        }}
+        regressions = compare(current, baseline)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith("a:"))
+        self.assertTrue(regressions[1].startswith("b:"))
+
+
+class QueryInstrumentationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(staff_id="INST1", email="inst@example.com", role="teacher", license_number="INST-1")
+
+    def serve(self, user, queries=3, budget=None):
+        @query_budget(budget)
+        def view(request):
+            for _ in range(queries):
+                list(User.objects.all())
+            return HttpResponse("ok")
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+
+        middleware = QueryInstrumentationMiddleware(get_response)
+        request = RequestFactory().get("/instrumented/")
+        request.user = user
+        return middleware(request)
+
+    def test_staff_get_metrics_headers(self):
+        self.user.is_staff = True
+        with self.assertLogs("core.instrumentation", "INFO") as logs:
+            response = self.serve(self.user, queries=3)
+        self.assertEqual(response["X-Query-Count"], "3")
+        self.assertEqual(response["X-Response-Bytes"], "2")
+        self.assertIn('desc="3 queries"', response["Server-Timing"])
+        self.assertIn('"queries": 3', logs.output[0])
+
+    def test_other_users_get_no_headers(self):
+        with self.assertLogs("core.instrumentation", "INFO"):
+            response = self.serve(self.user)
+        self.assertNotIn("X-Query-Count", response)
+        self.assertNotIn("Server-Timing", response)
+
+    def test_budget_overrun_logs_warning(self):
+        with self.assertLogs("core.instrumentation", "WARNING") as logs:
+            self.serve(self.user, queries=4, budget=2)
+        self.assertIn("query_budget_exceeded", logs.output[0])
+
+
+class VersionedCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.builds = 0
+
+    def build(self):
+        self.builds += 1
+        return {"average": 50}
+
+    def load(self, scopes=(("school", 1),), params=("2024/2025", "Term 1")):
+        return caching.get_or_build("test_dashboard", list(scopes), params, self.build)
+
+    def test_repeat_loads_are_cached(self):
+        self.assertEqual(self.load(), {"average": 50})
+        self.load()
+        self.assertEqual(self.builds, 1)
+        self.load(params=("2024/2025", "Term 2"))
+        self.assertEqual(self.builds, 2)
+
+    def test_bump_invalidates_only_that_scope(self):
+        self.load()
+        self.load(scopes=[("school", 2)])
+        with self.captureOnCommitCallbacks(execute=True):
+            caching.bump_scopes([("school", 1)])
+        self.load()
+        self.load(scopes=[("school", 2)])
+        self.assertEqual(self.builds, 3)
+
+    def test_bump_waits_for_commit(self):
+        self.load()
+        with self.captureOnCommitCallbacks(execute=False):
+            caching.bump_scopes([("school", 1)])
+            self.load()
+        self.assertEqual(self.builds, 1)
+
+    def test_saving_a_result_invalidates_its_scopes(self):
+        region = Region.objects.create(name="Cache Region")
+        district = District.objects.create(name="Cache District", region=region)
+        circuit = Circuit.objects.create(name="Cache Circuit", district=district)
+        school = School.objects.create(name="Cache School", school_code=770001, circuit=circuit, district=district)
+        department = Department.objects.create(name="JHS")
+        class_group = ClassGroup.objects.create(name="JHS 1", school=school, department=department)
+        subject = Subject.objects.create(name="Mathematics")
+        teacher = User.objects.create(
+            staff_id="CACHE1", email="cache@example.com", role="teacher", school=school,
+            district=district, circuit=circuit, license_number="CACHE-1",
+        )
+        student = Student.objects.create(
+            first_name="Student", last_name="Cache", school=school, class_group=class_group,
+            circuit=circuit, district=district,
+        )
+
+        self.load(scopes=[("district", district.id)])
+        with self.captureOnCommitCallbacks(execute=True):
+            Result.objects.create(
+                student=student, subject=subject, class_group=class_group, school=school, circuit=circuit,
+                district=district, teacher=teacher, academic_year="2024/2025", term="Term 1", final_mark=60,
+            )
+        self.load(scopes=[("district", district.id)])
+        self.assertEqual(self.builds, 2)
+
+
+class TermCalendarTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        region = Region.objects.create(name="Calendar Region")
+        self.district = District.objects.create(name="Calendar District", region=region)
+        self.factory = RequestFactory()
+
+    def period(self, **params):
+        request = self.factory.get("/", params)
+        return term_calendar.selected_period(request, self.district.id)
+
+    def test_defaults_without_a_deadline(self):
+        self.assertEqual(self.period(), ("2024/2025", "Term 1"))
+        self.assertEqual(self.period(academic_year="2023", term="Term 3"), ("2023/2024", "Term 3"))
+        self.assertEqual(self.period(academic_year="garbage", term="Term 9"), ("2024/2025", "Term 1"))
+
+    def test_latest_deadline_is_the_current_period(self):
+        self.period()  # Caches "no deadline"
+        ResultUploadDeadline.objects.create(
+            district=self.district, academic_year="2025/2026", term="Term 1", deadline_date="2025-12-01",
+        )
+        ResultUploadDeadline.objects.create(
+            district=self.district, academic_year="2025/2026", term="Term 2", deadline_date="2026-04-01",
+        )
+        self.assertEqual(self.period(), ("2025/2026", "Term 2"))
+        # Another year falls back to the default term rather than the current one
+        self.assertEqual(self.period(academic_year="2022/2023"), ("2022/2023", "Term 1"))
+
+
+class ReportCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        settings_override = override_settings(REPORT_CACHE_DIR=self.directory, REPORT_CACHE_MAX_BYTES=12_000)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.renders = 0
+
+    def view(self, request):
+        self.renders += 1
+        response = HttpResponse(b"%PDF" + b"x" * int(request.GET.get("size", 0)), content_type="application/pdf")
+        response["Content-Disposition"] = "attachment; filename=report.pdf"
+        return response
+
+    def download(self, **params):
+        view = report_cache.cached_report("test_report", lambda request: ([("school", 1)], sorted(params.items())))(self.view)
+        response = view(RequestFactory().get("/", params))
+        return b"".join(response.streaming_content) if response.streaming else response.content
+
+    def test_repeat_downloads_are_served_from_disk(self):
+        first = self.download(term="Term 1")
+        self.assertEqual(self.download(term="Term 1"), first)
+        self.assertEqual(self.renders, 1)
+        self.download(term="Term 2")
+        self.assertEqual(self.renders, 2)
+
+    def test_new_results_invalidate_the_pdf(self):
+        self.download()
+        with self.captureOnCommitCallbacks(execute=True):
+            caching.bump_scopes([("school", 1)])
+        self.download()
+        self.assertEqual(self.renders, 2)
+
+    def test_page_and_pdf_share_the_report_context(self):
+        builds = []
+        context = report_cache.report_context(
+            "test_context", lambda request: ([("school", 1)], request.GET.get("term")),
+            lambda request: builds.append(request) or {"term": request.GET.get("term")},
+        )
+        request = RequestFactory().get("/", {"term": "Term 1"})
+        self.assertEqual(context(request), {"term": "Term 1"})
+        self.assertEqual(context(RequestFactory().get("/", {"term": "Term 1"})), {"term": "Term 1"})
+        self.assertEqual(len(builds), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            caching.bump_scopes([("school", 1)])
+        context(request)
+        self.assertEqual(len(builds), 2)
+
+    def test_least_recently_served_pdfs_are_evicted(self):
+        self.download(size="4000")
+        self.download(size="5000")
+        self.download(size="6000")  # 15KB > 12KB: the oldest goes
+        self.assertEqual(len([name for name in os.listdir(self.directory) if name.endswith(".pdf")]), 2)
+        self.download(size="4000")
+        self.assertEqual(self.renders, 4)
+
+
+class HierarchyIndexTests(TransactionTestCase):
+    # Committed writes, as in production: inside a test transaction the index is never kept
+    def setUp(self):
+        cache.clear()
+        region = Region.objects.create(name="Hierarchy Region")
+        self.district = District.objects.create(name="Hierarchy District", region=region)
+        self.north = Circuit.objects.create(name="North", district=self.district)
+        self.south = Circuit.objects.create(name="South", district=self.district)
+        self.school = School.objects.create(name="North School", school_code=880001, circuit=self.north, district=self.district)
+        self.cis = User.objects.create(
+            staff_id="880001", email="hierarchy@example.com", role="cis", district=self.district,
+            license_number="HIER-1",
+        )
+
+    def test_lookups_are_built_once(self):
+        places = hierarchy.index()
+        self.assertEqual([c.name for c in places.circuits_of(self.district.id)], ["North", "South"])
+        self.assertEqual([s.name for s in places.schools_of_circuit(self.north.id)], ["North School"])
+        self.assertEqual(places.schools_of_circuit(self.south.id), ())
+        circuit, district = places.ancestors_of(self.school.id)
+        self.assertEqual((circuit.name, district.name), ("North", "Hierarchy District"))
+        self.assertIs(hierarchy.index(), places)
+
+    def test_changes_refresh_the_index(self):
+        places = hierarchy.index()
+        Circuit.objects.create(name="East", district=self.district)
+        self.assertIn("East", [c.name for c in hierarchy.index().circuits_of(self.district.id)])
+
+        # A change made by another process only moves the shared version
+        places = hierarchy.index()
+        caching.bump_scopes([hierarchy.HIERARCHY_SCOPE])
+        self.assertIsNot(hierarchy.index(), places)
+
+    def test_endpoints_read_the_index(self):
+        hierarchy.index()
+        with self.assertNumQueries(0):
+            response = view_cis.fetch_circuits_and_schools(RequestFactory().get("/"), self.district.id)
+        self.assertEqual([c["name"] for c in json.loads(response.content)["circuits"]], ["North", "South"])
+
+        request = RequestFactory().post("/", {"staff_id": "880001"})
+        request.user = self.cis
+        with contextlib.redirect_stdout(io.StringIO()):
+            options = json.loads(view_cis.user_search(request).content)["available_options"]
+        self.assertEqual(options["schools"], [{"id": self.school.id, "name": "North School"}])
+
+
+class TeacherAssignmentTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        region = Region.objects.create(name="Assignment Region")
+        district = District.objects.create(name="Assignment District", region=region)
+        circuit = Circuit.objects.create(name="Assignment Circuit", district=district)
+        school = School.objects.create(name="Assignment School", school_code=990001, circuit=circuit, district=district)
+        self.jhs = Department.objects.create(name="JHS")
+        self.shs = Department.objects.create(name="SHS")
+        self.jhs1 = ClassGroup.objects.create(name="JHS 1", school=school, department=self.jhs)
+        self.jhs2 = ClassGroup.objects.create(name="JHS 2", school=school, department=self.jhs)
+        self.maths = Subject.objects.create(name="Mathematics")
+        self.maths.department.add(self.jhs)
+        self.physics = Subject.objects.create(name="Physics")
+        self.physics.department.add(self.shs)
+
+        self.subject_teacher = self.make_teacher("ASG1", school)
+        self.subject_teacher.assigned_subjects.add(self.physics)
+        SubjectTeacher.objects.create(teacher=self.subject_teacher, subject=self.physics).assigned_classes.add(self.jhs2)
+        self.class_teacher = self.make_teacher("ASG2", school)
+        ClassTeacher.objects.create(teacher=self.class_teacher, assigned_class=self.jhs1)
+
+    def make_teacher(self, staff_id, school):
+        user = User.objects.create(
+            staff_id=staff_id, email=f"{staff_id}@example.com", role="teacher", school=school,
+            district=school.district, circuit=school.circuit, license_number=f"L-{staff_id}",
+        )
+        return Teacher.objects.create(user=user, school=school)
+
+    def test_upload_permissions(self):
+        with self.assertNumQueries(1):
+            index = assignments.for_teacher(self.class_teacher)
+            self.assertTrue(index.can_upload(self.jhs1.id, self.maths.id))
+            self.assertFalse(index.can_upload(self.jhs1.id, self.physics.id))  # Not offered in JHS
+            self.assertFalse(index.can_upload(self.jhs2.id, self.maths.id))  # Not their class
+            self.assertTrue(index.is_class_teacher and not index.is_subject_teacher)
+
+        index = assignments.for_teacher(self.subject_teacher)
+        self.assertTrue(index.can_upload(self.jhs1.id, self.physics.id))
+        self.assertEqual(index.class_ids, {self.jhs2.id})
+        self.assertTrue(index.is_subject_teacher and not index.is_class_teacher)
+
+    def test_assignment_changes_invalidate(self):
+        assignments.for_teacher(Teacher.objects.get(id=self.class_teacher.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            ClassTeacher.objects.create(teacher=self.class_teacher, assigned_class=self.jhs2)
+        index = assignments.for_teacher(Teacher.objects.get(id=self.class_teacher.id))
+        self.assertTrue(index.can_upload(self.jhs2.id, self.maths.id))
+
+    def test_report_keys_come_from_the_index(self):
+        def key(build, teacher):
+            request = RequestFactory().get("/")
+            request.user = teacher.user
+            return build(request)
+
+        # Loads the indexes and the term calendar
+        key(view_teacher.subject_report_key, self.subject_teacher)
+        key(view_teacher.class_report_key, self.class_teacher)
+        with self.assertNumQueries(0):
+            scopes, params = key(view_teacher.subject_report_key, self.subject_teacher)
+            self.assertEqual(params[0], [(self.physics.id, self.jhs2.id)])
+            self.assertIn(("class", self.jhs2.id), scopes)
+            scopes, _ = key(view_teacher.class_report_key, self.class_teacher)
+            self.assertIn(("class", self.jhs1.id), scopes)
+        self.assertIsNone(key(view_teacher.class_report_key, self.subject_teacher))
+
+
+class CurriculumMapTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.jhs = Department.objects.create(name="JHS")
+        self.shs = Department.objects.create(name="SHS")
+        self.maths = Subject.objects.create(name="Mathematics")
+        self.maths.department.add(self.jhs, self.shs)
+        self.physics = Subject.objects.create(name="Physics")
+        self.physics.department.add(self.shs)
+
+    def test_lookups_without_queries(self):
+        curriculum.subject_map()
+        with self.assertNumQueries(0):
+            subjects = curriculum.subject_map()
+            self.assertEqual(subject_departments([self.maths.id, self.physics.id]), {
+                self.maths.id: ["JHS", "SHS"], self.physics.id: ["SHS"],
+            })
+            self.assertEqual(subjects.subject_named("MATHEMATICS", self.jhs.id), self.maths.id)
+            self.assertIsNone(subjects.subject_named("Physics", self.jhs.id))
+
+    def test_membership_changes_refresh_the_map(self):
+        curriculum.subject_map()
+        self.physics.department.add(self.jhs)
+        self.assertTrue(curriculum.subject_map().offers(self.jhs.id, self.physics.id))
+        self.maths.department.remove(self.jhs)
+        self.assertEqual(curriculum.subject_map().subjects_of(self.jhs.id), {self.physics.id})
+
+
+class SingleFlightTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.computes = 0
+
+    def compute(self):
+        self.computes += 1
+        time.sleep(0.3)
+        cache.set("flight-result", "report")
+        return "report"
+
+    def test_concurrent_callers_compute_once(self):
+        results = []
+
+        def call():
+            results.append(singleflight.single_flight("test", lambda: cache.get("flight-result"), self.compute))
+
+        threads = [threading.Thread(target=call) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ["report"] * 5)
+        self.assertEqual(self.computes, 1)
+        self.assertIsNone(cache.get("single-flight:test"))
+
+    def test_waiter_computes_itself_after_timeout(self):
+        cache.add("single-flight:test", "stuck-worker", 60)
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = singleflight.single_flight("test", lambda: None, self.compute, wait=0.2)
+        self.assertEqual(result, "report")
+        self.assertEqual(cache.get("single-flight:test"), "stuck-worker")  # Not ours to release
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        region = Region.objects.create(name="Conditional Region")
+        self.district = District.objects.create(name="Conditional District", region=region)
+        self.circuit = Circuit.objects.create(name="Conditional Circuit", district=self.district)
+        self.cis = User.objects.create(
+            staff_id="COND1", email="cis@example.com", role="cis", district=self.district, license_number="COND-1",
+        )
+        self.siso = User.objects.create(
+            staff_id="COND2", email="siso@example.com", role="siso", district=self.district,
+            circuit=self.circuit, license_number="COND-2",
+        )
+
+    def get(self, user, url, etag=None, **headers):
+        self.client.force_login(user)
+        if etag:
+            headers["HTTP_IF_NONE_MATCH"] = etag
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.client.get(url, secure=True, **headers)
+
+    def test_dashboard_data_is_revalidated_until_results_change(self):
+        url = reverse("dashboards:cis_dashboard")
+        ajax = {"HTTP_X_REQUESTED_WITH": "XMLHttpRequest"}
+        first = self.get(self.cis, url, **ajax)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn("private", first["Cache-Control"])
+        self.assertIn("Last-Modified", first)
+
+        self.assertEqual(self.get(self.cis, url, first["ETag"], **ajax).status_code, 304)
+        self.assertFalse(self.get(self.cis, url, first["ETag"]).has_header("ETag"))  # The HTML page
+        with self.captureOnCommitCallbacks(execute=True):
+            caching.bump_scopes([("district", self.district.id)])
+        self.assertEqual(self.get(self.cis, url, first["ETag"], **ajax).status_code, 200)
+
+    def test_new_notifications_change_the_etag(self):
+        url = reverse("siso:get_notifications")
+        etag = self.get(self.siso, url)["ETag"]
+        self.assertEqual(self.get(self.siso, url, etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.create(recipient=self.siso, sender=self.cis, message="Results are due")
+        response = self.get(self.siso, url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)["notifications"]), 1)
+
+
+class TwoTierCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        caching.local_versions.clear()
+
+    def test_local_entries_are_private_copies(self):
+        builds = []
+        load = lambda: caching.get_or_build("test_tiers", [("school", 1)], (), lambda: builds.append(1) or {"rows": [1, 2]})
+        load()["rows"].append(3)
+        self.assertEqual(load(), {"rows": [1, 2]})
+        self.assertEqual(len(builds), 1)
+
+    def test_local_lru_is_bounded_by_weight(self):
+        lru = caching.LocalLRU(10, weigh=len)
+        lru.set("a", b"xxxx")
+        lru.set("b", b"xxxx")
+        lru.get("a")
+        lru.set("c", b"xxxx")
+        self.assertEqual(list(lru.items), ["a", "c"])
+        self.assertEqual(lru.weight, 8)
+
+    @override_settings(
+        CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+        CACHE_INVALIDATION_BROADCAST=True,
+    )
+    def test_bumps_on_other_nodes_are_broadcast(self):
+        scope = ("school", 1)
+        with contextlib.redirect_stdout(io.StringIO()):
+            invalidation.start(caching.forget_local_versions)
+            self.wait_for(invalidation.listening)
+        version = caching.scope_versions([scope])[scope]
+
+        cache.incr(caching.version_key(*scope))  # Another node bumps it...
+        self.assertEqual(caching.scope_versions([scope])[scope], version)  # ...and until told, the local copy is used
+        invalidation.publish([scope])
+        self.wait_for(lambda: caching.scope_versions([scope])[scope] == version + 1)
+
+    def wait_for(self, condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, "timed out")
+            time.sleep(0.01)
+
+
+class BulkUploadTests(TestCase):
+    HEADER = "First Name,Last Name,Class,Subject,Academic Year,Term,CAT1,Project Work,CAT2,Group Work,Exam Score"
+
+    def setUp(self):
+        cache.clear()
+        region = Region.objects.create(name="Upload Region")
+        district = District.objects.create(name="Upload District", region=region)
+        circuit = Circuit.objects.create(name="Upload Circuit", district=district)
+        self.school = School.objects.create(name="Upload School", school_code=660001, circuit=circuit, district=district)
+        jhs = Department.objects.create(name="JHS")
+        self.school.department.add(jhs)
+        self.jhs1 = ClassGroup.objects.create(name="JHS 1", school=self.school, department=jhs)
+        self.jhs2 = ClassGroup.objects.create(name="JHS 2", school=self.school, department=jhs)
+        Subject.objects.create(name="Mathematics").department.add(jhs)
+        self.user = User.objects.create(
+            staff_id="UPL1", email="upload@example.com", role="teacher", school=self.school,
+            district=district, circuit=circuit, license_number="UPL-1",
+        )
+        teacher = Teacher.objects.create(user=self.user, school=self.school)
+        ClassTeacher.objects.create(teacher=teacher, assigned_class=self.jhs1)
+        ClassTeacher.objects.create(teacher=teacher, assigned_class=self.jhs2)
+        self.ama = Student.objects.create(
+            first_name="Ama", last_name="Mensah", school=self.school, class_group=self.jhs2,
+            circuit=circuit, district=district,
+        )
+
+    def upload(self, *rows, name="results.csv", data=None):
+        """Upload a file, run its import job as the worker would, and return the job's row errors."""
+        self.client.force_login(self.user)
+        if data is None:
+            data = "\n".join([self.HEADER, *(",".join(row) for row in rows)]).encode()
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = self.client.post(
+                reverse("teacher:bulk_upload"), {"file": SimpleUploadedFile(name, data)}, secure=True,
+            )
+            self.assertEqual(response.status_code, 202)
+            imports.run_next()
+        job = self.client.get(json.loads(response.content)["status_url"], secure=True).json()
+        self.assertEqual(job["status"], "done")
+        return job["errors"]
+
+    def row(self, first_name, last_name, class_name="JHS 1", exam="60"):
+        return [first_name, last_name, class_name, "mathematics", "2024/2025", "Term 1", "10", "10", "10", "10", exam]
+
+    def test_rows_are_resolved_and_students_written_in_bulk(self):
+        errors = self.upload(
+            self.row("Ama", "Mensah"),  # Moves to JHS 1
+            self.row("Kofi", "Boateng", "JHS 2"),
+            self.row("Kofi", "Boateng"),  # Same new student, last class wins
+            self.row("Yaw", "Asante", "JHS 9"),
+            self.row("Yaw", "Asante", exam="500"),
+        )
+        self.assertEqual(errors, [
+            "Row 4: Invalid class 'JHS 9' for school Upload School.",
+            "Row 5: Final mark must be between 0 and 100.",
+        ])
+        self.ama.refresh_from_db()
+        self.assertEqual(self.ama.class_group, self.jhs1)
+        kofi = Student.objects.get(first_name="Kofi")
+        self.assertEqual(kofi.class_group, self.jhs1)
+        self.assertEqual(Result.objects.filter(student=kofi).count(), 2)
+        self.assertFalse(Student.objects.filter(first_name="Yaw").exists())
+
+    def test_queries_do_not_grow_with_the_file(self):
+        def queries(count):
+            rows = [self.row(f"Student{i}", "Batch") for i in range(count)]
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(self.upload(*rows), [])
+            Result.objects.all().delete()
+            return len(captured)
+
+        queries(1)  # Loads the cached indexes
+        self.assertEqual(queries(3), queries(30))
+
+    def test_xlsx_is_read_and_saved_in_chunks(self):
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(self.HEADER.split(","))
+        for row in [
+            self.row("Kofi", "Boateng", "JHS 2"),
+            self.row("Yaw", "Asante", "JHS 9"),
+            [],  # Blank rows inside the sheet keep their number, as with read_excel
+            self.row("Kofi", "Boateng"),  # Created in the first chunk, moved in the second
+        ]:
+            sheet.append([int(value) if value.isdigit() else value for value in row])
+        data = io.BytesIO()
+        workbook.save(data)
+
+        with mock.patch.object(spreadsheets, "CHUNK_ROWS", 2):
+            errors = self.upload(name="results.xlsx", data=data.getvalue())
+        self.assertEqual(errors, [
+            "Row 2: Invalid class 'JHS 9' for school Upload School.",
+            "Row 3: Invalid academic year: nan",
+        ])
+        kofi = Student.objects.get(first_name="Kofi")
+        self.assertEqual(kofi.class_group, self.jhs1)
+        self.assertEqual(Result.objects.filter(student=kofi).count(), 2)
+        self.assertEqual(StudentMark.objects.filter(student=kofi).count(), 1)
+
+
+class ImportJobTests(TestCase):
+    TEACHER_HEADER = "staff_id,license_number,first_name,last_name,email,phone_number,password1,password2"
+
+    def setUp(self):
+        region = Region.objects.create(name="Import Region")
+        district = District.objects.create(name="Import District", region=region)
+        circuit = Circuit.objects.create(name="Import Circuit", district=district)
+        self.school = School.objects.create(name="Import School", school_code=770001, circuit=circuit, district=district)
+        self.headteacher = User.objects.create(
+            staff_id="IMP1", email="head@example.com", role="headteacher", school=self.school,
+            district=district, circuit=circuit, license_number="IMP-1",
+        )
+
+    def queue(self, *rows, user=None):
+        data = "\n".join([self.TEACHER_HEADER, *rows]).encode()
+        return imports.enqueue("teachers", user or self.headteacher, SimpleUploadedFile("teachers.csv", data))
+
+    def teacher(self, staff_id, email):
+        return f"{staff_id},LIC-{staff_id},Kwame,Owusu,{email},0241234567,secret123,secret123"
+
+    def test_upload_is_queued_and_processed_by_the_worker(self):
+        self.client.force_login(self.headteacher)
+        data = "\n".join([self.TEACHER_HEADER, self.teacher("T1", "t1@example.com")]).encode()
+        response = self.client.post(
+            reverse("school:bulk_upload_teachers"), {"file": SimpleUploadedFile("teachers.csv", data)}, secure=True,
+        )
+        self.assertEqual(response.status_code, 202)
+        status_url = response.json()["status_url"]
+        self.assertEqual(self.client.get(status_url, secure=True).json()["status"], "queued")
+        self.assertFalse(User.objects.filter(staff_id="T1").exists())
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            call_command("process_import_jobs", "--once")
+        job = self.client.get(status_url, secure=True).json()
+        self.assertEqual(
+            (job["status"], job["rows_done"], job["rows_failed"], job["message"]),
+            ("done", 1, 0, "1 teachers uploaded successfully!"),
+        )
+        self.assertTrue(Teacher.objects.filter(user__staff_id="T1", school=self.school).exists())
+        self.assertTrue(User.objects.get(staff_id="T1").check_password("secret123"))
+
+    def test_progress_and_row_errors_are_recorded_per_chunk(self):
+        job = self.queue(
+            self.teacher("T1", "t1@example.com"),
+            self.teacher("IMP1", "other@example.com"),  # The headteacher's staff id
+            self.teacher("T2", "t2@example.com"),
+        )
+        records = []
+        record = job.record
+        with mock.patch.object(spreadsheets, "CHUNK_ROWS", 2), contextlib.redirect_stdout(io.StringIO()):
+            with mock.patch.object(job, "record", lambda rows, errors=(): records.append(rows) or record(rows, errors)):
+                imports.run(job)
+        self.assertEqual(records, [2, 1])
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_done, job.rows_failed), ("done", 3, 1))
+        self.assertEqual(job.errors, ["Row 3: Duplicate staff_id (IMP1) or email (other@example.com)."])
+        self.assertIsNone(ImportJob.objects.get(pk=job.pk).payload)  # The stored upload is removed once processed
+
+    def test_worker_needs_no_files_from_the_web_process(self):
+        web_media, worker_media = tempfile.mkdtemp(), tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, web_media, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, worker_media, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=web_media):
+            job = self.queue(self.teacher("T1", "t1@example.com"))
+        self.assertEqual(os.listdir(web_media), [])
+
+        # Another machine: its own, empty media directory
+        with override_settings(MEDIA_ROOT=worker_media), contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(imports.run_next(), job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_done), ("done", 1))
+        self.assertTrue(User.objects.filter(staff_id="T1").exists())
+
+    def test_teachers_are_hashed_in_parallel_and_created_in_bulk(self):
+        rows = [self.teacher(f"T{i}", f"t{i}@example.com") for i in range(10)]
+        rows.append(self.teacher("T0", "again@example.com"))  # Same staff id as a row above
+        job = self.queue(*rows)
+        with override_settings(PASSWORD_HASH_WORKERS=2), contextlib.redirect_stdout(io.StringIO()):
+            with CaptureQueriesContext(connection) as queries:
+                imports.run(job)
+
+        self.assertEqual(job.errors, ["Row 12: Duplicate staff_id (T0) or email (again@example.com)."])
+        self.assertEqual(Teacher.objects.filter(school=self.school).count(), 10)
+        self.assertTrue(User.objects.get(staff_id="T7").check_password("secret123"))
+        self.assertEqual(len([q for q in queries if 'INSERT INTO "core_user"' in q["sql"]]), 1)
+
+    def test_over_long_values_are_row_errors(self):
+        job = self.queue(
+            self.teacher("T1", "t1@example.com").replace("Kwame", "K" * 51),
+            self.teacher("T2", "t2@example.com"),
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            imports.run(job)
+        self.assertEqual((job.status, job.errors), ("done", ["Row 2: Value too long for first_name."]))
+        self.assertEqual(list(Teacher.objects.values_list("user__staff_id", flat=True)), ["T2"])
+
+    def test_license_numbers_are_required_and_compared_stripped(self):
+        job = self.queue(
+            self.teacher("T1", "t1@example.com").replace("LIC-T1", ""),
+            self.teacher("T2", "t2@example.com").replace("LIC-T2", ""),
+            self.teacher("T3", "t3@example.com").replace("LIC-T3", " LIC-T4 "),
+            self.teacher("T4", "t4@example.com"),
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            imports.run(job)
+        self.assertEqual(job.errors, [
+            "Row 2: Missing required fields.",
+            "Row 3: Missing required fields.",
+            "Row 5: Duplicate license number (LIC-T4).",
+        ])
+        self.assertEqual(User.objects.get(staff_id="T3").license_number, "LIC-T4")
+
+    def test_a_rejected_file_fails_the_job(self):
+        job = imports.enqueue("teachers", self.headteacher, SimpleUploadedFile("teachers.csv", b"name,email\nKwame,k@example.com"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            imports.run_next()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.message), ("failed", "Invalid file format. Please use the provided template."))
+
+    def test_each_job_is_claimed_once_oldest_first(self):
+        first, second = self.queue(), self.queue()
+        self.assertEqual(imports.claim_next(), first)
+        self.assertEqual(imports.claim_next(), second)
+        self.assertIsNone(imports.claim_next())
+        self.assertEqual(ImportJob.objects.get(pk=first.pk).status, "running")
+
+    def test_jobs_whose_worker_stopped_are_failed(self):
+        job = self.queue()
+        imports.claim_next()
+        ImportJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - imports.STALE_AFTER * 2)
+        self.assertEqual(imports.fail_stale(), 1)
+        self.assertEqual(ImportJob.objects.get(pk=job.pk).status, "failed")
+
+    def test_progress_is_only_visible_to_the_uploader(self):
+        job = self.queue()
+        other = User.objects.create(staff_id="IMP2", email="other-head@example.com", role="headteacher", license_number="IMP-2")
+        self.client.force_login(other)
+        response = self.client.get(reverse("import_job_status", args=[job.id]), secure=True)
+        self.assertEqual(response.status_code, 404)
+
+
+
+class BulkSchoolUploadTests(TestCase):
+    HEADER = (
+        "school_name,school_code,circuit_name,departments,headteacher_staff_id,headteacher_first_name,"
+        "headteacher_last_name,headteacher_license_number,headteacher_email,headteacher_phone_number,password1,password2"
+    )
+
+    def setUp(self):
+        cache.clear()
+        region = Region.objects.create(name="Onboarding Region")
+        district = District.objects.create(name="Onboarding District", region=region)
+        Circuit.objects.create(name="North", district=district)
+        Department.objects.get_or_create(name="JHS")
+        Department.objects.get_or_create(name="Primary")
+        self.cis = User.objects.create(staff_id="CIS1", email="cis@example.com", role="cis", district=district, license_number="CIS-1")
+
+    def row(self, i, **values):
+        row = dict(zip(self.HEADER.split(","), [
+            f"School {i}", str(880000 + i), "North", "JHS, Primary", f"HT{i}", "Ama", "Owusu",
+            f"LIC-{i}", f"ht{i}@example.com", "0241234567", "secret123", "secret123",
+        ]))
+        row.update(values)
+        return row
+
+    def process(self, *rows):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return view_cis.process_bulk_schools(pd.DataFrame(rows, dtype=str), self.cis)
+
+    def test_file_is_checked_then_inserted_in_bulk(self):
+        with CaptureQueriesContext(connection) as queries:
+            created, skipped = self.process(
+                self.row(1),
+                self.row(2, departments="Nursery"),
+                self.row(3, school_code="880001"),  # Same code as the first row
+                self.row(4, departments="primary"),
+            )
+        self.assertEqual((created, skipped), (2, [
+            "Row 3: No valid departments found in 'Nursery'.",
+            "Row 4: Duplicate school code (880001) or email (ht3@example.com).",
+        ]))
+        school = School.objects.get(school_code=880004)
+        self.assertEqual(school.headteacher.school, school)
+        self.assertEqual(list(school.department.values_list("name", flat=True)), ["Primary"])
+        self.assertTrue(school.headteacher.check_password("secret123"))
+        self.assertEqual(len([q for q in queries if 'INSERT INTO "core_school"' in q["sql"]]), 1)
+
+    def test_an_oversized_code_is_a_row_error(self):
+        created, skipped = self.process(self.row(1, school_code="2147483648"), self.row(2))
+        self.assertEqual((created, skipped), (1, ["Row 2: Invalid school code (2147483648)."]))
+
+    def test_the_whole_upload_is_checked_and_saved_at_once(self):
+        data = io.StringIO()
+        pd.DataFrame([self.row(1), self.row(2), self.row(3, school_code="880001")]).to_csv(data, index=False)
+        job = imports.enqueue("schools", self.cis, SimpleUploadedFile("schools.csv", data.getvalue().encode()))
+        # Small chunks must not split the upload: the duplicate is two chunks away from its first row
+        with mock.patch.object(spreadsheets, "CHUNK_ROWS", 2), contextlib.redirect_stdout(io.StringIO()):
+            with CaptureQueriesContext(connection) as queries:
+                imports.run(job)
+        self.assertEqual((job.status, job.rows_done), ("done", 3))
+        self.assertEqual(job.errors, ["Row 4: Duplicate school code (880001) or email (ht3@example.com)."])
+        self.assertEqual(len([q for q in queries if 'INSERT INTO "core_school"' in q["sql"]]), 1)
+
+    def test_a_failed_insert_leaves_nothing_behind(self):
+        with mock.patch.object(School.department.through.objects, "bulk_create", side_effect=DatabaseError("boom")):
+            with self.assertRaises(DatabaseError):
+                self.process(self.row(1), self.row(2))
+        self.assertFalse(School.objects.filter(school_code__in=[880001, 880002]).exists())
+        self.assertFalse(User.objects.filter(staff_id__in=["HT1", "HT2"]).exists())
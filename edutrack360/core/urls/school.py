@@ -5,7 +5,7 @@ from core.views.view_school import (
     remove_teacher_from_subject, assign_teacher_to_class, remove_teacher_from_class, 
     get_teacher_classes, bulk_upload_teachers,download_teacher_template, save_last_page, 
     get_last_page, manual_upload, get_classes_by_department, add_class_to_department,
-    school_performance_analysis, get_available_terms, get_teachers,
+    school_performance_analysis, get_teachers,
     get_subjects_by_department, get_departments, headteacher_view_result,
     school_performance_analysis, headteacher_result_overview,
     submit_result, query_result, add_subject_to_department, subject_management,
@@ -15,6 +15,7 @@ from core.views.view_school import (
     
 
 )
+from core.views.dashboards import get_available_terms
 
 app_name = 'school'
 
@@ -1,7 +1,7 @@
 from django.urls import path
 from core.views.view_teacher import (
     subject_performance_analysis, settings, get_classes_by_department,
-    get_available_terms, get_departments, get_subjects_by_department,
+    get_departments, get_subjects_by_department,
     manual_upload_result, bulk_upload_results, download_result_template,
     get_classes, get_class_department, download_subject_analysis_pdf,
     class_performance_analysis, download_class_performance_pdf,
@@ -9,6 +9,7 @@ from core.views.view_teacher import (
     delete_result_entry, delete_result_file, view_result_entries
     
 )
+from core.views.dashboards import get_available_terms
 
 app_name = 'teacher'
 
@@ -5,14 +5,18 @@ from django.contrib.auth import get_user_model
 from django.http import JsonResponse, HttpResponseForbidden
 from core.models import (
     ResultUploadDeadline, School, StudentMark, 
-    Result, SubjectTeacher, ClassTeacher,
+    Result, SubjectTeacher, ClassTeacher, ClassGroup, PerformanceSummary, SUMMARY_BUCKETS,
 )
+from core.aggregations import score_histogram
+from core.rollups import scope_averages
+from core import assignments, caching, conditional, hierarchy, term_calendar
+from core.middlewares import query_budget
 from django.contrib import messages
 from datetime import timedelta
 from django.utils import timezone
 import json
 from decimal import Decimal
-from django.db.models import Avg
+from django.db.models import Avg, F
 from django.urls import reverse_lazy
 from collections import defaultdict
 from statistics import mean
@@ -20,6 +24,23 @@ from statistics import mean
 
 User = get_user_model()
 
+def dashboard_state(request, name, scopes, params, deadline_district_id=None):
+    """
+    Conditional GET state (see core.conditional) of a dashboard's AJAX data. The
+    HTML page is never revalidated. With `deadline_district_id` the data also shows
+    that district's upload deadline and the days left to it.
+    """
+    if request.headers.get("x-requested-with") != "XMLHttpRequest":
+        return None
+    not_before = None
+    if deadline_district_id is not None:
+        now = timezone.now()
+        scopes = [*scopes, term_calendar.deadline_scope(deadline_district_id)]
+        params = (*params, now.date())
+        not_before = now.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+    return conditional.data_state(name, scopes, params, not_before)
+
+
 #------------ ADMIN DASHBOARD -----------------------
 
 @login_required
@@ -83,59 +104,24 @@ def cis_registration(request):
 
 #------------ CIS DASHBOARD -----------------------
 
-@login_required
-def cis_dashboard(request):
-    # Ensure the user is a CIS (Circuit Information System) user and is assigned to a district
-    user = request.user
-    if user.role != "cis" or not user.district:
-        return redirect("homepage")
-
-    # Get the district and associated schools
-    district = user.district
+def cis_dashboard_stats(district, selected_year, selected_term):
+    """District figures for the CIS dashboard; cached per district version by cis_dashboard."""
     schools_in_district = School.objects.filter(district=district)
 
-    # Load filter options for academic years and terms from the shared helper
-    filter_options = json.loads(get_available_terms(request).content)
-    available_years = [year["name"] for year in filter_options.get("academic_years", [])]
-    available_terms = [term["name"] for term in filter_options.get("terms", [])]
-
-    # Get selected academic year and term from the request
-    academic_year = request.GET.get("academic_year", "").strip()
-    term = request.GET.get("term", "").strip()
-
-    # Validate and select the academic year and term
-    selected_year = academic_year if academic_year in available_years else filter_options.get("selected_academic_year")
-    selected_term = term if term in available_terms else filter_options.get("selected_term", "Term 1")
-
-    # If no valid academic year or term, show an error message
-    if not selected_year or not selected_term:
-        return render(request, "dashboards/cis_dashboard.html", {
-            "error": "No academic data available.",
-            "academic_years": available_years,
-            "terms": available_terms,
-        })
-
-    # Get relevant marks for students in the selected district, academic year, and term
-    marks_qs = StudentMark.objects.filter(
-        student__school__in=schools_in_district,
+    # Pre-aggregated rollups maintained on result submission (see core.rollups)
+    summaries = PerformanceSummary.objects.filter(
         academic_year=selected_year,
         term=selected_term,
-        subject__results__status="Submitted"
-    ).select_related("student__school", "subject")
-
-    # De-duplicate marks by student-subject pair to avoid over-counting
-    seen = set()
-    cleaned_marks = []
-    for m in marks_qs:
-        key = (m.student.id, m.subject.id)
-        if key not in seen:
-            seen.add(key)
-            cleaned_marks.append({
-                "student_id": m.student.id,
-                "school_name": m.student.school.name,
-                "subject_name": m.subject.name,
-                "mark": m.mark
-            })
+    )
+    school_averages = scope_averages(
+        summaries.filter(level="school", school__district=district), "school__name"
+    )
+    subject_averages = scope_averages(
+        summaries.filter(level="district", district=district), "subject__name"
+    )
+    district_average = scope_averages(
+        summaries.filter(level="district", district=district), "district"
+    )
 
     # === Stats ===
     total_schools = schools_in_district.count()  # Total number of schools in the district
@@ -143,43 +129,39 @@ def cis_dashboard(request):
         school.staff_members.filter(role__in=["teacher", "headteacher"]).count()
         for school in schools_in_district
     )  # Total number of teachers in the district
-    total_students_assessed = len(set(entry["student_id"] for entry in cleaned_marks))  
-    total_district_average = round(mean([entry["mark"] for entry in cleaned_marks]), 2) if cleaned_marks else 0  
-
-    # === Grouped Averages ===
-    school_marks = defaultdict(list)
-    subject_marks = defaultdict(list)
-
-    for entry in cleaned_marks:
-        school_marks[entry["school_name"]].append(entry["mark"])  # Group marks by school
-        subject_marks[entry["subject_name"]].append(entry["mark"])  # Group marks by subject
+    total_students_assessed = StudentMark.objects.submitted().filter(
+        student__school__district=district,
+        academic_year=selected_year,
+        term=selected_term,
+    ).values("student").distinct().count()
+    total_district_average = district_average.get(district.id, 0)
 
     # Best and worst performing schools based on average score
     best_performing_schools = sorted([
-        {"school": school, "average_score": round(mean(marks), 2)}
-        for school, marks in school_marks.items()
+        {"school": school, "average_score": average}
+        for school, average in school_averages.items()
     ], key=lambda x: x["average_score"], reverse=True)[:5]
 
     weakest_performing_schools = sorted([
-        {"school": school, "average_score": round(mean(marks), 2)}
-        for school, marks in school_marks.items()
+        {"school": school, "average_score": average}
+        for school, average in school_averages.items()
     ], key=lambda x: x["average_score"])[:5]
 
     # Best and worst performing subjects based on average score
     best_performing_subjects = sorted([
-        {"subject": subject, "average_score": round(mean(marks), 2)}
-        for subject, marks in subject_marks.items()
+        {"subject": subject, "average_score": average}
+        for subject, average in subject_averages.items()
     ], key=lambda x: x["average_score"], reverse=True)[:5]
 
     weakest_performing_subjects = sorted([
-        {"subject": subject, "average_score": round(mean(marks), 2)}
-        for subject, marks in subject_marks.items()
+        {"subject": subject, "average_score": average}
+        for subject, average in subject_averages.items()
     ], key=lambda x: x["average_score"])[:5]
 
     # Performance trend data across schools
     trend_data = [
-        {"school": school, "score": round(mean(marks), 2)}
-        for school, marks in school_marks.items()
+        {"school": school, "score": average}
+        for school, average in school_averages.items()
     ]
 
     # Fetch headteacher results submissions for the selected academic year and term
@@ -202,27 +184,7 @@ def cis_dashboard(request):
         if entry["school__headteacher__first_name"] and entry["school__headteacher__last_name"]
     ]
 
-    # Handle AJAX requests and return data as JSON
-    if request.headers.get("x-requested-with") == "XMLHttpRequest":
-        return JsonResponse({
-            "total_schools": total_schools,
-            "total_teachers": total_teachers,
-            "total_students_assessed": total_students_assessed,
-            "total_district_average": total_district_average,
-            "best_performing_schools": best_performing_schools,
-            "weakest_performing_schools": weakest_performing_schools,
-            "best_performing_subjects": best_performing_subjects,
-            "weakest_performing_subjects": weakest_performing_subjects,
-            "performance_trends": trend_data,
-            "notifications": formatted_notifications,
-        })
-
-    # Return the rendered dashboard template with data
-    return render(request, "dashboards/cis_dashboard.html", {
-        "academic_years": available_years,
-        "terms": available_terms,
-        "selected_year": selected_year,
-        "selected_term": selected_term,
+    return {
         "total_schools": total_schools,
         "total_teachers": total_teachers,
         "total_students_assessed": total_students_assessed,
@@ -233,65 +195,82 @@ def cis_dashboard(request):
         "weakest_performing_subjects": weakest_performing_subjects,
         "performance_trends": trend_data,
         "notifications": formatted_notifications,
-    })
+    }
 
 
+def cis_dashboard_state(request):
+    user = request.user
+    if user.role != "cis" or not user.district_id:
+        return None
+    return dashboard_state(
+        request, "cis_dashboard", [("district", user.district_id)], term_calendar.selected_period(request),
+    )
 
-#------------ SISO DASHBOARD -----------------------
 
 @login_required
-def siso_dashboard(request):
-    # Ensure the user is a SISO and has a circuit assigned
+@conditional.conditional_get(cis_dashboard_state, vary=("X-Requested-With",))
+@query_budget(25)
+def cis_dashboard(request):
+    # Ensure the user is a CIS (Circuit Information System) user and is assigned to a district
     user = request.user
-    if user.role != "siso" or not user.circuit:
+    if user.role != "cis" or not user.district:
         return redirect("homepage")
 
-    # Get the circuit and associated schools
-    circuit = user.circuit
-    schools_in_circuit = School.objects.filter(circuit=circuit)
-
-    # Load filter options for academic years and terms from the shared helper
-    filter_options = json.loads(get_available_terms(request).content)
-    available_years = [year["name"] for year in filter_options.get("academic_years", [])]
-    available_terms = [term["name"] for term in filter_options.get("terms", [])]
+    district = user.district
 
-    # Get selected academic year and term from the request
-    academic_year = request.GET.get("academic_year", "").strip()
-    term = request.GET.get("term", "").strip()
+    # Academic years and terms from the shared term calendar
+    available_years = term_calendar.ACADEMIC_YEARS
+    available_terms = term_calendar.TERMS
 
-    # Validate and select the academic year and term
-    selected_year = academic_year if academic_year in available_years else filter_options.get("selected_academic_year")
-    selected_term = term if term in available_terms else filter_options.get("selected_term", "Term 1")
+    # Selected academic year and term, defaulting to the district's current period
+    selected_year, selected_term = term_calendar.selected_period(request)
 
     # If no valid academic year or term, show an error message
     if not selected_year or not selected_term:
-        return render(request, "dashboards/siso_dashboard.html", {
+        return render(request, "dashboards/cis_dashboard.html", {
             "error": "No academic data available.",
             "academic_years": available_years,
             "terms": available_terms,
         })
 
-    # Get relevant marks for students in the selected circuit, academic year, and term
-    marks_qs = StudentMark.objects.filter(
-        student__school__in=schools_in_circuit,
-        academic_year=selected_year,
-        term=selected_term,
-        subject__results__status="Submitted"
-    ).select_related("student__school", "subject")
-
-    # De-duplicate marks by student-subject pair
-    seen = set()
-    cleaned_marks = []
-    for m in marks_qs:
-        key = (m.student.id, m.subject.id)
-        if key not in seen:
-            seen.add(key)
-            cleaned_marks.append({
-                "student_id": m.student.id,
-                "school_name": m.student.school.name,
-                "subject_name": m.subject.name,
-                "mark": m.mark
-            })
+    stats = caching.get_or_build(
+        "cis_dashboard", [("district", district.id)], (selected_year, selected_term),
+        lambda: cis_dashboard_stats(district, selected_year, selected_term),
+    )
+
+    # Handle AJAX requests and return data as JSON
+    if request.headers.get("x-requested-with") == "XMLHttpRequest":
+        return JsonResponse(stats)
+
+    # Return the rendered dashboard template with data
+    return render(request, "dashboards/cis_dashboard.html", {
+        "academic_years": available_years,
+        "terms": available_terms,
+        "selected_year": selected_year,
+        "selected_term": selected_term,
+        **stats,
+    })
+
+
+
+#------------ SISO DASHBOARD -----------------------
+
+def siso_dashboard_stats(circuit, selected_year, selected_term):
+    """Circuit figures for the SISO dashboard; cached per circuit version by siso_dashboard."""
+    schools_in_circuit = School.objects.filter(circuit=circuit)
+
+    # Get submitted marks for students in the selected circuit, academic year, and term
+    cleaned_marks = list(
+        StudentMark.objects.submitted().filter(
+            student__school__in=schools_in_circuit,
+            academic_year=selected_year,
+            term=selected_term,
+        ).values(
+            "student_id", "mark",
+            school_name=F("student__school__name"),
+            subject_name=F("subject__name"),
+        )
+    )
 
     # Dashboard stats
     total_schools = schools_in_circuit.count()
@@ -358,6 +337,62 @@ def siso_dashboard(request):
         if entry["school__headteacher__first_name"] and entry["school__headteacher__last_name"]
     ]
 
+    return {
+        "total_schools": total_schools,
+        "total_teachers": total_teachers,
+        "total_students_assessed": total_students_assessed,
+        "total_circuit_average": total_circuit_average,
+        "best_performing_schools": best_performing_schools,
+        "weakest_performing_schools": weakest_performing_schools,
+        "best_performing_subjects": best_performing_subjects,
+        "weakest_performing_subjects": weakest_performing_subjects,
+        "performance_trends": trend_data,
+        "notifications": formatted_notifications,
+    }
+
+
+def siso_dashboard_state(request):
+    user = request.user
+    circuit = hierarchy.index().circuits.get(user.circuit_id) if user.role == "siso" else None
+    if circuit is None:
+        return None
+    return dashboard_state(
+        request, "siso_dashboard", [("circuit", circuit.id)], term_calendar.selected_period(request),
+        deadline_district_id=circuit.district_id,
+    )
+
+
+@login_required
+@conditional.conditional_get(siso_dashboard_state, vary=("X-Requested-With",))
+@query_budget(25)
+def siso_dashboard(request):
+    # Ensure the user is a SISO and has a circuit assigned
+    user = request.user
+    if user.role != "siso" or not user.circuit:
+        return redirect("homepage")
+
+    circuit = user.circuit
+
+    # Academic years and terms from the shared term calendar
+    available_years = term_calendar.ACADEMIC_YEARS
+    available_terms = term_calendar.TERMS
+
+    # Selected academic year and term, defaulting to the district's current period
+    selected_year, selected_term = term_calendar.selected_period(request)
+
+    # If no valid academic year or term, show an error message
+    if not selected_year or not selected_term:
+        return render(request, "dashboards/siso_dashboard.html", {
+            "error": "No academic data available.",
+            "academic_years": available_years,
+            "terms": available_terms,
+        })
+
+    stats = caching.get_or_build(
+        "siso_dashboard", [("circuit", circuit.id)], (selected_year, selected_term),
+        lambda: siso_dashboard_stats(circuit, selected_year, selected_term),
+    )
+
     # Get the result upload deadline for the district
     deadline_obj = ResultUploadDeadline.objects.filter(district=circuit.district).first()
 
@@ -380,16 +415,7 @@ def siso_dashboard(request):
     # Handle AJAX requests and return data as JSON
     if request.headers.get("x-requested-with") == "XMLHttpRequest":
         return JsonResponse({
-            "total_schools": total_schools,
-            "total_teachers": total_teachers,
-            "total_students_assessed": total_students_assessed,
-            "total_circuit_average": total_circuit_average,
-            "best_performing_schools": best_performing_schools,
-            "weakest_performing_schools": weakest_performing_schools,
-            "best_performing_subjects": best_performing_subjects,
-            "weakest_performing_subjects": weakest_performing_subjects,
-            "performance_trends": trend_data,
-            "notifications": formatted_notifications,
+            **stats,
             "deadline_status": deadline_status,
             "time_remaining": time_remaining.days if time_remaining else None,
         })
@@ -400,56 +426,15 @@ def siso_dashboard(request):
         "terms": available_terms,
         "selected_year": selected_year,
         "selected_term": selected_term,
-        "total_schools": total_schools,
-        "total_teachers": total_teachers,
-        "total_students_assessed": total_students_assessed,
-        "total_circuit_average": total_circuit_average,
-        "best_performing_schools": best_performing_schools,
-        "weakest_performing_schools": weakest_performing_schools,
-        "best_performing_subjects": best_performing_subjects,
-        "weakest_performing_subjects": weakest_performing_subjects,
-        "performance_trends": trend_data,
-        "notifications": formatted_notifications,
+        **stats,
         "deadline_status": deadline_status,
     })
 
 
 #--------------- HEADTEACHER DASHBOARD -----------------
 
-@login_required
-def headteacher_dashboard(request):
-    # Get the currently logged-in user
-    user = request.user
-
-    # Ensure the user is attached to a school
-    if not hasattr(user, 'school'):
-        return redirect("homepage")
-
-    school = user.school
-
-    # Fetch available academic years and terms using a shared helper
-    filter_options = json.loads(get_available_terms(request).content)
-    available_years = [year["name"] for year in filter_options.get("academic_years", [])]
-    available_terms = [term["name"] for term in filter_options.get("terms", [])]
-
-    # Extract selected academic year and term from query params or use defaults
-    academic_year = request.GET.get("academic_year")
-    selected_year = academic_year if academic_year in available_years else filter_options.get("selected_academic_year")
-
-    term = request.GET.get("term")
-    selected_term = term if term in available_terms else filter_options.get("selected_term", "Term 1")
-
-    # If no valid academic year or term is available, return an error
-    if not selected_year or not selected_term:
-        error_msg = "No academic data available."
-        if request.headers.get("x-requested-with") == "XMLHttpRequest":
-            return JsonResponse({"error": error_msg})
-        return render(request, "dashboards/headteacher_dashboard.html", {
-            "error": error_msg,
-            "available_years": available_years,
-            "available_terms": available_terms,
-        })
-
+def headteacher_dashboard_stats(school, selected_year, selected_term):
+    """School figures for the headteacher dashboard; cached per school version by headteacher_dashboard."""
     # Query marks for students in the selected school, year, and term
     marks_qs = StudentMark.objects.select_related('student', 'subject', 'class_group') \
                                     .filter(student__school=school, academic_year=selected_year, term=selected_term)
@@ -524,6 +509,64 @@ def headteacher_dashboard(request):
         if entry["teacher__first_name"] and entry["teacher__last_name"]
     ]
 
+    return {
+        "total_students_assessed": total_students_assessed,
+        "total_school_average": total_school_average,
+        "total_teachers": total_teachers,
+        "best_performing_subjects": best_performing_subjects,
+        "weakest_performing_subjects": weakest_performing_subjects,
+        "best_performing_classes": best_performing_classes,
+        "performance_trends": trend_data,
+        "notifications": notifications,
+    }
+
+
+def headteacher_dashboard_state(request):
+    school = hierarchy.index().schools.get(getattr(request.user, "school_id", None))
+    if school is None:
+        return None
+    return dashboard_state(
+        request, "headteacher_dashboard", [("school", school.id)],
+        term_calendar.selected_period(request, school.district_id), deadline_district_id=school.district_id,
+    )
+
+
+@login_required
+@conditional.conditional_get(headteacher_dashboard_state, vary=("X-Requested-With",))
+@query_budget(25)
+def headteacher_dashboard(request):
+    # Get the currently logged-in user
+    user = request.user
+
+    # Ensure the user is attached to a school
+    if not hasattr(user, 'school'):
+        return redirect("homepage")
+
+    school = user.school
+
+    # Available academic years and terms from the shared term calendar
+    available_years = term_calendar.ACADEMIC_YEARS
+    available_terms = term_calendar.TERMS
+
+    # Selected academic year and term from query params, defaulting to the district's current period
+    selected_year, selected_term = term_calendar.selected_period(request, school.district_id)
+
+    # If no valid academic year or term is available, return an error
+    if not selected_year or not selected_term:
+        error_msg = "No academic data available."
+        if request.headers.get("x-requested-with") == "XMLHttpRequest":
+            return JsonResponse({"error": error_msg})
+        return render(request, "dashboards/headteacher_dashboard.html", {
+            "error": error_msg,
+            "available_years": available_years,
+            "available_terms": available_terms,
+        })
+
+    stats = caching.get_or_build(
+        "headteacher_dashboard", [("school", school.id)], (selected_year, selected_term),
+        lambda: headteacher_dashboard_stats(school, selected_year, selected_term),
+    )
+
     # Get deadline for result uploads for the school's district
     deadline_obj = ResultUploadDeadline.objects.filter(district=school.district).first()
 
@@ -548,20 +591,20 @@ def headteacher_dashboard(request):
     # If the request is AJAX, return a JSON response
     if request.headers.get("x-requested-with") == "XMLHttpRequest":
         return JsonResponse({
-            "total_students_assessed": total_students_assessed,
-            "total_school_average": round(total_school_average, 2),
-            "total_teachers": total_teachers,
+            "total_students_assessed": stats["total_students_assessed"],
+            "total_school_average": round(stats["total_school_average"], 2),
+            "total_teachers": stats["total_teachers"],
             "best_performing_subjects": [
-                {"subject": s["subject__name"], "average_score": float(s["avg_mark"])} for s in best_performing_subjects
+                {"subject": s["subject__name"], "average_score": float(s["avg_mark"])} for s in stats["best_performing_subjects"]
             ],
             "worst_performing_subjects": [
-                {"subject": s["subject__name"], "average_score": float(s["avg_mark"])} for s in weakest_performing_subjects
+                {"subject": s["subject__name"], "average_score": float(s["avg_mark"])} for s in stats["weakest_performing_subjects"]
             ],
             "best_performing_classes": [
-                {"class_name": c["class_group__name"], "average_score": float(c["avg_mark"])} for c in best_performing_classes
+                {"class_name": c["class_group__name"], "average_score": float(c["avg_mark"])} for c in stats["best_performing_classes"]
             ],
-            "performance_trends": trend_data,
-            "notifications": notifications,
+            "performance_trends": stats["performance_trends"],
+            "notifications": stats["notifications"],
             "deadline_status": deadline_status,
             "time_remaining": time_remaining.days if deadline_obj else None
         })
@@ -572,14 +615,8 @@ def headteacher_dashboard(request):
         "terms": available_terms,
         "selected_year": selected_year,
         "selected_term": selected_term,
-        "total_students_assessed": total_students_assessed,
-        "total_school_average": round(total_school_average, 2),
-        "total_teachers": total_teachers,
-        "best_performing_subjects": best_performing_subjects,
-        "weakest_performing_subjects": weakest_performing_subjects,
-        "best_performing_classes": best_performing_classes,
-        "performance_trends": trend_data,
-        "notifications": notifications,
+        **stats,
+        "total_school_average": round(stats["total_school_average"], 2),
         "deadline_status": deadline_status,
     })
 
@@ -587,58 +624,20 @@ def headteacher_dashboard(request):
 @login_required
 def get_available_terms(request):
     """Returns available academic terms and years in an object format with 'id' and 'name'."""
-    
-    academic_year_str = request.GET.get("academic_year", "2024/2025")  # Default to current year format
-    if "/" in academic_year_str:
-        try:
-            base_year = int(academic_year_str.split("/")[0])  # Extract base year (e.g., 2024)
-        except ValueError:
-            return JsonResponse({"error": "Invalid academic year format"}, status=400)
-    else:
-        try:
-            base_year = int(academic_year_str)  # Fallback if single year is provided
-            academic_year_str = f"{base_year}/{base_year + 1}"
-        except ValueError:
-            return JsonResponse({"error": "Invalid academic year format"}, status=400)
-
-    academic_years = [{"id": year, "name": f"{year}/{year+1}"} for year in range(2020, 2050)]
-    terms = [{"id": i + 1, "name": term} for i, term in enumerate(["Term 1", "Term 2", "Term 3"])]
-
-    return JsonResponse({"terms": terms, "academic_years": academic_years, "selected_academic_year": academic_year_str})
-
-
-@login_required
-def class_teacher_dashboard(request):
-    # Get the current user and check if they have a teacher profile
-    user = request.user
-    teacher = getattr(user, 'teacher_profile', None)
-
-    # If the user is not a teacher, redirect to the homepage
-    if not teacher:
-        return redirect('homepage')
-
-    # Try to retrieve the class assignment for the teacher
-    try:
-        class_teacher = ClassTeacher.objects.get(teacher=teacher)
-    except ClassTeacher.DoesNotExist:
-        # If no class assignment exists, redirect to the homepage
-        return redirect('homepage')
-
-    # Get the class that the teacher is assigned to
-    assigned_class = class_teacher.assigned_class
-
-    # Load filter options for academic years and terms from the shared helper
-    filter_options = json.loads(get_available_terms(request).content)
-    all_years = [year["name"] for year in filter_options.get("academic_years", [])]
-    all_terms = [term["name"] for term in filter_options.get("terms", [])]
-
-    # Get selected filters for academic year and term, with fallbacks
     academic_year = request.GET.get("academic_year")
-    selected_year = academic_year if academic_year in all_years else filter_options.get("selected_academic_year")
+    if academic_year and not term_calendar.normalize_academic_year(academic_year):
+        return JsonResponse({"error": "Invalid academic year format"}, status=400)
 
-    term = request.GET.get("term")
-    selected_term = term if term in all_terms else filter_options.get("selected_term", "Term 1")
+    selected_year, selected_term = term_calendar.selected_period(request)
+    return JsonResponse({
+        **term_calendar.filter_options(),
+        "selected_academic_year": selected_year,
+        "selected_term": selected_term,
+    })
 
+
+def class_teacher_dashboard_stats(assigned_class, selected_year, selected_term):
+    """Class figures for the class teacher dashboard; cached per class version by class_teacher_dashboard."""
     # Base query for retrieving student marks
     student_marks = StudentMark.objects.filter(class_group=assigned_class)
 
@@ -695,6 +694,76 @@ def class_teacher_dashboard(request):
         if isinstance(trend.get("avg_mark"), Decimal):
             trend["avg_mark"] = float(trend["avg_mark"])
 
+    return {
+        "total_students_assessed": student_marks.values("student").distinct().count(),
+        "average_class_performance": round(average_class_performance, 2),
+        "best_students": [
+            {
+                "name": f"{s['student__last_name']} {s['student__first_name']}",
+                "mark": round(s["avg_mark"], 2) if s["avg_mark"] is not None else None
+            } for s in best_students
+        ],
+        "weakest_students": [
+            {
+                "name": f"{s['student__last_name']} {s['student__first_name']}",
+                "mark": round(s["avg_mark"], 2) if s["avg_mark"] is not None else None
+            } for s in weakest_students
+        ],
+        "top_performing_subject": {
+            "subject__name": top_subjects[0]["subject__name"],
+            "avg_mark": round(top_subjects[0]["avg_mark"], 2)
+        } if top_subjects else None,
+        "bottom_performing_subject": {
+            "subject__name": lowest_subjects[0]["subject__name"],
+            "avg_mark": round(lowest_subjects[0]["avg_mark"], 2)
+        } if lowest_subjects else None,
+        "performance_trends": list(performance_trends),
+    }
+
+
+def class_teacher_dashboard_state(request):
+    teacher = getattr(request.user, "teacher_profile", None)
+    school = hierarchy.index().schools.get(teacher.school_id) if teacher else None
+    if school is None:
+        return None
+    classes = list(assignments.for_teacher(teacher).class_departments)
+    if len(classes) != 1:
+        return None  # Not (or ambiguously) a class teacher: the view turns them away
+    return dashboard_state(
+        request, "class_teacher_dashboard", [("class", classes[0]), assignments.ASSIGNMENTS_SCOPE],
+        term_calendar.selected_period(request, school.district_id), deadline_district_id=school.district_id,
+    )
+
+
+@login_required
+@conditional.conditional_get(class_teacher_dashboard_state, vary=("X-Requested-With",))
+@query_budget(25)
+def class_teacher_dashboard(request):
+    # Get the current user and check if they have a teacher profile
+    user = request.user
+    teacher = getattr(user, 'teacher_profile', None)
+
+    # If the user is not a teacher, redirect to the homepage
+    if not teacher:
+        return redirect('homepage')
+
+    # Try to retrieve the class assignment for the teacher
+    try:
+        class_teacher = ClassTeacher.objects.get(teacher=teacher)
+    except ClassTeacher.DoesNotExist:
+        # If no class assignment exists, redirect to the homepage
+        return redirect('homepage')
+
+    # Get the class that the teacher is assigned to
+    assigned_class = class_teacher.assigned_class
+
+    # Academic years and terms from the shared term calendar
+    all_years = term_calendar.ACADEMIC_YEARS
+    all_terms = term_calendar.TERMS
+
+    # Selected academic year and term, defaulting to the district's current period
+    selected_year, selected_term = term_calendar.selected_period(request, teacher.school.district_id)
+
     # Get the current result upload deadline for the teacher's school district
     deadline_obj = ResultUploadDeadline.objects.filter(district=teacher.school.district).first()
 
@@ -719,30 +788,12 @@ def class_teacher_dashboard(request):
 
     # If the request was made with AJAX, return a JsonResponse
     if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+        stats = caching.get_or_build(
+            "class_teacher_dashboard", [("class", assigned_class.id)], (selected_year, selected_term),
+            lambda: class_teacher_dashboard_stats(assigned_class, selected_year, selected_term),
+        )
         return JsonResponse({
-            "total_students_assessed": student_marks.values("student").distinct().count(),
-            "average_class_performance": round(average_class_performance, 2),
-            "best_students": [
-                {
-                    "name": f"{s['student__last_name']} {s['student__first_name']}",
-                    "mark": round(s["avg_mark"], 2) if s["avg_mark"] is not None else None
-                } for s in best_students
-            ],
-            "weakest_students": [
-                {
-                    "name": f"{s['student__last_name']} {s['student__first_name']}",
-                    "mark": round(s["avg_mark"], 2) if s["avg_mark"] is not None else None
-                } for s in weakest_students
-            ],
-            "top_performing_subject": {
-                "subject__name": top_subjects[0]["subject__name"],
-                "avg_mark": round(top_subjects[0]["avg_mark"], 2)
-            } if top_subjects else None,
-            "bottom_performing_subject": {
-                "subject__name": lowest_subjects[0]["subject__name"],
-                "avg_mark": round(lowest_subjects[0]["avg_mark"], 2)
-            } if lowest_subjects else None,
-            "performance_trends": list(performance_trends),
+            **stats,
             "deadline_status": deadline_status,
             "time_remaining": time_remaining.days if deadline_obj else None
         })
@@ -768,38 +819,8 @@ from django.http import JsonResponse
 from django.db.models import Avg
 import json
 
-@login_required
-def subject_teacher_dashboard(request):
-    # Get the current user and check if they have a teacher profile
-    user = request.user
-    teacher = getattr(user, 'teacher_profile', None)
-
-    # If the user is not a subject teacher, redirect to the homepage
-    if not teacher:
-        return redirect('homepage')
-
-    # Get the subjects and classes assigned to the teacher
-    subject_teachers = SubjectTeacher.objects.filter(teacher=teacher)
-    assigned_subjects = [st.subject for st in subject_teachers]
-    assigned_classes = set(class_obj for st in subject_teachers for class_obj in st.assigned_classes.all())
-
-    # Load filter options for academic years and terms from the shared helper
-    filter_options = json.loads(get_available_terms(request).content)
-
-    # Get selected filters from the request
-    subject_id = request.GET.get("subject_id")
-    class_id = request.GET.get("class_id")
-    academic_year = request.GET.get("academic_year")
-    term = request.GET.get("term")
-
-    # Validate and select the academic year
-    valid_years = [year["name"] for year in filter_options["academic_years"]]
-    academic_year = academic_year if academic_year in valid_years else filter_options["selected_academic_year"]
-
-    # Validate and select the term
-    all_terms = [t["name"] for t in filter_options["terms"]]
-    selected_term = term if term in all_terms else "Term 1"
-
+def subject_teacher_dashboard_stats(assigned_subjects, assigned_classes, subject_id, class_id, academic_year, term):
+    """Figures for the subject teacher dashboard; cached per class version by subject_teacher_dashboard."""
     # Filter StudentMark data based on assigned subjects and classes
     student_marks = StudentMark.objects.filter(
         subject__in=assigned_subjects,
@@ -832,27 +853,70 @@ def subject_teacher_dashboard(request):
         .order_by("avg_mark")[:3]
     )
 
-    # Calculate performance distribution across score buckets
-    score_buckets = {
-        "80-100": 0,
-        "55-79": 0,
-        "50-54": 0,
-        "40-49": 0,
-        "0-39": 0
+    # Calculate performance distribution across score buckets (counted by the database)
+    score_buckets = score_histogram(student_marks, buckets=SUMMARY_BUCKETS)
+
+    return {
+        "total_students_assessed": total_students_assessed,
+        "average_class_performance": average_class_performance,
+        "best_students": [
+            {
+                "name": f"{s['student__first_name']} {s['student__last_name']}",
+                "mark": round(s["avg_mark"], 2)
+            } for s in best_students
+        ],
+        "weakest_students": [
+            {
+                "name": f"{s['student__first_name']} {s['student__last_name']}",
+                "mark": round(s["avg_mark"], 2)
+            } for s in weakest_students
+        ],
+        "performance_distribution": score_buckets,
     }
 
-    # Assign student marks to their corresponding score buckets
-    for mark in student_marks.values_list("mark", flat=True):
-        if mark >= 80:
-            score_buckets["80-100"] += 1
-        elif 55 <= mark <= 79:
-            score_buckets["55-79"] += 1
-        elif 50 <= mark <= 54:
-            score_buckets["50-54"] += 1
-        elif 40 <= mark <= 49:
-            score_buckets["40-49"] += 1
-        else:
-            score_buckets["0-39"] += 1
+
+def subject_teacher_dashboard_state(request):
+    teacher = getattr(request.user, "teacher_profile", None)
+    school = hierarchy.index().schools.get(teacher.school_id) if teacher else None
+    if school is None:
+        return None
+    return dashboard_state(
+        request, "subject_teacher_dashboard",
+        [("class", class_id) for class_id in assignments.for_teacher(teacher).class_ids] + [assignments.ASSIGNMENTS_SCOPE],
+        (
+            teacher.id, request.GET.get("subject_id"), request.GET.get("class_id"), request.GET.get("term"),
+            term_calendar.selected_period(request, school.district_id),
+        ),
+        deadline_district_id=school.district_id,
+    )
+
+
+@login_required
+@conditional.conditional_get(subject_teacher_dashboard_state, vary=("X-Requested-With",))
+@query_budget(25)
+def subject_teacher_dashboard(request):
+    # Get the current user and check if they have a teacher profile
+    user = request.user
+    teacher = getattr(user, 'teacher_profile', None)
+
+    # If the user is not a subject teacher, redirect to the homepage
+    if not teacher:
+        return redirect('homepage')
+
+    # Get the subjects and classes assigned to the teacher
+    subject_teachers = SubjectTeacher.objects.filter(teacher=teacher).select_related("subject")
+    assigned_subjects = [st.subject for st in subject_teachers]
+    assigned_classes = set(ClassGroup.objects.filter(id__in=assignments.for_teacher(teacher).class_ids))
+
+    # Get selected filters from the request
+    subject_id = request.GET.get("subject_id")
+    class_id = request.GET.get("class_id")
+    term = request.GET.get("term")
+
+    # Validated academic year and term from the shared term calendar
+    valid_years = term_calendar.ACADEMIC_YEARS
+    all_terms = term_calendar.TERMS
+    academic_year, selected_term = term_calendar.selected_period(request, teacher.school.district_id)
 
     # Get the current result upload deadline for the teacher's school district
     deadline_obj = ResultUploadDeadline.objects.filter(district=teacher.school.district).first()
@@ -879,22 +943,20 @@ def subject_teacher_dashboard(request):
 
     # If the request is an AJAX request, return the data as a JSON response
     if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+        # Cached against every class taught; the assignments are part of the key, so a change to them is a new entry
+        stats = caching.get_or_build(
+            "subject_teacher_dashboard",
+            [("class", class_obj.id) for class_obj in assigned_classes],
+            (
+                teacher.id, sorted(subject.id for subject in assigned_subjects),
+                subject_id, class_id, academic_year, term,
+            ),
+            lambda: subject_teacher_dashboard_stats(
+                assigned_subjects, assigned_classes, subject_id, class_id, academic_year, term,
+            ),
+        )
         return JsonResponse({
-            "total_students_assessed": total_students_assessed,
-            "average_class_performance": average_class_performance,
-            "best_students": [
-                {
-                    "name": f"{s['student__first_name']} {s['student__last_name']}",
-                    "mark": round(s["avg_mark"], 2)
-                } for s in best_students
-            ],
-            "weakest_students": [
-                {
-                    "name": f"{s['student__first_name']} {s['student__last_name']}",
-                    "mark": round(s["avg_mark"], 2)
-                } for s in weakest_students
-            ],
-            "performance_distribution": score_buckets,
+            **stats,
             "deadline_status": deadline_status,
             "time_remaining": time_remaining.days if deadline_obj else None
         })
@@ -3,16 +3,13 @@ import csv
 import json
 import os
 from io import BytesIO
-from collections import defaultdict
 import logging
 
 # --- Django Core ---
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.contrib.auth.hashers import make_password
 from django.core.exceptions import ValidationError
-from django.core.files.storage import default_storage
 from django.core.validators import validate_email
 from django.http import (
     HttpResponse, JsonResponse
@@ -23,6 +20,7 @@ from django.shortcuts import (
 from django.utils import timezone
 from django.utils.dateparse import parse_date
 from django.views.decorators.http import require_http_methods, require_POST
+from django.db import transaction
 from django.db.models import Q
 
 # --- Third-party Libraries ---
@@ -38,11 +36,16 @@ from reportlab.platypus import (
 # --- Internal Imports ---
 from core.models import (
     District, Notification,School, ResultUploadDeadline, 
-    Circuit, StudentMark, Department
+    Circuit, StudentMark, Department, PerformanceSummary
 )
 from core.forms import (
     AddSchoolForm,
 )
+from core.aggregations import summary_breakdowns, summary_trend_totals
+from core.analytics import department_breakdown, trend_window, build_trends
+from core.middlewares import query_budget
+from core.report_cache import cached_report, report_context
+from core import caching, conditional, hierarchy, imports, passwords, spreadsheets, term_calendar
 
 logger = logging.getLogger(__name__)
 
@@ -158,7 +161,7 @@ def siso_management(request):
 @login_required
 def get_user_circuits(request):
     if hasattr(request.user, 'district'):
-        circuits = Circuit.objects.filter(district=request.user.district)
+        circuits = hierarchy.index().circuits_of(request.user.district_id)
         data = [{"id": c.id, "name": c.name} for c in circuits]  # No 'code' key here
         return JsonResponse(data, safe=False)
     return JsonResponse([], safe=False)
@@ -177,7 +180,7 @@ def get_siso_current_circuit(request, siso_id):
 @login_required
 def get_user_sisos(request):
     if hasattr(request.user, 'district'):
-        sisos = User.objects.filter(role='siso', district=request.user.district)
+        sisos = hierarchy.index().sisos_of(request.user.district_id)
         data = [{"id": siso.id, "first_name": siso.first_name, "last_name": siso.last_name} for siso in sisos]
         return JsonResponse({"sisos": data}, safe=False)
     return JsonResponse({"sisos": []}, safe=False)
@@ -185,20 +188,21 @@ def get_user_sisos(request):
 
 
 def fetch_circuits_and_schools(request, district_id):
-    try:
-        district = District.objects.get(id=district_id)
-        data = [
-            {
-                "id": circuit.id,
-                "name": circuit.name,
-                "schools": [{"id": school.id, "name": school.name} for school in circuit.schools.all()]
-            }
-            for circuit in district.circuits.all()
-        ]
-        return JsonResponse({"district": district.name, "circuits": data}, safe=False)
-    except District.DoesNotExist:
+    places = hierarchy.index()
+    district = places.districts.get(district_id)
+    if district is None:
         return JsonResponse({"error": "District not found"}, status=404)
 
+    data = [
+        {
+            "id": circuit.id,
+            "name": circuit.name,
+            "schools": [{"id": school.id, "name": school.name} for school in places.schools_of_circuit(circuit.id)]
+        }
+        for circuit in places.circuits_of(district.id)
+    ]
+    return JsonResponse({"district": district.name, "circuits": data}, safe=False)
+
 
 #-------------- SCHOOL MANAGEMENT ----------------------
 
@@ -227,7 +231,7 @@ def manual_school_upload(request):
 
 @login_required
 def bulk_upload_schools(request):
-    """Handles bulk school + headteacher upload via CSV or Excel."""
+    """Queues a school + headteacher CSV or Excel upload for the import worker (see import_schools)."""
     if request.method == "POST" and request.FILES.get("file"):
         file = request.FILES["file"]
         file_extension = os.path.splitext(file.name)[1].lower()
@@ -238,45 +242,30 @@ def bulk_upload_schools(request):
                 "error": "Invalid file type! Only .csv, .xls, and .xlsx are allowed."
             }, status=400)
 
-        file_path = default_storage.save(f"uploads/{file.name}", file)
-        df = load_file(file_extension, default_storage.path(file_path))
+        return imports.accepted(imports.enqueue("schools", request.user, file))
 
-        if df is None:
-            return JsonResponse({
-                "success": False,
-                "error": "Error reading the file. Ensure it's a valid CSV or Excel."
-            }, status=400)
+    return JsonResponse({"success": False, "error": "Invalid request"}, status=400)
 
-        try:
-            schools_created, skipped_entries = process_bulk_schools(df, request.user)
-        except ValueError as ve:
-            return JsonResponse({
-                "success": False,
-                "error": str(ve)
-            }, status=400)
 
-        if skipped_entries:
-            return JsonResponse({
-                "success": False,
-                "error": f"Some rows were skipped: {', '.join(skipped_entries)}"
-            }, status=400)
+def import_schools(job):
+    """Bulk school + headteacher upload; the whole file is checked, then saved in one transaction."""
+    df = load_file(os.path.splitext(job.file_name)[1].lower(), job.upload())
+    if df is None:
+        raise ValueError("Error reading the file. Ensure it's a valid CSV or Excel.")
 
-        return JsonResponse({
-            "success": True,
-            "message": f"{schools_created} schools uploaded successfully!",
-            "skipped_entries": skipped_entries
-        })
+    schools_created, skipped_entries = process_bulk_schools(df, job.user)
+    job.record(len(df), skipped_entries)
 
-    return JsonResponse({"success": False, "error": "Invalid request"}, status=400)
+    return f"{schools_created} schools uploaded successfully!"
 
 
-def load_file(file_extension, file_path):
-    """Load file (CSV or Excel) into a pandas DataFrame."""
+def load_file(file_extension, file):
+    """Load file (CSV or Excel, path or file object) into a pandas DataFrame."""
     try:
         if file_extension == ".csv":
-            df = pd.read_csv(file_path, dtype=str)
+            df = pd.read_csv(file, dtype=str)
         elif file_extension in [".xls", ".xlsx"]:
-            df = pd.read_excel(file_path, dtype=str)
+            df = pd.read_excel(file, dtype=str)
 
         df.columns = [col.strip().lower() for col in df.columns]
         return df
@@ -316,7 +305,15 @@ def validate_school_row(row, circuit_lookup, password1, password2, row_num):
     return None
 
 
+# School.school_code is an IntegerField: the largest code every database can store
+MAX_SCHOOL_CODE = 2147483647
+
+
 def process_bulk_schools(df, user):
+    """
+    Create the schools and headteachers of an upload: every row is checked in
+    memory first, then everything accepted is inserted in bulk in one transaction.
+    """
     required_columns = [
         "school_name", "school_code", "circuit_name", "departments",
         "headteacher_staff_id", "headteacher_first_name", "headteacher_last_name",
@@ -329,103 +326,116 @@ def process_bulk_schools(df, user):
 
     df = df.fillna("")
 
-    schools_created = 0
     skipped_entries = []
 
-    
+    # Against the database and the rows above
     existing_school_codes = set(School.objects.values_list("school_code", flat=True))
     existing_headteacher_emails = set(User.objects.values_list("email", flat=True))
+    existing_staff_ids = set(User.objects.values_list("staff_id", flat=True))
+    existing_license_numbers = set(User.objects.values_list("license_number", flat=True))
 
-    
     circuits = Circuit.objects.filter(district=user.district)
     circuit_lookup = {c.name.strip().lower(): c for c in circuits}
     all_departments = {d.name.strip().lower(): d for d in Department.objects.all()}
 
+    # 1. Check every row; nothing is written until the whole file has been read
+    accepted = []  # (school, its departments, headteacher, password)
     for index, row in df.iterrows():
         row_num = index + 2
-        
-
-        try:
-            school_code = str(row["school_code"]).strip()
-            email = str(row["headteacher_email"]).strip().lower()
-            password1 = str(row["password1"]).strip()
-            password2 = str(row["password2"]).strip()
-            circuit_name = str(row["circuit_name"]).strip().lower()
-            department_names = str(row.get("departments", "")).strip()
-
-            if school_code in existing_school_codes or email in existing_headteacher_emails:
-                msg = f"Row {row_num}: Duplicate school code ({school_code}) or email ({email})."
-                
-                skipped_entries.append(msg)
-                continue
-
-            
-
-            error = validate_school_row(row, circuit_lookup, password1, password2, row_num)
-            if error:
-                
-                skipped_entries.append(error)
-                continue
-
-            school = School.objects.create(
-                name=row["school_name"].strip(),
-                school_code=school_code,
-                circuit=circuit_lookup[circuit_name],
-                district=user.district
-            )
-
-            if department_names:
-                try:
-                    dept_list = [name.strip().lower() for name in department_names.split(",")]
-                    matched_departments = [all_departments[name] for name in dept_list if name in all_departments]
-                    if matched_departments:
-                        
-                        school.department.set(matched_departments)
-                    else:
-                        msg = f"Row {row_num}: No valid departments found in '{department_names}'."
-
-                        school.delete()
-                        skipped_entries.append(msg)
-                        continue
-                except Exception as e:
-                    msg = f"Row {row_num}: Error processing departments - {str(e)}"
-                    school.delete()
-                    skipped_entries.append(msg)
-                    continue
-            else:
-                msg = f"Row {row_num}: Departments column is empty."
-                school.delete()
-                skipped_entries.append(msg)
-                continue
-
-            headteacher = User.objects.create(
-                staff_id=row["headteacher_staff_id"].strip(),
-                first_name=row["headteacher_first_name"].strip(),
-                last_name=row["headteacher_last_name"].strip(),
-                license_number=row["headteacher_license_number"].strip(),
-                email=email,
-                phone_number=row["headteacher_phone_number"].strip(),
-                role="headteacher",
-                district=school.district,
-                circuit=school.circuit,
-                school=school,
-                password=make_password(password1)
-            )
 
+        school_code = str(row["school_code"]).strip()
+        code = int(school_code) if school_code.isdigit() else None
+        if code is not None and code > MAX_SCHOOL_CODE:
+            code = None  # Reported as an invalid code below
+        email = str(row["headteacher_email"]).strip().lower()
+        password1 = str(row["password1"]).strip()
+        password2 = str(row["password2"]).strip()
+        department_names = str(row.get("departments", "")).strip()
+
+        if code in existing_school_codes or email in existing_headteacher_emails:
+            skipped_entries.append(f"Row {row_num}: Duplicate school code ({school_code}) or email ({email}).")
+            continue
+
+        error = validate_school_row(row, circuit_lookup, password1, password2, row_num)
+        if error:
+            skipped_entries.append(error)
+            continue
+
+        if code is None:
+            skipped_entries.append(f"Row {row_num}: Invalid school code ({school_code}).")
+            continue
+
+        if not department_names:
+            skipped_entries.append(f"Row {row_num}: Departments column is empty.")
+            continue
+        dept_list = [name.strip().lower() for name in department_names.split(",")]
+        matched_departments = [all_departments[name] for name in dept_list if name in all_departments]
+        if not matched_departments:
+            skipped_entries.append(f"Row {row_num}: No valid departments found in '{department_names}'.")
+            continue
+
+        staff_id = str(row["headteacher_staff_id"]).strip()
+        license_number = str(row["headteacher_license_number"]).strip()
+        if staff_id in existing_staff_ids or license_number in existing_license_numbers:
+            skipped_entries.append(f"Row {row_num}: Duplicate headteacher staff ID ({staff_id}) or license number ({license_number}).")
+            continue
+
+        circuit = circuit_lookup[str(row["circuit_name"]).strip().lower()]
+        school_fields = {"name": str(row["school_name"]).strip()}
+        headteacher_fields = {
+            "staff_id": staff_id,
+            "first_name": str(row["headteacher_first_name"]).strip(),
+            "last_name": str(row["headteacher_last_name"]).strip(),
+            "license_number": license_number,
+            "email": email,
+            "phone_number": str(row["headteacher_phone_number"]).strip(),
+        }
+        field = spreadsheets.too_long(School, school_fields) or spreadsheets.too_long(User, headteacher_fields)
+        if field:
+            skipped_entries.append(f"Row {row_num}: Value too long for {field}.")
+            continue
+
+        school = School(**school_fields, school_code=code, circuit=circuit, district=user.district)
+        headteacher = User(
+            **headteacher_fields,
+            role="headteacher",
+            district=user.district,
+            circuit=circuit,
+            school=school,
+        )
+        accepted.append((school, matched_departments, headteacher, password1))
+        existing_school_codes.add(code)
+        existing_headteacher_emails.add(email)
+        existing_staff_ids.add(staff_id)
+        existing_license_numbers.add(license_number)
+
+    if not accepted:
+        return 0, skipped_entries
+
+    # 2. Hash the headteachers' passwords, in parallel
+    schools = [school for school, _, _, _ in accepted]
+    headteachers = [headteacher for _, _, headteacher, _ in accepted]
+    for headteacher, password in zip(headteachers, passwords.hash_passwords(p for _, _, _, p in accepted)):
+        headteacher.password = password
+
+    # 3. Insert it all, or nothing
+    with transaction.atomic():
+        School.objects.bulk_create(schools)
+        User.objects.bulk_create(headteachers)  # Their school links pick up the new ids
+        School.department.through.objects.bulk_create([
+            School.department.through(school_id=school.id, department_id=department.id)
+            for school, departments, _, _ in accepted
+            for department in departments
+        ])
+        for school, headteacher in zip(schools, headteachers):
             school.headteacher = headteacher
-            school.save()
+        School.objects.bulk_update(schools, ["headteacher"])
 
-            schools_created += 1
+        # bulk_create sends no post_save: refresh what the School and User signals would have
+        caching.bump_scopes({scope for obj in [*schools, *headteachers] for scope in caching.scopes_of(obj)})
+        hierarchy.changed()
 
-        except Exception as e:
-            msg = f"Row {row_num}: Unexpected error - {str(e)}"
-            try:
-                school.delete()
-            except:
-                pass
-            skipped_entries.append(msg)
-
-    return schools_created, skipped_entries
+    return len(schools), skipped_entries
 
 
 
@@ -500,33 +510,11 @@ def get_roles(request):
     ]
     return JsonResponse({'roles': roles})
 
-@login_required
-def get_available_terms(request):
-    """Returns available academic terms and years in an object format with 'id' and 'name'."""
-    
-    academic_year_str = request.GET.get("academic_year", "2024/2025")  # Default to current year format
-    if "/" in academic_year_str:
-        try:
-            base_year = int(academic_year_str.split("/")[0])  # Extract base year (e.g., 2024)
-        except ValueError:
-            return JsonResponse({"error": "Invalid academic year format"}, status=400)
-    else:
-        try:
-            base_year = int(academic_year_str)  # Fallback if single year is provided
-            academic_year_str = f"{base_year}/{base_year + 1}"
-        except ValueError:
-            return JsonResponse({"error": "Invalid academic year format"}, status=400)
-
-    academic_years = [{"id": year, "name": f"{year}/{year+1}"} for year in range(2020, 2050)]
-    terms = [{"id": i + 1, "name": term} for i, term in enumerate(["Term 1", "Term 2", "Term 3"])]
-
-    return JsonResponse({"terms": terms, "academic_years": academic_years, "selected_academic_year": academic_year_str})
-
-
 #------------------- PERFORMANCE ANALYSIS -----------------------------------
 
+@query_budget(20)
 def district_performance_analysis(request):
-    context = get_district_performance_context(request)
+    context = district_performance_context(request)
     return render(request, 'cis/district_performance_analysis.html', context)
 
 def get_district_performance_context(request):
@@ -535,168 +523,67 @@ def get_district_performance_context(request):
     print("🔍 Starting district performance context generation...")
 
     # Load filters
-    filter_options = json.loads(get_available_terms(request).content)
-    academic_year = request.GET.get("academic_year", "").strip()
-    selected_term = request.GET.get("term", "all")
+    academic_year, selected_term = term_calendar.selected_period(request)
     circuit_id = request.GET.get("circuit_id", "all")
 
-    valid_years = [year["name"] for year in filter_options["academic_years"]]
-    academic_year = academic_year if academic_year in valid_years else filter_options["selected_academic_year"]
-
-    all_terms = [t["name"] for t in filter_options["terms"]]
-    selected_term = selected_term if selected_term in all_terms else "Term 1"
+    valid_years = term_calendar.ACADEMIC_YEARS
+    all_terms = term_calendar.TERMS
 
     user = request.user
     if not hasattr(user, 'district') or user.role != 'cis':
         return redirect("homepage")
 
-    circuits_in_district = Circuit.objects.filter(district=user.district)
+    places = hierarchy.index()
+    circuits_in_district = places.circuits_of(user.district_id)
     available_circuits = [{"id": c.id, "name": c.name} for c in circuits_in_district]
 
     if circuit_id == "all":
         circuits_to_analyze = circuits_in_district
     else:
-        circuits_to_analyze = circuits_in_district.filter(id=circuit_id)
+        circuits_to_analyze = [c for c in circuits_in_district if str(c.id) == str(circuit_id)]
 
-    print(f"🧭 Circuits selected for analysis: {circuits_to_analyze.count()}")
+    print(f"🧭 Circuits selected for analysis: {len(circuits_to_analyze)}")
 
-    circuit_analyses = []
+    circuit_ids = [c.id for c in circuits_to_analyze]
 
-    for circuit in circuits_to_analyze:
-        print(f"\n📍 Analyzing Circuit: {circuit.name}")
-        schools_in_circuit = School.objects.filter(circuit=circuit)
+    # Whole district in a couple of GROUP BYs over the rollups instead of per-school, per-mark loops
+    breakdowns = summary_breakdowns(PerformanceSummary.objects.filter(
+        level="class",
+        class_group__school__circuit_id__in=circuit_ids,
+        academic_year=academic_year,
+        term=selected_term,
+    ))
 
-        selected_marks = StudentMark.objects.filter(
-            student__school__in=schools_in_circuit,
-            academic_year=academic_year,
-            term=selected_term,
-            subject__results__status="Submitted"
-        ).select_related("student__school", "student__class_group", "subject")
+    academic_years, term_sequence = trend_window(academic_year, selected_term)
+    trend_by_circuit = summary_trend_totals(
+        PerformanceSummary.objects.filter(level="circuit", circuit_id__in=circuit_ids),
+        term_sequence,
+        "circuit",
+    )
 
-        selected_marks = deduplicate_marks(selected_marks)
+    circuit_analyses = []
 
+    for circuit in circuits_to_analyze:
         school_departments = {}
         school_subject_averages = {}
         school_subjects = {}
         school_score_buckets = {}
         school_chart_data = {}
 
-        for school in schools_in_circuit:
-            school_marks = [m for m in selected_marks if m.student.school_id == school.id]
-
-            dept_structure = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
-            for mark in school_marks:
-                subject = mark.subject
-                class_name = mark.student.class_group.name
-                for dept in subject.department.all():
-                    dept_structure[dept.name][subject.name][class_name].append(float(mark.mark))
-
-            departments = {}
-            subject_averages = {}
-            for dept_name, subjects in dept_structure.items():
-                all_class_names = set()
-                dept_subjects = {}
-                averages = {}
-                for subject_name, classes in subjects.items():
-                    class_avgs = {}
-                    all_scores = []
-                    for class_name, scores in classes.items():
-                        all_class_names.add(class_name)
-                        avg = round(sum(scores) / len(scores), 2)
-                        class_avgs[class_name] = avg
-                        all_scores.extend(scores)
-                    dept_subjects[subject_name] = class_avgs
-                    averages[subject_name] = round(sum(all_scores) / len(all_scores), 2) if all_scores else 0.0
-                departments[dept_name] = {
-                    "subjects": dept_subjects,
-                    "all_classes": sorted(all_class_names)
-                }
-                subject_averages[dept_name] = averages
-
-            subjects = defaultdict(list)
-            for mark in school_marks:
-                subjects[mark.subject.name].append(float(mark.mark))
-            for subject, marks in subjects.items():
-                subjects[subject] = round(sum(marks) / len(marks), 2) if marks else "-"
-
-            all_scores = [score for score in subjects.values() if isinstance(score, (int, float))]
-            score_buckets = {
-                "80-100": sum(1 for s in all_scores if s >= 80),
-                "55-79": sum(1 for s in all_scores if 55 <= s < 80),
-                "50-54": sum(1 for s in all_scores if 50 <= s < 55),
-                "40-49": sum(1 for s in all_scores if 40 <= s < 50),
-                "0-39":  sum(1 for s in all_scores if s < 40),
-            }
-
-            chart_data_per_school = {}
-            for dept_name, dept_data in departments.items():
-                subject_charts = []
-                labels = dept_data["all_classes"]
-                for subject_name, class_avg_dict in dept_data["subjects"].items():
-                    data = [class_avg_dict.get(class_name, 0) for class_name in labels]
-                    subject_charts.append({
-                        "label": subject_name,
-                        "data": data
-                    })
-                chart_data_per_school[dept_name] = {
-                    "labels": labels,
-                    "datasets": subject_charts
-                }
-
-            school_departments[school.name] = departments
-            school_subject_averages[school.name] = subject_averages
-            school_subjects[school.name] = subjects
-            school_score_buckets[school.name] = score_buckets
-            school_chart_data[school.name] = chart_data_per_school
-
-        # === Trend Data ===
-        base_year = int(academic_year.split("/")[0])
-        prev_1 = f"{base_year - 1}/{base_year}"
-        prev_2 = f"{base_year - 2}/{base_year - 1}"
-        academic_years = [prev_2, prev_1, academic_year]
-
-        if selected_term == "Term 1":
-            term_sequence = [("Term 2", prev_1), ("Term 3", prev_1), ("Term 1", academic_year)]
-        elif selected_term == "Term 2":
-            term_sequence = [("Term 3", prev_1), ("Term 1", academic_year), ("Term 2", academic_year)]
-        else:
-            term_sequence = [("Term 1", academic_year), ("Term 2", academic_year), ("Term 3", academic_year)]
-
-        term_keys = [f"{t} ({y})" for t, y in term_sequence]
-        q_terms = Q()
-        for term, year in term_sequence:
-            q_terms |= Q(term=term, academic_year=year)
-
-        trend_marks = StudentMark.objects.filter(
-            student__school__in=schools_in_circuit
-        ).filter(q_terms, subject__results__status="Submitted").select_related("student", "subject")
-
-        trend_marks = deduplicate_marks(trend_marks)
-
-        term_aggregates = {key: [] for key in term_keys}
-        year_aggregates = {year: [] for year in academic_years}
-
-        for mark in trend_marks:
-            score = float(mark.mark)
-            key = f"{mark.term} ({mark.academic_year})"
-            if key in term_aggregates:
-                term_aggregates[key].append(score)
-            if mark.academic_year in year_aggregates:
-                year_aggregates[mark.academic_year].append(score)
-
-        term_trend = {
-            "Circuit": circuit.name,
-            **{key: round(sum(v) / len(v), 2) if v else "-" for key, v in term_aggregates.items()}
+        for school in places.schools_of_circuit(circuit.id):
+            breakdown = breakdowns.get(school.id) or department_breakdown({}, {})
+            school_departments[school.name] = breakdown["departments"]
+            school_subject_averages[school.name] = breakdown["subject_averages"]
+            school_subjects[school.name] = breakdown["subjects"]
+            school_score_buckets[school.name] = breakdown["score_buckets"]
+            school_chart_data[school.name] = breakdown["chart_data"]
+
+        circuit_totals = {
+            (term, year): totals
+            for (circuit_key, term, year), totals in trend_by_circuit.items()
+            if circuit_key == circuit.id
         }
-        academic_trend = {
-            "Circuit": circuit.name,
-            **{year: round(sum(v) / len(v), 2) if v else "-" for year, v in year_aggregates.items()}
-        }
-
-        term_labels = list(term_trend.keys())[1:]
-        term_values = [float(val) if isinstance(val, (int, float)) else None for val in list(term_trend.values())[1:]]
-        year_labels = list(academic_trend.keys())[1:]
-        year_values = [float(val) if isinstance(val, (int, float)) else None for val in list(academic_trend.values())[1:]]
+        trends = build_trends("Circuit", circuit.name, circuit_totals, academic_years, term_sequence)
 
         circuit_analyses.append({
             "name": circuit.name,
@@ -705,10 +592,7 @@ def get_district_performance_context(request):
             "school_subjects": school_subjects,
             "school_score_buckets": school_score_buckets,
             "school_chart_data": school_chart_data,
-            "term_trend": term_trend,
-            "academic_trend": academic_trend,
-            "term_chart": {"labels": term_labels, "data": term_values},
-            "year_chart": {"labels": year_labels, "data": year_values},
+            **trends,
         })
 
     print("✅ District-level analysis complete.")
@@ -725,18 +609,24 @@ def get_district_performance_context(request):
         },
     }
 
-def deduplicate_marks(marks_queryset):
-    seen = set()
-    result = []
-    for m in marks_queryset:
-        key = (m.student.id, m.subject.id)
-        if key not in seen:
-            seen.add(key)
-            result.append(m)
-    return result
+
+def district_report_key(request):
+    if getattr(request.user, 'role', None) != 'cis' or not request.user.district_id:
+        return None
+    return (
+        [("district", request.user.district_id)],
+        (*term_calendar.selected_period(request), request.GET.get("circuit_id", "all")),
+    )
+
+
+district_performance_context = report_context(
+    "district_performance_context", district_report_key, get_district_performance_context,
+)
 
 
 @login_required
+@query_budget(20)
+@cached_report("district_performance", district_report_key)
 def download_district_performance_pdf(request):
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=120, bottomMargin=50)
@@ -745,7 +635,7 @@ def download_district_performance_pdf(request):
     subtitle_style = styles['Heading4']
 
     # Get district-wide performance context
-    context = get_district_performance_context(request)
+    context = district_performance_context(request)
     academic_year = context['filters']['selected_year']
     term = context['filters']['selected_term']
     circuits = context['circuits']
@@ -923,8 +813,9 @@ def user_search(request):
             try:
                 searched_user = User.objects.get(staff_id=staff_id, district=user.district)
                 print(f"User found: {searched_user}")
-                circuits = Circuit.objects.filter(district=user.district)
-                schools = School.objects.filter(district=user.district)
+                places = hierarchy.index()
+                circuits = places.circuits_of(user.district_id)
+                schools = places.schools_of_district(user.district_id)
 
                 return JsonResponse({
                     'success': True,
@@ -938,8 +829,8 @@ def user_search(request):
                         'role': searched_user.role,
                     },
                     'available_options': {
-                        'circuits': list(circuits.values('id', 'name')),
-                        'schools': list(schools.values('id', 'name')),
+                        'circuits': [{'id': c.id, 'name': c.name} for c in circuits],
+                        'schools': [{'id': s.id, 'name': s.name} for s in schools],
                     },
                 })
 
@@ -1178,21 +1069,12 @@ def set_result_upload_deadline(request):
         print(f"[DEBUG] User role is not 'cis'. Redirecting to permission denied page.")
         return render(request, "cis/permission_denied.html")
 
-    # 🎯 Use shared helper for filter options
-    print("[DEBUG] Fetching filter options...")
-    filter_options = json.loads(get_available_terms(request).content.decode("utf-8"))
-    available_years = [year["name"] for year in filter_options.get("academic_years", [])]
-    available_terms = [term["name"] for term in filter_options.get("terms", [])]
-
-    print(f"[DEBUG] Available Years: {available_years}")
-    print(f"[DEBUG] Available Terms: {available_terms}")
-
-    # 🎯 Extract selected year/term with fallback
-    academic_year = request.GET.get("academic_year")
-    selected_year = academic_year if academic_year in available_years else filter_options.get("selected_academic_year", available_years[0] if available_years else None)
+    # 🎯 Filter options from the shared term calendar
+    available_years = term_calendar.ACADEMIC_YEARS
+    available_terms = term_calendar.TERMS
 
-    term = request.GET.get("term")
-    selected_term = term if term in available_terms else filter_options.get("selected_term", available_terms[0] if available_terms else None)
+    # 🎯 Extract selected year/term, defaulting to the district's current period
+    selected_year, selected_term = term_calendar.selected_period(request)
 
     print(f"[DEBUG] Selected Year from GET: {selected_year}")
     print(f"[DEBUG] Selected Term from GET: {selected_term}")
@@ -1271,6 +1153,7 @@ def set_result_upload_deadline(request):
 
 @login_required
 @user_passes_test(lambda u: u.role == "cis")
+@conditional.conditional_get(conditional.notifications_state)
 def get_notifications(request):
     cis = request.user 
     notifications = Notification.objects.filter(recipient=cis, is_read=False).order_by("-created_at")
@@ -11,10 +11,12 @@ from django.contrib.auth.views import PasswordResetConfirmView
 from django.core.mail import send_mail
 from django.conf import settings
 from django.template.loader import render_to_string
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse_lazy
 from django.contrib.auth import get_user_model
-from core.models import Teacher, SubjectTeacher, ClassTeacher
+from django.contrib.auth.decorators import login_required
+from core import assignments, imports
+from core.models import ImportJob, Teacher
 
 User = get_user_model()
 
@@ -60,12 +62,12 @@ def unified_login(request):
 
             if user.role == 'teacher':
                 try:
-                    teacher = user.teacher_profile
+                    teacher_assignments = assignments.for_teacher(user.teacher_profile)
 
-                    if SubjectTeacher.objects.filter(teacher=teacher).exists():
+                    if teacher_assignments.is_subject_teacher:
                         return redirect('dashboards:subject_teacher_dashboard')
 
-                    if ClassTeacher.objects.filter(teacher=teacher).exists():
+                    if teacher_assignments.is_class_teacher:
                         return redirect('dashboards:class_teacher_dashboard')
 
                     return redirect('dashboards:teacher_dashboard')
@@ -161,3 +163,12 @@ from django.http import JsonResponse
 def healthz(request):
     return JsonResponse({'status': 'ok'})
 
+
+#------------- BULK UPLOAD PROGRESS ---------------
+
+@login_required
+def import_job_status(request, job_id):
+    """Progress of one of the user's bulk uploads, polled by the upload pages."""
+    job = get_object_or_404(ImportJob.objects.defer("payload"), pk=job_id, user=request.user)
+    return JsonResponse(imports.status(job))
+
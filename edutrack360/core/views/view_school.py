@@ -9,10 +9,10 @@ from collections import defaultdict
 # --- Django Core ---
 from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.db import transaction
 from django.db.models import Count, F, Q, Max
 from django.utils import timezone
 from django.utils.text import slugify
-from django.core.files.storage import default_storage
 from django.core.validators import validate_email
 from django.core.validators import RegexValidator
 from django.core.exceptions import ValidationError
@@ -47,6 +47,11 @@ from core.models import (
     ClassGroup, StudentMark, Notification
 )
 from core.forms import TeacherRegistrationForm
+from core import caching, conditional, imports, passwords, rollups, spreadsheets, term_calendar
+from core.aggregations import grouped_frame, score_histogram, subject_departments, window_filter
+from core.analytics import department_breakdown, trend_window, build_trends
+from core.middlewares import query_budget
+from core.report_cache import cached_report, report_context
 
 
 logger = logging.getLogger(__name__)
@@ -480,7 +485,7 @@ def manual_upload(request):
 
 @login_required
 def bulk_upload_teachers(request):
-    """Handles bulk teacher upload via CSV or Excel, ensuring validation."""
+    """Queues a teacher CSV or Excel upload for the import worker (see import_teachers)."""
     if request.method == "POST" and request.FILES.get("file"):
         file = request.FILES["file"]
         file_extension = os.path.splitext(file.name)[1].lower()
@@ -489,29 +494,26 @@ def bulk_upload_teachers(request):
         if not is_valid_file_type(file_extension):
             return JsonResponse({"success": False, "error": "Invalid file type! Only .csv, .xls, and .xlsx files are allowed."}, status=400)
 
-        # Save and load the file (CSV or Excel)
-        file_path = default_storage.save(f"uploads/{file.name}", file)
-        df = load_file(file_extension, default_storage.path(file_path))
+        return imports.accepted(imports.enqueue("teachers", request.user, file))
 
-        if df is None:
-            return JsonResponse({"success": False, "error": "Error reading the file. Ensure it's a valid CSV or Excel file."}, status=400)
-
-        # Validate and process rows
-        user = request.user
-        teachers_created, skipped_entries = process_bulk_teachers(df, user)
+    return JsonResponse({"success": False, "error": "Invalid request"}, status=400)
 
-        response_data = {
-            "success": True,
-            "message": f"{teachers_created} teachers uploaded successfully!",
-            "skipped_entries": skipped_entries,  # Include skipped entries for frontend debugging
-        }
 
-        if skipped_entries:
-            response_data["warning"] = "Some rows were skipped due to validation errors."
+def import_teachers(job):
+    """Bulk teacher upload via CSV or Excel, ensuring validation; progress is recorded a chunk of rows at a time."""
+    df = load_file(os.path.splitext(job.file_name)[1].lower(), job.upload())
+    if df is None:
+        raise ValueError("Error reading the file. Ensure it's a valid CSV or Excel file.")
 
-        return JsonResponse(response_data)
+    teachers_created = 0
+    # An empty sheet still goes through once, to have its columns checked
+    for start in range(0, len(df) or 1, spreadsheets.CHUNK_ROWS):
+        chunk = df.iloc[start:start + spreadsheets.CHUNK_ROWS]
+        created, skipped_entries = process_bulk_teachers(chunk, job.user)
+        teachers_created += created
+        job.record(len(chunk), skipped_entries)
 
-    return JsonResponse({"success": False, "error": "Invalid request"}, status=400)
+    return f"{teachers_created} teachers uploaded successfully!"
 
 
 
@@ -519,13 +521,13 @@ def is_valid_file_type(file_extension):
     """Check if the uploaded file is of a valid type."""
     return file_extension in [".csv", ".xls", ".xlsx"]
 
-def load_file(file_extension, file_path):
-    """Load CSV or Excel file into a pandas DataFrame."""
+def load_file(file_extension, file):
+    """Load a CSV or Excel file (path or file object) into a pandas DataFrame."""
     try:
         if file_extension == ".csv":
-            return pd.read_csv(file_path, dtype=str)  # Read all columns as strings to prevent data loss
+            return pd.read_csv(file, dtype=str)  # Read all columns as strings to prevent data loss
         elif file_extension in [".xls", ".xlsx"]:
-            return pd.read_excel(file_path, dtype=str)
+            return pd.read_excel(file, dtype=str)
     except Exception as e:
         logger.error(f"Error loading file: {str(e)}")
         return None
@@ -541,58 +543,82 @@ def process_bulk_teachers(df, user):
         raise ValueError("Invalid file format. Please use the provided template.")
 
     df = df.fillna("")  # Prevent NaN values
-    teachers_created = 0
     skipped_entries = []
 
     existing_staff_ids = set(User.objects.values_list("staff_id", flat=True))
     existing_emails = set(User.objects.values_list("email", flat=True))
+    existing_license_numbers = set(User.objects.values_list("license_number", flat=True))
+
+    # Every row is checked first; the accepted ones are then hashed in parallel and inserted in bulk
+    new_users = []
+    new_passwords = []
 
     for index, row in df.iterrows():
         staff_id = str(row["staff_id"]).strip()
+        license_number = str(row["license_number"]).strip()
         email = str(row["email"]).strip().lower()
         phone_number = str(row["phone_number"]).strip()
         password1 = str(row["password1"]).strip()
         password2 = str(row["password2"]).strip()
 
-        # Skip duplicates
+        # Skip duplicates, against existing users and the rows above
         if staff_id in existing_staff_ids or email in existing_emails:
             skipped_entries.append(f"Row {index+2}: Duplicate staff_id ({staff_id}) or email ({email}).")
             continue
 
         # Validate row data
-        error = validate_teacher_row(staff_id, email, phone_number, password1, password2, index + 2)
+        error = validate_teacher_row(staff_id, license_number, email, phone_number, password1, password2, index + 2)
         if error:
             skipped_entries.append(error)
             continue
 
-        # ✅ Create & Save User First
-        new_user = User(
-            staff_id=staff_id,
-            license_number=row["license_number"],
-            email=email,
-            first_name=row["first_name"],
-            last_name=row["last_name"],
-            phone_number=phone_number,
+        if license_number in existing_license_numbers:
+            skipped_entries.append(f"Row {index+2}: Duplicate license number ({license_number}).")
+            continue
+
+        fields = {
+            "staff_id": staff_id,
+            "license_number": license_number,
+            "email": email,
+            "first_name": str(row["first_name"]),
+            "last_name": str(row["last_name"]),
+            "phone_number": phone_number,
+        }
+        # One over-long cell would otherwise fail the whole insert
+        field = spreadsheets.too_long(User, fields)
+        if field:
+            skipped_entries.append(f"Row {index+2}: Value too long for {field}.")
+            continue
+
+        new_users.append(User(
+            **fields,
             role="teacher",
             school=user.school,  # Assign school from logged-in user
             circuit=user.circuit,
             district=user.district
-        )
-        new_user.set_password(password1)
-        new_user.save()  # ✅ Save User First
+        ))
+        new_passwords.append(password1)
+        existing_staff_ids.add(staff_id)
+        existing_emails.add(email)
+        existing_license_numbers.add(license_number)
 
-        # ✅ Now, create and save Teacher instance
-        Teacher.objects.create(user=new_user, school=user.school)  # ✅ Ensure 'user' is saved before linking
+    for new_user, password in zip(new_users, passwords.hash_passwords(new_passwords)):
+        new_user.password = password
 
-        teachers_created += 1
+    with transaction.atomic():
+        # ✅ Users first, so the Teacher rows can link to them
+        User.objects.bulk_create(new_users)
+        teachers = Teacher.objects.bulk_create([Teacher(user=new_user, school=user.school) for new_user in new_users])
+        # bulk_create sends no post_save: invalidate the cached staff counts here
+        caching.bump_scopes({scope for obj in [*new_users, *teachers] for scope in caching.scopes_of(obj)})
 
-    return teachers_created, skipped_entries
+    return len(new_users), skipped_entries
 
 
 
-def validate_teacher_row(staff_id, email, phone_number, password1, password2, row_num):
+def validate_teacher_row(staff_id, license_number, email, phone_number, password1, password2, row_num):
     """Validate a single row of teacher data."""
-    if not all([staff_id, email, phone_number, password1, password2]):
+    if not all([staff_id, license_number, email, phone_number, password1, password2]):
         return f"Row {row_num}: Missing required fields."
 
     # Validate email format
@@ -658,29 +684,6 @@ def download_teacher_template(request, file_format):
         return HttpResponse("Invalid file format", status=400)
 
 
-@login_required
-def get_available_terms(request):
-    """Returns available academic terms and years in an object format with 'id' and 'name'."""
-    
-    academic_year_str = request.GET.get("academic_year", "2024/2025")  # Default to current year format
-    if "/" in academic_year_str:
-        try:
-            base_year = int(academic_year_str.split("/")[0])  # Extract base year (e.g., 2024)
-        except ValueError:
-            return JsonResponse({"error": "Invalid academic year format"}, status=400)
-    else:
-        try:
-            base_year = int(academic_year_str)  # Fallback if single year is provided
-            academic_year_str = f"{base_year}/{base_year + 1}"
-        except ValueError:
-            return JsonResponse({"error": "Invalid academic year format"}, status=400)
-
-    academic_years = [{"id": year, "name": f"{year}/{year+1}"} for year in range(2020, 2050)]
-    terms = [{"id": i + 1, "name": term} for i, term in enumerate(["Term 1", "Term 2", "Term 3"])]
-
-    return JsonResponse({"terms": terms, "academic_years": academic_years, "selected_academic_year": academic_year_str})
-
-
 @login_required
 def get_departments(request):
     """Fetch departments belonging to the logged-in user's school."""
@@ -695,8 +698,9 @@ def get_departments(request):
 #-------------- PERFORMANCE ANALYSIS -------------------
 
 
+@query_budget(20)
 def school_performance_analysis(request):
-    context = get_school_performance_context(request)
+    context = school_performance_context(request)
     return render(request, 'school/school_performance_analysis.html', context)
 
 def get_school_performance_context(request):
@@ -704,15 +708,9 @@ def get_school_performance_context(request):
     print("🔍 Starting school performance context generation...")
 
     # Load filters
-    filter_options = json.loads(get_available_terms(request).content)
-    academic_year = request.GET.get("academic_year", "").strip()
-    selected_term = request.GET.get("term", "all")
-
-    valid_years = [year["name"] for year in filter_options["academic_years"]]
-    academic_year = academic_year if academic_year in valid_years else filter_options["selected_academic_year"]
-
-    all_terms = [t["name"] for t in filter_options["terms"]]
-    selected_term = selected_term if selected_term in all_terms else "Term 1"
+    academic_year, selected_term = term_calendar.selected_period(request)
+    valid_years = term_calendar.ACADEMIC_YEARS
+    all_terms = term_calendar.TERMS
 
     user = request.user
     if not hasattr(user, 'school') or user.role != 'headteacher':
@@ -724,115 +722,46 @@ def get_school_performance_context(request):
     selected_marks = StudentMark.objects.filter(
         academic_year=academic_year,
         term=selected_term,
-        student__school=school
-    ).select_related("subject", "student__class_group", "student")
-
-    print("🧾 Total marks fetched:", selected_marks.count())
-
-    # ➕ Build Department → Subject → Class → [Marks]
-    dept_structure = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
-
-    for mark in selected_marks:
-        subject = mark.subject
-        subject_name = subject.name
-        class_name = mark.student.class_group.name
-        for dept in subject.department.all():
-            dept_name = dept.name
-            dept_structure[dept_name][subject_name][class_name].append(float(mark.mark))
-
-    # ✅ Fixed: Store each department inside the loop
-    departments = {}
-    subject_averages = {}
-    for dept_name, subjects in dept_structure.items():
-        all_class_names = set()
-        dept_subjects = {}
-        averages = {}
-        for subject_name, classes in subjects.items():
-            class_avgs = {}
-            all_scores = []
-            for class_name, scores in classes.items():
-                all_class_names.add(class_name)
-                avg = round(sum(scores) / len(scores), 2)
-                class_avgs[class_name] = avg
-                all_scores.extend(scores)
-            dept_subjects[subject_name] = class_avgs
-            averages[subject_name] = round(sum(all_scores) / len(all_scores), 2) if all_scores else 0.0
-        departments[dept_name] = {
-            "subjects": dept_subjects,
-            "all_classes": sorted(all_class_names)
-        }
-        subject_averages[dept_name] = averages
+        student__school=school,
+        student__class_group__isnull=False,
+    )
 
-    print("🏫 Departmental class performance computed.")
+    # Sum/count per (subject, class) is grouped by the database; only the partials reach Python
+    frame = grouped_frame(
+        selected_marks,
+        subject="subject",
+        subject_name="subject__name",
+        class_name="student__class_group__name",
+    )
 
-    # 📚 Subject-wide averages (for bucket analysis)
-    subject_marks = defaultdict(list)
-    for mark in selected_marks:
-        subject_marks[mark.subject.name].append(float(mark.mark))
+    print("🧾 Subject/class groups fetched:", len(frame))
 
-    subjects = {
-        subject: round(sum(marks) / len(marks), 2) if marks else "-"
-        for subject, marks in subject_marks.items()
-    }
+    # ➕ Department → Subject → Class averages
+    breakdown = department_breakdown(
+        frame.totals("subject", "subject_name", "class_name"),
+        subject_departments(set(frame.columns["subject"])),
+    )
+    departments = breakdown["departments"]
+    subject_averages = breakdown["subject_averages"]
+    subjects = breakdown["subjects"]
+
+    print("🏫 Departmental class performance computed.")
 
     # 🎯 Score buckets
-    all_scores = [score for scores in subject_marks.values() for score in scores]
-    score_buckets = {
-        "90-100": sum(1 for s in all_scores if 90 <= s <= 100),
-        "80-89": sum(1 for s in all_scores if 80 <= s < 90),
-        "70-79": sum(1 for s in all_scores if 70 <= s < 80),
-        "60-69": sum(1 for s in all_scores if 60 <= s < 70),
-        "55-59": sum(1 for s in all_scores if 55 <= s < 60),
-        "50-54": sum(1 for s in all_scores if 50 <= s < 55),
-        "45-49": sum(1 for s in all_scores if 45 <= s < 50),
-        "40-44": sum(1 for s in all_scores if 40 <= s < 45),
-        "0-39": sum(1 for s in all_scores if s < 40),
-    }
+    score_buckets = score_histogram(selected_marks)
 
     # 📈 Term & Academic Trend
-    base_year = int(academic_year.split("/")[0])
-    prev_1 = f"{base_year - 1}/{base_year}"
-    prev_2 = f"{base_year - 2}/{base_year - 1}"
-    academic_years = [prev_2, prev_1, academic_year]
-
-    if selected_term == "Term 1":
-        term_sequence = [("Term 2", prev_1), ("Term 3", prev_1), ("Term 1", academic_year)]
-    elif selected_term == "Term 2":
-        term_sequence = [("Term 3", prev_1), ("Term 1", academic_year), ("Term 2", academic_year)]
-    else:
-        term_sequence = [("Term 1", academic_year), ("Term 2", academic_year), ("Term 3", academic_year)]
-
-    term_keys = [f"{t} ({y})" for t, y in term_sequence]
-    q_terms = Q()
-    for term, year in term_sequence:
-        q_terms |= Q(term=term, academic_year=year)
-
-    trend_marks = StudentMark.objects.filter(student__school=school).filter(q_terms)
-
-    term_aggregates = {key: [] for key in term_keys}
-    year_aggregates = {year: [] for year in academic_years}
-
-    for mark in trend_marks:
-        score = float(mark.mark)
-        key = f"{mark.term} ({mark.academic_year})"
-        if key in term_aggregates:
-            term_aggregates[key].append(score)
-        if mark.academic_year in year_aggregates:
-            year_aggregates[mark.academic_year].append(score)
-
-    term_trend = {
-        "School": school.name,
-        **{key: round(sum(v) / len(v), 2) if v else "-" for key, v in term_aggregates.items()}
-    }
-    academic_trend = {
-        "School": school.name,
-        **{year: round(sum(v) / len(v), 2) if v else "-" for year, v in year_aggregates.items()}
-    }
-
-    term_labels = list(term_trend.keys())[1:]
-    term_values = [float(val) if isinstance(val, (int, float)) else None for val in list(term_trend.values())[1:]]
-    year_labels = list(academic_trend.keys())[1:]
-    year_values = [float(val) if isinstance(val, (int, float)) else None for val in list(academic_trend.values())[1:]]
+    academic_years, term_sequence = trend_window(academic_year, selected_term)
+    trend_frame = grouped_frame(
+        StudentMark.objects.filter(student__school=school).filter(window_filter(term_sequence)),
+        term="term",
+        academic_year="academic_year",
+    )
+    trends = build_trends(
+        "School", school.name, trend_frame.totals("term", "academic_year"), academic_years, term_sequence
+    )
+    term_trend = trends["term_trend"]
+    academic_trend = trends["academic_trend"]
 
     print("✅ Finished generating full context.")
 
@@ -858,12 +787,25 @@ def get_school_performance_context(request):
         "bucket_40_44": score_buckets["40-44"],
         "bucket_0_39": score_buckets["0-39"],
 
-        "term_chart": {"labels": term_labels, "data": term_values},
-        "year_chart": {"labels": year_labels, "data": year_values},
+        "term_chart": trends["term_chart"],
+        "year_chart": trends["year_chart"],
     }
 
 
+def school_report_key(request):
+    if getattr(request.user, 'role', None) != 'headteacher' or not request.user.school_id:
+        return None
+    return [("school", request.user.school_id)], term_calendar.selected_period(request)
+
+
+school_performance_context = report_context(
+    "school_performance_context", school_report_key, get_school_performance_context,
+)
+
+
 @login_required
+@query_budget(20)
+@cached_report("school_performance", school_report_key)
 def download_school_performance_pdf(request):
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=120, bottomMargin=50)
@@ -871,7 +813,7 @@ def download_school_performance_pdf(request):
     styles = getSampleStyleSheet()
     subtitle_style = styles['Heading4']
 
-    context = get_school_performance_context(request)
+    context = school_performance_context(request)
     year = context['selected_year']
     term = context['selected_term']
     departments = context["departments"]
@@ -894,7 +836,7 @@ def download_school_performance_pdf(request):
         col_widths = [100] + [(A4[0] - 120) / (max_cols - 1)] * (max_cols - 1)
 
         table = Table(table_data, colWidths=col_widths, repeatRows=1)
-        table.setStyle(TableStyle([('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#f2f2f2")),'...']))
+        table.setStyle(TableStyle([('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#f2f2f2")), ('GRID', (0, 0), (-1, -1), 0.5, colors.grey), ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold')]))
 
         elements.extend([table, Spacer(1, 10)])
 
@@ -946,7 +888,7 @@ def download_school_performance_pdf(request):
         ["0-39", score_buckets["0-39"]],
     ]
     bucket_table = Table(bucket_table_data, colWidths=[120, 120])
-    bucket_table.setStyle(TableStyle([('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#f2f2f2")),'...']))
+    bucket_table.setStyle(TableStyle([('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#f2f2f2")), ('GRID', (0, 0), (-1, -1), 0.5, colors.grey), ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold')]))
     elements.extend([bucket_table, Spacer(1, 20)])
 
     # --- Trend Tables ---
@@ -969,7 +911,7 @@ def download_school_performance_pdf(request):
     term_data = wrap_labels_and_values(term_trend)
     term_col_widths = get_fixed_col_widths(term_trend)
     term_table = Table(term_data, colWidths=term_col_widths)
-    term_table.setStyle(TableStyle([('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#f2f2f2")),'...']))
+    term_table.setStyle(TableStyle([('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#f2f2f2")), ('GRID', (0, 0), (-1, -1), 0.5, colors.grey), ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold')]))
     elements.extend([term_table, Spacer(1, 20)])
 
     # --- Year Trend Table ---
@@ -977,7 +919,7 @@ def download_school_performance_pdf(request):
     year_data = wrap_labels_and_values(academic_trend)
     year_col_widths = get_fixed_col_widths(academic_trend)
     year_table = Table(year_data, colWidths=year_col_widths)
-    year_table.setStyle(TableStyle([('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#f2f2f2")),'...']))
+    year_table.setStyle(TableStyle([('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#f2f2f2")), ('GRID', (0, 0), (-1, -1), 0.5, colors.grey), ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold')]))
     elements.extend([year_table, Spacer(1, 20)])
 
     # --- Header/Footer --- 
@@ -1001,7 +943,11 @@ def download_school_performance_pdf(request):
         c.setFont("Helvetica", 8)
         c.drawCentredString(page_width / 2, 25, f"{academic_year} - {term} - School Performance")
 
-    doc.build(elements, onFirstPage=draw_custom_header, onLaterPages=draw_custom_header)
+    doc.build(
+        elements,
+        onFirstPage=lambda c, d: draw_custom_header(c, school_name, year, term),
+        onLaterPages=lambda c, d: draw_custom_header(c, school_name, year, term),
+    )
     
     buffer.seek(0)
     safe_year = str(year).replace("/", "_")
@@ -1138,15 +1084,34 @@ def submit_result(request):
         class_group_id=class_id
     )
 
-    if not results.exists():
-        return JsonResponse({"error": "No matching results found"}, status=400)
-
-    # Check if any result is already submitted
-    if results.filter(status="Submitted").exists():
-        return JsonResponse({"error": "Result has already been submitted"}, status=400)
-
-    # ✅ Update all matching results to "Submitted"
-    results.update(status="Submitted", approved_at=timezone.now())
+    # ✅ Update all matching results to "Submitted" and fold their marks into the rollups
+    with transaction.atomic():
+        # Lock the rows first, so a second submission waits here and then sees them submitted
+        rows = list(results.select_for_update().values_list("student_id", "status"))
+
+        if not rows:
+            return JsonResponse({"error": "No matching results found"}, status=400)
+
+        # Check if any result is already submitted
+        if any(status == "Submitted" for _, status in rows):
+            return JsonResponse({"error": "Result has already been submitted"}, status=400)
+
+        student_ids = [student_id for student_id, _ in rows]
+        results.update(status="Submitted", approved_at=timezone.now())
+        StudentMark.objects.filter(
+            student_id__in=student_ids,
+            subject_id=subject_id,
+            academic_year=year,
+            term=term,
+        ).update(is_submitted=True)
+        rollups.apply_submission(headteacher_school, year, term, subject_id, class_id, student_ids)
+        # update() sends no signals, so invalidate the cached dashboards here
+        caching.bump_scopes([
+            ("class", int(class_id)),
+            ("school", headteacher_school.id),
+            ("circuit", headteacher_school.circuit_id),
+            ("district", headteacher_school.district_id),
+        ])
 
     # ✅ NOTIFICATION LOGIC: Send only **one** notification per submission
     siso = User.objects.filter(circuit=headteacher_school.circuit, role="siso").first()
@@ -1188,7 +1153,14 @@ def query_result(request):
     return redirect("school:headteacher_result_overview")
 
 
+def headteacher_notifications_state(request):
+    if request.user.role.lower() != "headteacher":
+        return None
+    return conditional.notifications_state(request)
+
+
 @login_required
+@conditional.conditional_get(headteacher_notifications_state)
 def get_headteacher_notifications(request):
     """Fetch notifications for the logged-in Headteacher."""
     user = request.user
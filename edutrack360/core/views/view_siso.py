@@ -29,6 +29,13 @@ from matplotlib.backends.backend_pdf import FigureCanvasPdf as FigureCanvas
 from core.models import (
     Notification, StudentMark, School,
 )
+from core.aggregations import subject_departments, window_filter
+from core.analytics import (
+    MarkFrame, department_breakdown, school_breakdowns, trend_window, build_trends,
+)
+from core.middlewares import query_budget
+from core.report_cache import cached_report, report_context
+from core import conditional, hierarchy, term_calendar
 
 User = get_user_model()
 
@@ -38,6 +45,7 @@ def circuit_overview(request):
 
 @login_required
 @user_passes_test(lambda u: u.role == "siso")  # Ensure only SISO can access
+@conditional.conditional_get(conditional.notifications_state)
 def get_notifications(request):
     siso = request.user  # Get the logged-in SISO
     notifications = Notification.objects.filter(recipient=siso, is_read=False).order_by("-created_at")
@@ -136,31 +144,9 @@ def get_headteachers_by_circuit(request):
 
     return JsonResponse({"headteachers": headteachers_data}, status=200)
 
-@login_required
-def get_available_terms(request):
-    """Returns available academic terms and years in an object format with 'id' and 'name'."""
-    
-    academic_year_str = request.GET.get("academic_year", "2024/2025")  # Default to current year format
-    if "/" in academic_year_str:
-        try:
-            base_year = int(academic_year_str.split("/")[0])  # Extract base year (e.g., 2024)
-        except ValueError:
-            return JsonResponse({"error": "Invalid academic year format"}, status=400)
-    else:
-        try:
-            base_year = int(academic_year_str)  # Fallback if single year is provided
-            academic_year_str = f"{base_year}/{base_year + 1}"
-        except ValueError:
-            return JsonResponse({"error": "Invalid academic year format"}, status=400)
-
-    academic_years = [{"id": year, "name": f"{year}/{year+1}"} for year in range(2020, 2050)]
-    terms = [{"id": i + 1, "name": term} for i, term in enumerate(["Term 1", "Term 2", "Term 3"])]
-
-    return JsonResponse({"terms": terms, "academic_years": academic_years, "selected_academic_year": academic_year_str})
-
-
+@query_budget(20)
 def circuit_performance_analysis(request):
-    context = get_circuit_performance_context(request)
+    context = circuit_performance_context(request)
     return render(request, 'siso/circuit_performance_analysis.html', context)
 
 
@@ -168,33 +154,35 @@ def get_circuit_performance_context(request):
     print("🔍 Starting circuit performance context generation...")
 
     # Load filters
-    filter_options = json.loads(get_available_terms(request).content)
-    academic_year = request.GET.get("academic_year", "").strip()
-    selected_term = request.GET.get("term", "all")
-
-    valid_years = [year["name"] for year in filter_options["academic_years"]]
-    academic_year = academic_year if academic_year in valid_years else filter_options["selected_academic_year"]
-
-    all_terms = [t["name"] for t in filter_options["terms"]]
-    selected_term = selected_term if selected_term in all_terms else "Term 1"
+    academic_year, selected_term = term_calendar.selected_period(request)
+    valid_years = term_calendar.ACADEMIC_YEARS
+    all_terms = term_calendar.TERMS
 
     user = request.user
     if not hasattr(user, 'circuit') or user.role != 'siso':
         return redirect("homepage")
 
-    schools_in_circuit = School.objects.filter(circuit=user.circuit)
-    print(f"🏫 Schools found in circuit: {schools_in_circuit.count()}")
-
-    selected_marks = StudentMark.objects.filter(
-        student__school__in=schools_in_circuit,
-        academic_year=academic_year,
-        term=selected_term,
-        subject__results__status="Submitted"
-    ).select_related("student__school", "student__class_group", "subject")
+    schools_in_circuit = hierarchy.index().schools_of_circuit(user.circuit_id)
+    print(f"🏫 Schools found in circuit: {len(schools_in_circuit)}")
+
+    circuit_marks = StudentMark.objects.submitted().filter(student__school__circuit=user.circuit)
+
+    # Pull the term's submitted marks once as NumPy columns for every school in the circuit
+    frame = MarkFrame.from_queryset(
+        circuit_marks.filter(
+            academic_year=academic_year,
+            term=selected_term,
+            student__class_group__isnull=False,
+        ),
+        school="student__school",
+        subject="subject",
+        subject_name="subject__name",
+        class_name="student__class_group__name",
+    )
 
-    selected_marks = deduplicate_marks(selected_marks)
+    print("🧾 Total submitted marks fetched:", len(frame))
 
-    print("🧾 Total submitted marks fetched:", len(selected_marks))
+    breakdowns = school_breakdowns(frame, subject_departments(set(frame.columns["subject"])))
 
     school_departments = {}
     school_subject_averages = {}
@@ -202,127 +190,45 @@ def get_circuit_performance_context(request):
     school_chart_data = {}
 
     for school in schools_in_circuit:
-        school_marks = [m for m in selected_marks if m.student.school_id == school.id]
-
-        dept_structure = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
-        for mark in school_marks:
-            subject = mark.subject
-            class_name = mark.student.class_group.name
-            for dept in subject.department.all():
-                dept_structure[dept.name][subject.name][class_name].append(float(mark.mark))
-
-        departments = {}
-        subject_averages = {}
-        for dept_name, subjects in dept_structure.items():
-            all_class_names = set()
-            dept_subjects = {}
-            averages = {}
-            for subject_name, classes in subjects.items():
-                class_avgs = {}
-                all_scores = []
-                for class_name, scores in classes.items():
-                    all_class_names.add(class_name)
-                    avg = round(sum(scores) / len(scores), 2)
-                    class_avgs[class_name] = avg
-                    all_scores.extend(scores)
-                dept_subjects[subject_name] = class_avgs
-                averages[subject_name] = round(sum(all_scores) / len(all_scores), 2) if all_scores else 0.0
-            departments[dept_name] = {
-                "subjects": dept_subjects,
-                "all_classes": sorted(all_class_names)
-            }
-            subject_averages[dept_name] = averages
-
-        subjects = defaultdict(list)
-        for mark in school_marks:
-            subjects[mark.subject.name].append(float(mark.mark))
-        for subject, marks in subjects.items():
-            subjects[subject] = round(sum(marks) / len(marks), 2) if marks else "-"
-
-        chart_data_per_school = {}
-        for dept_name, dept_data in departments.items():
-            subject_charts = []
-            labels = dept_data["all_classes"]
-            for subject_name, class_avg_dict in dept_data["subjects"].items():
-                data = [class_avg_dict.get(class_name, 0) for class_name in labels]
-                subject_charts.append({
-                    "label": subject_name,
-                    "data": data
-                })
-            chart_data_per_school[dept_name] = {
-                "labels": labels,
-                "datasets": subject_charts
-            }
-
-        school_departments[school.name] = departments
-        school_subject_averages[school.name] = subject_averages
-        school_subjects[school.name] = subjects
-        school_chart_data[school.name] = chart_data_per_school
+        breakdown = breakdowns.get(school.id) or department_breakdown({}, {})
+        school_departments[school.name] = breakdown["departments"]
+        school_subject_averages[school.name] = breakdown["subject_averages"]
+        school_subjects[school.name] = breakdown["subjects"]
+        school_chart_data[school.name] = breakdown["chart_data"]
 
     print("📊 Per-school breakdowns and charts generated.")
 
-    base_year = int(academic_year.split("/")[0])
-    prev_1 = f"{base_year - 1}/{base_year}"
-    prev_2 = f"{base_year - 2}/{base_year - 1}"
-    academic_years = [prev_2, prev_1, academic_year]
-
-    if selected_term == "Term 1":
-        term_sequence = [("Term 2", prev_1), ("Term 3", prev_1), ("Term 1", academic_year)]
-    elif selected_term == "Term 2":
-        term_sequence = [("Term 3", prev_1), ("Term 1", academic_year), ("Term 2", academic_year)]
-    else:
-        term_sequence = [("Term 1", academic_year), ("Term 2", academic_year), ("Term 3", academic_year)]
-
+    academic_years, term_sequence = trend_window(academic_year, selected_term)
     term_keys = [f"{t} ({y})" for t, y in term_sequence]
-    q_terms = Q()
-    for term, year in term_sequence:
-        q_terms |= Q(term=term, academic_year=year)
-
-    trend_marks = StudentMark.objects.filter(
-        student__school__in=schools_in_circuit
-    ).filter(q_terms, subject__results__status="Submitted").select_related("student", "subject")
-
-    trend_marks = deduplicate_marks(trend_marks)
-
-    term_aggregates = {key: [] for key in term_keys}
-    year_aggregates = {year: [] for year in academic_years}
-
-    for mark in trend_marks:
-        score = float(mark.mark)
-        key = f"{mark.term} ({mark.academic_year})"
-        if key in term_aggregates:
-            term_aggregates[key].append(score)
-        if mark.academic_year in year_aggregates:
-            year_aggregates[mark.academic_year].append(score)
-
-    term_trend = {
-        "School": "Circuit",
-        **{key: round(sum(v) / len(v), 2) if v else "-" for key, v in term_aggregates.items()}
-    }
 
-    academic_trend = {
-        "School": "Circuit",
-        **{year: round(sum(v) / len(v), 2) if v else "-" for year, v in year_aggregates.items()}
+    trend_frame = MarkFrame.from_queryset(
+        circuit_marks.filter(window_filter(term_sequence)),
+        school="student__school",
+        term="term",
+        academic_year="academic_year",
+    )
+    circuit_trends = build_trends(
+        "School", "Circuit", trend_frame.totals("term", "academic_year"), academic_years, term_sequence
+    )
+    term_trend = circuit_trends["term_trend"]
+    academic_trend = circuit_trends["academic_trend"]
+
+    totals_by_school = {}
+    for (school_id, term, year), totals in trend_frame.totals("school", "term", "academic_year").items():
+        totals_by_school.setdefault(school_id, {})[(term, year)] = totals
+
+    school_term_trends = {
+        school.name: build_trends(
+            "School", school.name, totals_by_school.get(school.id, {}), academic_years, term_sequence
+        )["term_trend"]
+        for school in schools_in_circuit
     }
 
-    school_term_trends = {}
-    for school in schools_in_circuit:
-        school_marks = [m for m in trend_marks if m.student.school_id == school.id]
-        aggregates = {key: [] for key in term_keys}
-        for mark in school_marks:
-            key = f"{mark.term} ({mark.academic_year})"
-            if key in aggregates:
-                aggregates[key].append(float(mark.mark))
-        school_term_trends[school.name] = {
-            "School": school.name,
-            **{k: round(sum(v) / len(v), 2) if v else "-" for k, v in aggregates.items()}
-        }
-
     term_labels = term_keys
     year_labels = academic_years
 
-    term_values = [float(term_trend[k]) if isinstance(term_trend[k], (int, float)) else None for k in term_labels]
-    year_values = [float(academic_trend[y]) if isinstance(academic_trend[y], (int, float)) else None for y in year_labels]
+    term_values = circuit_trends["term_chart"]["data"]
+    year_values = circuit_trends["year_chart"]["data"]
 
     term_chart_datasets = [
         {
@@ -369,18 +275,20 @@ def get_circuit_performance_context(request):
     }
 
 
-def deduplicate_marks(marks_queryset):
-    seen = set()
-    result = []
-    for m in marks_queryset:
-        key = (m.student.id, m.subject.id)
-        if key not in seen:
-            seen.add(key)
-            result.append(m)
-    return result
+def circuit_report_key(request):
+    if getattr(request.user, 'role', None) != 'siso' or not request.user.circuit_id:
+        return None
+    return [("circuit", request.user.circuit_id)], term_calendar.selected_period(request)
+
+
+circuit_performance_context = report_context(
+    "circuit_performance_context", circuit_report_key, get_circuit_performance_context,
+)
 
 
 @login_required
+@query_budget(20)
+@cached_report("circuit_performance", circuit_report_key)
 def download_circuit_performance_pdf(request):
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=120, bottomMargin=50)
@@ -389,7 +297,7 @@ def download_circuit_performance_pdf(request):
     subtitle_style = styles['Heading4']
 
     # Get circuit-wide performance context
-    context = get_circuit_performance_context(request)
+    context = circuit_performance_context(request)
     academic_year = context['selected_year']
     term = context['selected_term']
     school_departments = context['school_departments']
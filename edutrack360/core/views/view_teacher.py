@@ -2,10 +2,11 @@
 import csv
 import io
 import json
+from collections import defaultdict
 from decimal import Decimal
 
 # Third-party libraries
-import pandas as pd
+import numpy as np
 from openpyxl import Workbook
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
@@ -20,7 +21,9 @@ from reportlab.graphics.charts.barcharts import VerticalBarChart
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
-from django.db.models import Count, Q, Max
+from django.db import transaction
+from django.db.models import Count, Q, Max, Value
+from django.db.models.functions import Concat
 from django.http import JsonResponse, HttpResponse
 from django.shortcuts import render, get_object_or_404
 from django.utils.text import slugify
@@ -28,6 +31,11 @@ from django.views.decorators.http import require_http_methods
 
 # Local imports
 from core.forms import ResultUploadForm 
+from core.aggregations import score_histogram, window_filter
+from core.analytics import MarkFrame, trend_window, build_trends
+from core.middlewares import query_budget
+from core.report_cache import cached_report, report_context
+from core import assignments, caching, curriculum, imports, rollups, spreadsheets, term_calendar
 from core.models import (
     Subject, Student, StudentMark, SubjectTeacher, ClassGroup,
     Department, Result, ClassTeacher, Teacher,
@@ -96,77 +104,36 @@ def get_subjects_by_department(request, department_id):
     except Department.DoesNotExist:
         return JsonResponse({"error": "Invalid department selection"}, status=400)
 
-@login_required
-def get_available_terms(request):
-    """Returns available academic terms and years in an object format with 'id' and 'name'."""
-    
-    academic_year_str = request.GET.get("academic_year", "2024/2025")  # Default to current year format
-    if "/" in academic_year_str:
-        try:
-            base_year = int(academic_year_str.split("/")[0])  # Extract base year (e.g., 2024)
-        except ValueError:
-            return JsonResponse({"error": "Invalid academic year format"}, status=400)
-    else:
-        try:
-            base_year = int(academic_year_str)  # Fallback if single year is provided
-            academic_year_str = f"{base_year}/{base_year + 1}"
-        except ValueError:
-            return JsonResponse({"error": "Invalid academic year format"}, status=400)
-
-    academic_years = [{"id": year, "name": f"{year}/{year+1}"} for year in range(2020, 2050)]
-    terms = [{"id": i + 1, "name": term} for i, term in enumerate(["Term 1", "Term 2", "Term 3"])]
-
-    return JsonResponse({"terms": terms, "academic_years": academic_years, "selected_academic_year": academic_year_str})
-
-
 #-------------------- SUBJECT TEACHER -------------------
 
 def get_subject_performance_context(request):
     """Generates subject performance analysis for a subject teacher with added chart data."""
 
-    filter_options = json.loads(get_available_terms(request).content)
-    academic_year = request.GET.get("academic_year", "").strip()
-    selected_term = request.GET.get("term", "all")
+    academic_year, selected_term = term_calendar.selected_period(request)
     selected_subject = request.GET.get("subject", "all")
     selected_class = request.GET.get("class_group", "all")
 
-    valid_years = [year["name"] for year in filter_options["academic_years"]]
-    academic_year = academic_year if academic_year in valid_years else filter_options["selected_academic_year"]
-
-    base_year = int(academic_year.split("/")[0])
-    prev_1 = f"{base_year - 1}/{base_year}"
-    prev_2 = f"{base_year - 2}/{base_year - 1}"
-    academic_years = [prev_2, prev_1, academic_year]
+    valid_years = term_calendar.ACADEMIC_YEARS
+    all_terms = term_calendar.TERMS
 
-    all_terms = [t["name"] for t in filter_options["terms"]]
-    selected_term = selected_term if selected_term in all_terms else "Term 1"
-
-    if selected_term == "Term 1":
-        term_sequence = [("Term 2", prev_1), ("Term 3", prev_1), ("Term 1", academic_year)]
-    elif selected_term == "Term 2":
-        term_sequence = [("Term 3", prev_1), ("Term 1", academic_year), ("Term 2", academic_year)]
-    else:
-        term_sequence = [("Term 1", academic_year), ("Term 2", academic_year), ("Term 3", academic_year)]
-
-    terms_to_fetch = [t[0] for t in term_sequence]
-    term_keys = [f"{t} ({y})" for t, y in term_sequence]
+    academic_years, term_sequence = trend_window(academic_year, selected_term)
 
     teacher = request.user.teacher_profile
     print(f"Teacher ID: {teacher.id}")
 
     subject_teachings = SubjectTeacher.objects.filter(
         teacher=teacher
-    ).select_related("subject").prefetch_related("assigned_classes__department", "subject__department")
+    ).select_related("subject").prefetch_related("assigned_classes__department")
+    subject_map = curriculum.subject_map()
 
     assigned_classes = set()
     assigned_subject_ids = set()
     assigned_subjects = set()
 
     for st in subject_teachings:
-        subject_departments = set(st.subject.department.all())
         for class_group in st.assigned_classes.all():
             print(f"Assigned class: {class_group.name}, Department: {class_group.department.name}")
-            if class_group.department in subject_departments:
+            if subject_map.offers(class_group.department_id, st.subject_id):
                 assigned_classes.add(class_group.id)
                 assigned_subject_ids.add(st.subject.id)
                 assigned_subjects.add(st.subject.name)
@@ -219,111 +186,65 @@ def get_subject_performance_context(request):
             "term_chart": {}, "year_chart": {},
         })
 
-    # 🧍 Student Performance
-    selected_marks = StudentMark.objects.filter(
-        class_group_id__in=assigned_classes,
-        academic_year=academic_year,
-        term=selected_term,
-        subject_id__in=assigned_subject_ids,
-        student__school_id=teacher.school.id
-    ).select_related("student", "subject").order_by("student__last_name")
-
-    print(f"Selected marks count: {selected_marks.count()}")
-
-    student_rows = []
-    class_scores = []
-
-    for mark in selected_marks:
-        print(f"Mark: {mark.student.first_name} {mark.student.last_name}, Subject: {mark.subject.name}, Score: {mark.mark}")
-        if mark.subject.name != selected_subject:
-            continue
-        student_name = f"{mark.student.last_name} {mark.student.first_name}"
-        score = float(mark.mark) if isinstance(mark.mark, Decimal) else mark.mark
-        student_rows.append({"name": student_name, "mark": round(score, 2)})
-        class_scores.append(score)
+    # 🧍 Student Performance - pulled once as NumPy columns
+    frame = MarkFrame.from_queryset(
+        StudentMark.objects.filter(
+            class_group_id__in=assigned_classes,
+            academic_year=academic_year,
+            term=selected_term,
+            subject_id__in=assigned_subject_ids,
+            student__school_id=teacher.school.id
+        ).order_by("student__last_name"),
+        first_name="student__first_name",
+        last_name="student__last_name",
+        subject_name="subject__name",
+    ).equals("subject_name", selected_subject)
+
+    print(f"Selected marks count: {len(frame)}")
+
+    student_rows = [
+        {"name": f"{last_name} {first_name}", "mark": round(float(score), 2)}
+        for last_name, first_name, score in zip(
+            frame.columns["last_name"], frame.columns["first_name"], frame.scores
+        )
+    ]
 
     class_average_row = {
         "name": "Class Average",
-        "mark": round(sum(class_scores) / len(class_scores), 2) if class_scores else "-"
+        "mark": frame.average()
     }
 
     # 📊 Term and Year Trends
-    q_terms = Q()
-    for term, year in term_sequence:
-        q_terms |= Q(term=term, academic_year=year)
-
-    trend_marks = StudentMark.objects.filter(
-        class_group_id__in=assigned_classes,
-        subject_id__in=assigned_subject_ids,
-        student__school_id=teacher.school.id
-    ).filter(q_terms).select_related("student", "subject")
-
-    print(f"Trend marks count: {trend_marks.count()}")
-
-    term_aggregates = {key: [] for key in term_keys}
-    year_aggregates = {year: [] for year in academic_years}
-
-    for mark in trend_marks:
-        if mark.subject.name != selected_subject:
-            continue
-        score = float(mark.mark) if isinstance(mark.mark, Decimal) else mark.mark
-        key = f"{mark.term} ({mark.academic_year})"
-        if key in term_aggregates:
-            term_aggregates[key].append(score)
-        year_aggregates[mark.academic_year].append(score)
-
-    term_trend = {
-        "Subject": selected_subject,
-        **{key: round(sum(v) / len(v), 2) if v else "-" for key, v in term_aggregates.items()}
-    }
-
-    academic_trend = {
-        "Subject": selected_subject,
-        **{year: round(sum(v) / len(v), 2) if v else "-" for year, v in year_aggregates.items()}
-    }
+    trend_frame = MarkFrame.from_queryset(
+        StudentMark.objects.filter(
+            class_group_id__in=assigned_classes,
+            subject_id__in=assigned_subject_ids,
+            student__school_id=teacher.school.id
+        ).filter(window_filter(term_sequence)),
+        subject_name="subject__name",
+        term="term",
+        academic_year="academic_year",
+    ).equals("subject_name", selected_subject)
+
+    print(f"Trend marks count: {len(trend_frame)}")
+
+    trends = build_trends(
+        "Subject", selected_subject, trend_frame.totals("term", "academic_year"), academic_years, term_sequence
+    )
+    term_trend = trends["term_trend"]
+    academic_trend = trends["academic_trend"]
 
     # 🎯 Score Buckets
-    score_buckets = {
-        "90-100": 0,
-        "80-89": 0,
-        "70-79": 0,
-        "60-69": 0,
-        "55-59": 0,
-        "50-54": 0,
-        "45-49": 0,
-        "40-44": 0,
-        "0-39": 0
-    }
-
-    for mark in class_scores:
-        if mark >= 90:
-            score_buckets["90-100"] += 1
-        elif mark >= 80:
-            score_buckets["80-89"] += 1
-        elif mark >= 70:
-            score_buckets["70-79"] += 1
-        elif mark >= 60:
-            score_buckets["60-69"] += 1
-        elif mark >= 55:
-            score_buckets["55-59"] += 1
-        elif mark >= 50:
-            score_buckets["50-54"] += 1
-        elif mark >= 45:
-            score_buckets["45-49"] += 1
-        elif mark >= 40:
-            score_buckets["40-44"] += 1
-        else:
-            score_buckets["0-39"] += 1
-
+    score_buckets = frame.histogram()
 
     heatmap_data = [{"name": row["name"], "mark": float(row["mark"])} for row in student_rows]
 
     # 📈 Line Chart Labels & Data
-    term_labels = [" ".join(label.split(" ")[:2]) for label in list(term_trend.keys())[1:]]
-    term_values = [float(val) if isinstance(val, (int, float, Decimal)) else None for val in list(term_trend.values())[1:]]
+    term_labels = [" ".join(label.split(" ")[:2]) for label in trends["term_chart"]["labels"]]
+    term_values = trends["term_chart"]["data"]
 
-    year_labels = list(academic_trend.keys())[1:]
-    year_values = [float(val) if isinstance(val, (int, float, Decimal)) else None for val in list(academic_trend.values())[1:]]
+    year_labels = trends["year_chart"]["labels"]
+    year_values = trends["year_chart"]["data"]
 
     class_groups = {cg.id: cg.name for cg in ClassGroup.objects.filter(id__in=assigned_classes)}
 
@@ -361,12 +282,43 @@ def get_subject_performance_context(request):
 
 
 @login_required
+@query_budget(20)
 def subject_performance_analysis(request):
-    context = get_subject_performance_context(request)
+    context = subject_performance_context(request)
     return render(request, "teacher/subject_performance_analysis.html", context)
 
 
+def subject_report_key(request):
+    teacher = getattr(request.user, "teacher_profile", None)
+    if request.user.role != 'teacher' or teacher is None:
+        return None
+    # The teaching assignments are part of the key, so a change to them is a new entry
+    teachings = sorted(
+        (subject_id, class_id)
+        for subject_id, class_ids in assignments.for_teacher(teacher).classes_by_subject.items()
+        for class_id in class_ids
+    )
+    if not teachings:
+        return None
+    # Class and subject names, and which departments offer the subjects, show in the report too
+    return (
+        sorted({("class", class_id) for _, class_id in teachings})
+        + [assignments.ASSIGNMENTS_SCOPE, curriculum.CURRICULUM_SCOPE],
+        (
+            teachings, *term_calendar.selected_period(request),
+            request.GET.get("subject", "all"), request.GET.get("class_group", "all"),
+        ),
+    )
+
+
+subject_performance_context = report_context(
+    "subject_performance_context", subject_report_key, get_subject_performance_context,
+)
+
+
 @login_required
+@query_budget(20)
+@cached_report("subject_analysis", subject_report_key)
 def download_subject_analysis_pdf(request):
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=120)
@@ -375,7 +327,7 @@ def download_subject_analysis_pdf(request):
     subtitle_style = styles['Heading4']
 
     # ✅ Get context
-    context = get_subject_performance_context(request)
+    context = subject_performance_context(request)
 
     subject = context['selected_subject']
     term = context['selected_term']
@@ -488,15 +440,9 @@ def download_subject_analysis_pdf(request):
 #------------------ CLASS TEACHER -----------------------
 
 def get_class_performance_context(request):
-    filter_options = json.loads(get_available_terms(request).content)
-    academic_year = request.GET.get("academic_year", "").strip()
-    selected_term = request.GET.get("term", "all")
-
-    valid_years = [year["name"] for year in filter_options["academic_years"]]
-    academic_year = academic_year if academic_year in valid_years else filter_options["selected_academic_year"]
-
-    all_terms = [t["name"] for t in filter_options["terms"]]
-    selected_term = selected_term if selected_term in all_terms else "Term 1"
+    academic_year, selected_term = term_calendar.selected_period(request)
+    valid_years = term_calendar.ACADEMIC_YEARS
+    all_terms = term_calendar.TERMS
 
     teacher = request.user.teacher_profile
     class_teacher = ClassTeacher.objects.filter(teacher=teacher).select_related("assigned_class").first()
@@ -521,107 +467,74 @@ def get_class_performance_context(request):
 
     assigned_class = class_teacher.assigned_class
 
+    # Student x subject mark matrix, pulled once as NumPy columns
     selected_marks = StudentMark.objects.filter(
         class_group=assigned_class,
         academic_year=academic_year,
         term=selected_term,
         student__school=teacher.school
-    ).select_related("student", "subject").order_by("student__last_name")
-
-    students = {}
-    subjects = set()
+    )
+    frame = MarkFrame.from_queryset(
+        selected_marks.annotate(
+            student_name=Concat("student__last_name", Value(" "), "student__first_name")
+        ).order_by("student__last_name"),
+        student_name="student_name",
+        subject_name="subject__name",
+    )
+    student_names, subjects, matrix = frame.pivot("student_name", "subject_name")
+    order = sorted(range(len(subjects)), key=lambda i: subjects[i])
+    subjects = [subjects[i] for i in order]
+    matrix = matrix[:, order]
 
-    for mark in selected_marks:
-        student_key = f"{mark.student.last_name} {mark.student.first_name}"
-        if student_key not in students:
-            students[student_key] = {"name": student_key, "marks": {}, "avg": 0}
-        students[student_key]["marks"][mark.subject.name] = float(mark.mark)
-        subjects.add(mark.subject.name)
+    has_mark = ~np.isnan(matrix)
+    marks_per_student = has_mark.sum(axis=1)
+    student_avgs = np.nansum(matrix, axis=1) / np.maximum(marks_per_student, 1)
+    marks_per_subject = has_mark.sum(axis=0)
+    subject_avgs_raw = np.nansum(matrix, axis=0) / np.maximum(marks_per_subject, 1)
 
-    subjects = sorted(subjects)
-    subject_totals = {subject: [] for subject in subjects}
     student_rows = []
-
-    for student_data in students.values():
-        marks = []
-        for subject in subjects:
-            mark = student_data["marks"].get(subject, "-")
-            student_data["marks"][subject] = round(mark, 2) if isinstance(mark, (int, float)) else "-"
-            if isinstance(mark, (int, float)):
-                marks.append(mark)
-                subject_totals[subject].append(mark)
-        student_data["avg"] = round(sum(marks) / len(marks), 2) if marks else "-"
-        student_rows.append(student_data)
+    for row, student_name in enumerate(student_names):
+        student_rows.append({
+            "name": student_name,
+            "marks": {
+                subject: round(float(matrix[row, col]), 2) if has_mark[row, col] else "-"
+                for col, subject in enumerate(subjects)
+            },
+            "avg": round(float(student_avgs[row]), 2) if marks_per_student[row] else "-",
+        })
 
     class_average_row = {"name": "Subject Average", "marks": {}}
     subject_avgs = []
-    for subject in subjects:
-        scores = subject_totals[subject]
-        avg = round(sum(scores) / len(scores), 2) if scores else "-"
+    for col, subject in enumerate(subjects):
+        avg = round(float(subject_avgs_raw[col]), 2) if marks_per_subject[col] else "-"
         class_average_row["marks"][subject] = avg
         if isinstance(avg, (int, float)):
             subject_avgs.append(avg)
     class_average_row["avg"] = round(sum(subject_avgs) / len(subject_avgs), 2) if subject_avgs else "-"
 
-    base_year = int(academic_year.split("/")[0])
-    prev_1 = f"{base_year - 1}/{base_year}"
-    prev_2 = f"{base_year - 2}/{base_year - 1}"
-    academic_years = [prev_2, prev_1, academic_year]
-
-    if selected_term == "Term 1":
-        term_sequence = [("Term 2", prev_1), ("Term 3", prev_1), ("Term 1", academic_year)]
-    elif selected_term == "Term 2":
-        term_sequence = [("Term 3", prev_1), ("Term 1", academic_year), ("Term 2", academic_year)]
-    else:
-        term_sequence = [("Term 1", academic_year), ("Term 2", academic_year), ("Term 3", academic_year)]
-
-    term_keys = [f"{t} ({y})" for t, y in term_sequence]
-    q_terms = Q()
-    for term, year in term_sequence:
-        q_terms |= Q(term=term, academic_year=year)
+    academic_years, term_sequence = trend_window(academic_year, selected_term)
 
-    trend_marks = StudentMark.objects.filter(
-        class_group=assigned_class,
-        student__school=teacher.school
-    ).filter(q_terms).select_related("subject")
-
-    term_aggregates = {key: [] for key in term_keys}
-    year_aggregates = {year: [] for year in academic_years}
+    trend_frame = MarkFrame.from_queryset(
+        StudentMark.objects.filter(
+            class_group=assigned_class,
+            student__school=teacher.school
+        ).filter(window_filter(term_sequence)),
+        term="term",
+        academic_year="academic_year",
+    )
+    trends = build_trends(
+        "Class", assigned_class.name, trend_frame.totals("term", "academic_year"), academic_years, term_sequence
+    )
+    term_trend = trends["term_trend"]
+    academic_trend = trends["academic_trend"]
 
-    for mark in trend_marks:
-        score = float(mark.mark)
-        key = f"{mark.term} ({mark.academic_year})"
-        if key in term_aggregates:
-            term_aggregates[key].append(score)
-        year_aggregates[mark.academic_year].append(score)
+    term_labels = [" ".join(label.split(" ")[:2]) for label in trends["term_chart"]["labels"]]
+    term_values = trends["term_chart"]["data"]
 
-    term_trend = {
-        "Class": assigned_class.name,
-        **{key: round(sum(v) / len(v), 2) if v else "-" for key, v in term_aggregates.items()}
-    }
-    academic_trend = {
-        "Class": assigned_class.name,
-        **{year: round(sum(v) / len(v), 2) if v else "-" for year, v in year_aggregates.items()}
-    }
+    year_labels = trends["year_chart"]["labels"]
+    year_values = trends["year_chart"]["data"]
 
-    term_labels = [" ".join(label.split(" ")[:2]) for label in list(term_trend.keys())[1:]]
-    term_values = [float(val) if isinstance(val, (int, float)) else None for val in list(term_trend.values())[1:]]
-
-    year_labels = list(academic_trend.keys())[1:]
-    year_values = [float(val) if isinstance(val, (int, float)) else None for val in list(academic_trend.values())[1:]]
-
-    all_scores = [score for sublist in subject_totals.values() for score in sublist]
-    score_buckets = {
-        "90-100": sum(1 for s in all_scores if s >= 90),
-        "80-89":  sum(1 for s in all_scores if 80 <= s < 90),
-        "70-79":  sum(1 for s in all_scores if 70 <= s < 80),
-        "60-69":  sum(1 for s in all_scores if 60 <= s < 70),
-        "55-59":  sum(1 for s in all_scores if 55 <= s < 60),
-        "50-54":  sum(1 for s in all_scores if 50 <= s < 55),
-        "45-49":  sum(1 for s in all_scores if 45 <= s < 50),
-        "40-44":  sum(1 for s in all_scores if 40 <= s < 45),
-        "0-39":   sum(1 for s in all_scores if s < 40),
-    }
+    score_buckets = score_histogram(selected_marks)
 
     heatmap_data = [{"name": row["name"], "mark": float(row["avg"])} for row in student_rows if isinstance(row["avg"], (int, float))]
 
@@ -656,12 +569,34 @@ def get_class_performance_context(request):
 
 
 @login_required
+@query_budget(20)
 def class_performance_analysis(request):
-    context = get_class_performance_context(request)
+    context = class_performance_context(request)
     return render(request, "teacher/class_performance_analysis.html", context)
 
 
+def class_report_key(request):
+    teacher = getattr(request.user, "teacher_profile", None)
+    if request.user.role != 'teacher' or teacher is None:
+        return None
+    class_ids = sorted(assignments.for_teacher(teacher).class_departments)
+    if not class_ids:
+        return None
+    # Every class they are class teacher of, whichever one the report picks
+    return (
+        [("class", class_id) for class_id in class_ids] + [assignments.ASSIGNMENTS_SCOPE, curriculum.CURRICULUM_SCOPE],
+        term_calendar.selected_period(request),
+    )
+
+
+class_performance_context = report_context(
+    "class_performance_context", class_report_key, get_class_performance_context,
+)
+
+
 @login_required
+@query_budget(20)
+@cached_report("class_performance", class_report_key)
 def download_class_performance_pdf(request):
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=120, bottomMargin=50)
@@ -670,7 +605,7 @@ def download_class_performance_pdf(request):
     subtitle_style = styles['Heading4']
 
     # ✅ Get context
-    context = get_class_performance_context(request)
+    context = class_performance_context(request)
     year = context['selected_year']
     term = context['selected_term']
     subject_list = context["subjects"]
@@ -860,13 +795,8 @@ def upload_class_results(request):
     return render(request, 'teacher/class_upload_results.html')
 
 def can_teacher_upload_result(teacher, class_group, subject):
-    has_subject_access = teacher.assigned_subjects.filter(id=subject.id).exists()
-    is_class_teacher = ClassTeacher.objects.filter(
-        teacher=teacher,
-        assigned_class=class_group
-    ).exists()
-    subject_in_class_dept = subject.department.filter(id=class_group.department.id).exists() if class_group.department else False
-    return has_subject_access or (is_class_teacher and subject_in_class_dept)
+    # Assignments are loaded once per request (see core.assignments), not three queries per row
+    return assignments.for_teacher(teacher).can_upload(class_group.id, subject.id)
 
 
 @login_required
@@ -955,11 +885,49 @@ def manual_upload_result(request):
     return JsonResponse({"message": "Result uploaded successfully!"}, status=201)
 
 
+def save_uploaded_results(results, new_students, moved_students):
+    """Write one chunk of a bulk upload - its new and moved students, results and marks - in one transaction."""
+    if not results:
+        return
+    with transaction.atomic():
+        Student.objects.bulk_create(new_students)
+        Student.objects.bulk_update(moved_students.values(), ["class_group"])
+        inserted_results = Result.objects.bulk_create(results)
+
+        keys = {
+            "subject_id__in": {result.subject_id for result in inserted_results},
+            "academic_year__in": {result.academic_year for result in inserted_results},
+            "term__in": {result.term for result in inserted_results},
+        }
+        marks = StudentMark.objects.filter(student_id__in={result.student_id for result in inserted_results}, **keys)
+        # Re-uploaded marks that were already submitted change the rollups they are counted in
+        scopes = rollups.counted_in(marks)
+
+        # bulk_create skips post_save, so upsert the matching marks in batches here
+        StudentMark.objects.upsert([
+            StudentMark(
+                student=result.student,
+                subject=result.subject,
+                academic_year=result.academic_year,
+                term=result.term,
+                class_group=result.class_group,
+                mark=result.final_mark,
+            )
+            for result in inserted_results
+        ])
+        if any(scopes.values()):
+            rollups.refresh_summaries(rollups.counted_in(marks, scopes), *keys.values())
+        # Nor do the bulk writes send the signals that would invalidate the cached pages
+        caching.bump_scopes({
+            scope
+            for obj in [*inserted_results, *new_students, *moved_students.values()]
+            for scope in caching.scopes_of(obj)
+        })
 
 
 @login_required
 def bulk_upload_results(request):
-    """Handles bulk upload of results from CSV/XLSX."""
+    """Queues a CSV/XLSX of results for the import worker (see import_results)."""
     if request.method != "POST":
         return JsonResponse({"error": "Invalid request method"}, status=405)
 
@@ -967,177 +935,185 @@ def bulk_upload_results(request):
     if not file:
         return JsonResponse({"error": "No file uploaded"}, status=400)
 
+    if not file.name.endswith((".csv", ".xls", ".xlsx")):
+        return JsonResponse({"error": "Invalid file format. Please upload CSV or Excel."}, status=400)
+
+    if not hasattr(request.user, "teacher_profile"):
+        return JsonResponse({"error": "Only teachers can upload results."}, status=403)
+
+    return imports.accepted(imports.enqueue("results", request.user, file))
+
+
+def import_results(job):
+    """Bulk upload of results from CSV/XLSX, read, checked and saved a chunk of rows at a time."""
+    user = job.user
+    chunks = spreadsheets.read_chunks(job.upload())
     try:
-        if file.name.endswith(".csv"):
-            df = pd.read_csv(file, dtype=str)
-        elif file.name.endswith((".xls", ".xlsx")):
-            df = pd.read_excel(file, dtype=str)
-        else:
-            return JsonResponse({"error": "Invalid file format. Please upload CSV or Excel."}, status=400)
+        chunk = next(chunks, [])
     except Exception as e:
-        return JsonResponse({"error": f"Failed to read file: {str(e)}"}, status=400)
-
-    errors = []
-    valid_results = []
+        raise ValueError(f"Failed to read file: {str(e)}")
 
     valid_years = {f"{year}/{year+1}" for year in range(2020, 2050)}
     valid_terms = {"Term 1", "Term 2", "Term 3"}
 
-    teacher = request.user.teacher_profile
-    teacher_school = request.user.school
-    teacher_circuit = request.user.circuit
-    teacher_district = request.user.district
+    teacher = user.teacher_profile
+    teacher_school = user.school
+    teacher_circuit = user.circuit
+    teacher_district = user.district
 
     existing_students = {
         f"{s.first_name} {s.last_name}".strip(): s
         for s in Student.objects.filter(school=teacher_school)
     }
 
-    for index, row in df.iterrows():
-        first_name = str(row.get("First Name") or "").strip()
-        last_name = str(row.get("Last Name") or "").strip()
-        student_name = f"{first_name} {last_name}".strip()
-        class_name = str(row.get("Class") or "").strip()
-        subject_name = str(row.get("Subject") or "").strip()
-        academic_year = str(row.get("Academic Year") or "").strip()
-        term = str(row.get("Term") or "").strip()
-
-        try:
-            cat1 = float(row.get("CAT1", 0))
-            project_work = float(row.get("Project Work", 0))
-            cat2 = float(row.get("CAT2", 0))
-            group_work = float(row.get("Group Work", 0))
-            exam_score = float(row.get("Exam Score", 0))
-        except ValueError:
-            errors.append({"row": index + 1, "error": "Scores must be numeric."})
-            continue
-
-        total_ca = cat1 + project_work + cat2 + group_work
-        ca_50 = round(total_ca * 0.5, 2)
-        exam_50 = round(exam_score * 0.5, 2)
-        final_mark = round(ca_50 + exam_50, 2)
-
-        if not all([student_name, class_name, subject_name, academic_year, term]):
-            errors.append({"row": index + 1, "error": "Missing required fields."})
-            continue
-
-        if academic_year not in valid_years:
-            errors.append({"row": index + 1, "error": f"Invalid academic year: {academic_year}"})
-            continue
-
-        if term not in valid_terms:
-            errors.append({"row": index + 1, "error": f"Invalid term: {term}"})
-            continue
-
-        class_group_queryset = ClassGroup.objects.select_related("department").filter(
-            name=class_name,
-            school=teacher_school
-        )
-
-        if class_group_queryset.count() == 1:
-            class_group = class_group_queryset.first()
-        elif class_group_queryset.count() > 1:
-            errors.append({"row": index + 1, "error": f"Multiple class groups found for '{class_name}' in {teacher_school.name}."})
-            continue
-        else:
-            errors.append({"row": index + 1, "error": f"Invalid class '{class_name}' for school {teacher_school.name}."})
-            continue
-
-        # New validation: class department must be part of school
-        if not class_group.department or class_group.department not in teacher_school.department.all():
-            errors.append({
-                "row": index + 1,
-                "error": f"Invalid class: the department '{class_group.department}' of class '{class_name}' is not part of school '{teacher_school.name}'."
-            })
-            continue
-
-        # New subject matching logic
-        matched_subjects = Subject.objects.filter(name__iexact=subject_name)
-        subject = None
-        for subj in matched_subjects:
-            if class_group.department in subj.department.all():
-                subject = subj
-                break
+    # Everything a row is checked against is loaded up front, so validation costs no queries per row
+    classes_named = defaultdict(list)
+    for class_group in ClassGroup.objects.filter(school=teacher_school).select_related("department"):
+        classes_named[class_group.name].append(class_group)
+    school_department_ids = set(teacher_school.department.values_list("id", flat=True))
+    subject_map = curriculum.subject_map()
+    subjects = Subject.objects.in_bulk({
+        subject_id
+        for department_id in school_department_ids
+        for subject_id in subject_map.subjects_of(department_id)
+    })
 
-        if not subject:
-            errors.append({
-                "row": index + 1,
-                "error": f"Subject '{subject_name}' is not offered in the department of class '{class_name}'."
-            })
-            continue
-
-        if not can_teacher_upload_result(teacher, class_group, subject):
-            errors.append({
-                "row": index + 1,
-                "error": "Unauthorized: You are not allowed to upload results for this subject."
-            })
-            continue
-
-        if not (0 <= final_mark <= 100):
-            errors.append({"row": index + 1, "error": "Final mark must be between 0 and 100."})
-            continue
-
-        student_key = student_name
-        student = existing_students.get(student_key)
-
-        if not student:
-            student, _ = Student.objects.get_or_create(
-                first_name=first_name,
-                last_name=last_name,
-                school=teacher_school,
-                defaults={
-                    "class_group": class_group,
-                    "circuit": teacher_circuit,
-                    "district": teacher_district
-                }
+    while chunk:
+        errors = []
+        valid_results = []
+        # Created and moved students are written together with the chunk's results, in bulk
+        new_students = []
+        moved_students = {}
+
+        for row_number, row in chunk:
+            first_name = str(row.get("First Name") or "").strip()
+            last_name = str(row.get("Last Name") or "").strip()
+            student_name = f"{first_name} {last_name}".strip()
+            class_name = str(row.get("Class") or "").strip()
+            subject_name = str(row.get("Subject") or "").strip()
+            academic_year = str(row.get("Academic Year") or "").strip()
+            term = str(row.get("Term") or "").strip()
+
+            try:
+                cat1 = float(row.get("CAT1", 0))
+                project_work = float(row.get("Project Work", 0))
+                cat2 = float(row.get("CAT2", 0))
+                group_work = float(row.get("Group Work", 0))
+                exam_score = float(row.get("Exam Score", 0))
+            except ValueError:
+                errors.append({"row": row_number, "error": "Scores must be numeric."})
+                continue
+
+            total_ca = cat1 + project_work + cat2 + group_work
+            ca_50 = round(total_ca * 0.5, 2)
+            exam_50 = round(exam_score * 0.5, 2)
+            final_mark = round(ca_50 + exam_50, 2)
+
+            if not all([student_name, class_name, subject_name, academic_year, term]):
+                errors.append({"row": row_number, "error": "Missing required fields."})
+                continue
+
+            if academic_year not in valid_years:
+                errors.append({"row": row_number, "error": f"Invalid academic year: {academic_year}"})
+                continue
+
+            if term not in valid_terms:
+                errors.append({"row": row_number, "error": f"Invalid term: {term}"})
+                continue
+
+            class_groups = classes_named.get(class_name, [])
+
+            if len(class_groups) == 1:
+                class_group = class_groups[0]
+            elif len(class_groups) > 1:
+                errors.append({"row": row_number, "error": f"Multiple class groups found for '{class_name}' in {teacher_school.name}."})
+                continue
+            else:
+                errors.append({"row": row_number, "error": f"Invalid class '{class_name}' for school {teacher_school.name}."})
+                continue
+
+            # New validation: class department must be part of school
+            if not class_group.department or class_group.department_id not in school_department_ids:
+                errors.append({
+                    "row": row_number,
+                    "error": f"Invalid class: the department '{class_group.department}' of class '{class_name}' is not part of school '{teacher_school.name}'."
+                })
+                continue
+
+            # New subject matching logic
+            subject = subjects.get(subject_map.subject_named(subject_name, class_group.department_id))
+
+            if not subject:
+                errors.append({
+                    "row": row_number,
+                    "error": f"Subject '{subject_name}' is not offered in the department of class '{class_name}'."
+                })
+                continue
+
+            if not can_teacher_upload_result(teacher, class_group, subject):
+                errors.append({
+                    "row": row_number,
+                    "error": "Unauthorized: You are not allowed to upload results for this subject."
+                })
+                continue
+
+            if not (0 <= final_mark <= 100):
+                errors.append({"row": row_number, "error": "Final mark must be between 0 and 100."})
+                continue
+
+            student_key = student_name
+            student = existing_students.get(student_key)
+
+            if not student:
+                student = Student(
+                    first_name=first_name,
+                    last_name=last_name,
+                    school=teacher_school,
+                    class_group=class_group,
+                    circuit=teacher_circuit,
+                    district=teacher_district,
+                )
+                new_students.append(student)
+                existing_students[student_key] = student
+
+            if student.class_group_id != class_group.id:
+                student.class_group = class_group
+                if student.pk:
+                    moved_students[student.pk] = student
+
+            valid_results.append(
+                Result(
+                    academic_year=academic_year,
+                    class_group=class_group,
+                    subject=subject,
+                    term=term,
+                    student=student,
+                    cat1=cat1,
+                    project_work=project_work,
+                    cat2=cat2,
+                    group_work=group_work,
+                    total_ca=total_ca,
+                    ca_50=ca_50,
+                    exam_score=exam_score,
+                    exam_50=exam_50,
+                    final_mark=final_mark,
+                    teacher=user,
+                    school=teacher_school,
+                    circuit=teacher_circuit,
+                    district=teacher_district,
+                    status="Pending"
+                )
             )
-            existing_students[student_key] = student
-
-        if student.class_group != class_group:
-            student.class_group = class_group
-            student.save()
-
-        valid_results.append(
-            Result(
-                academic_year=academic_year,
-                class_group=class_group,
-                subject=subject,
-                term=term,
-                student=student,
-                cat1=cat1,
-                project_work=project_work,
-                cat2=cat2,
-                group_work=group_work,
-                total_ca=total_ca,
-                ca_50=ca_50,
-                exam_score=exam_score,
-                exam_50=exam_50,
-                final_mark=final_mark,
-                teacher=request.user,
-                school=teacher_school,
-                circuit=teacher_circuit,
-                district=teacher_district,
-                status="Pending"
-            )
-        )
 
-    if valid_results:
-        inserted_results = Result.objects.bulk_create(valid_results)
-
-        for result in inserted_results:
-            StudentMark.objects.update_or_create(
-                student=result.student,
-                subject=result.subject,
-                academic_year=result.academic_year,
-                term=result.term,
-                class_group=result.class_group,
-                defaults={"mark": result.final_mark}
-            )
+        save_uploaded_results(valid_results, new_students, moved_students)
+        job.record(len(chunk), [f"Row {e['row']}: {e['error']}" for e in errors])
+        try:
+            chunk = next(chunks, [])
+        except Exception as e:
+            job.record(0, [f"Row {row_number + 1}: Failed to read the rest of the file: {str(e)}"])
+            break
 
-    return JsonResponse({
-        "message": "Bulk upload completed",
-        "errors": [f"Row {e['row']}: {e['error']}" for e in errors]
-    }, status=201)
+    return "Bulk upload completed"
 
 
 TERM_MAPPING = {"1": "Term 1", "2": "Term 2", "3": "Term 3"}
@@ -1359,7 +1335,18 @@ def delete_result_file(request, year, term, subject_id, class_id):
         subject_id=subject_id,
         class_group_id=class_id
     )
-    count, _ = qs.delete()
+    with transaction.atomic():
+        marks = StudentMark.objects.filter(
+            student_id__in=list(qs.values_list("student_id", flat=True)),
+            subject_id=subject_id,
+            academic_year=year,
+            term=term,
+        )
+        scopes = rollups.counted_in(marks)
+        count, _ = qs.delete()
+        # Marks of deleted submitted results no longer count
+        marks.sync_submitted()
+        rollups.refresh_summaries(rollups.counted_in(marks, scopes), [subject_id], [year], [term])
     return JsonResponse({"message": f"Deleted {count} result(s)."}) 
 
 
@@ -1368,5 +1355,17 @@ def delete_result_file(request, year, term, subject_id, class_id):
 def delete_result_entry(request, result_id):
     teacher = request.user
     result = get_object_or_404(Result, id=result_id, teacher=teacher)
-    result.delete()
+    with transaction.atomic():
+        marks = StudentMark.objects.filter(
+            student_id=result.student_id,
+            subject_id=result.subject_id,
+            academic_year=result.academic_year,
+            term=result.term,
+        )
+        scopes = rollups.counted_in(marks)
+        result.delete()
+        marks.sync_submitted()
+        rollups.refresh_summaries(
+            rollups.counted_in(marks, scopes), [result.subject_id], [result.academic_year], [result.term],
+        )
     return JsonResponse({"message": "Entry deleted."})
\ No newline at end of file
@@ -20,6 +20,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middlewares.QueryInstrumentationMiddleware',  # First, so every query in the request is counted
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,6 +81,10 @@ USE_TZ = True
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Generated performance PDFs (core.report_cache); the least recently served are dropped past the limit
+REPORT_CACHE_DIR = BASE_DIR / 'report_cache'
+REPORT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -104,6 +109,10 @@ LOGGING = {
         'django': {'handlers': ['console', 'file'], 'level': 'DEBUG', 'propagate': False},
         'django.server': {'handlers': ['console', 'file'], 'level': 'ERROR', 'propagate': False},
         'core.backends': {'handlers': ['console', 'file'], 'level': 'DEBUG', 'propagate': False},
+        # One JSON line per request (queries, SQL/Python time, size); query budget overruns at WARNING
+        'core.instrumentation': {'handlers': ['console', 'file'], 'level': 'INFO', 'propagate': False},
+        # Import worker: each job's start and outcome
+        'core.imports': {'handlers': ['console', 'file'], 'level': 'INFO', 'propagate': False},
     },
     'root': {'handlers': ['console'], 'level': 'WARNING'},
 }
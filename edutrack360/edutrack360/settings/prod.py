@@ -32,3 +32,16 @@ EMAIL_PORT = int(os.getenv('EMAIL_PORT', 587))
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.getenv('EMAIL_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_PASSWORD')
+
+# Same Redis as the channel layer. The cache must be shared by all gunicorn workers:
+# the analytics data versions and the single-flight locks live in it.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/1'),
+    }
+}
+
+# Each worker also keeps recent cache entries and data versions in memory; bumps are
+# broadcast over the channel layer so every node drops its stale versions (core.invalidation)
+CACHE_INVALIDATION_BROADCAST = True
@@ -20,7 +20,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 from core.views.view_common import (
     homepage, unified_login, logout_view, 
-    admin_login, healthz
+    admin_login, healthz, import_job_status
 )
 from django.contrib.auth import views as auth_views
 
@@ -32,6 +32,7 @@ urlpatterns = [
     path('login/user/', unified_login, name='login'),
     path('logout/', logout_view, name='logout'),
     path('healthz/', healthz, name='healthz'),
+    path('imports/<int:job_id>/', import_job_status, name='import_job_status'),
 
 
     # --- DASHBOARD ROUTES ---
@@ -0,0 +1,33 @@
+// Bulk uploads are processed in the background: the upload answers with a status_url,
+// which is polled until the import job has finished.
+function waitForImport(statusUrl, onProgress, interval = 2000) {
+    return new Promise((resolve, reject) => {
+        async function poll() {
+            try {
+                const response = await fetch(statusUrl, { credentials: "same-origin" });
+                if (!response.ok) {
+                    throw new Error(`Could not check the upload (HTTP ${response.status})`);
+                }
+                const job = await response.json();
+                if (job.finished) {
+                    resolve(job);
+                    return;
+                }
+                if (onProgress) {
+                    onProgress(job);
+                }
+                setTimeout(poll, interval);
+            } catch (error) {
+                reject(error);
+            }
+        }
+        poll();
+    });
+}
+
+function importProgressMessage(job) {
+    const failed = job.rows_failed ? `, ${job.rows_failed} rejected` : "";
+    return job.status === "queued"
+        ? "Upload queued..."
+        : `Processing upload: ${job.rows_done} rows done${failed}...`;
+}